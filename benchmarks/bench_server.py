@@ -0,0 +1,382 @@
+"""Benchmark jpy_video.server with request patterns typical of an HTML5 video element.
+
+Synthetic files of several sizes are served from a temporary folder by server.Server on
+localhost, then hit with the following patterns:
+
+    probe       Fresh connection, open-ended request from the start of the file, read a little and
+                hang up, then ask for the tail of the file.  This is what a browser does to find
+                the container's metadata before playback starts.
+    sequential  One keep-alive connection playing the file start to finish with open-ended
+                'bytes=N-' requests, resuming wherever the previous response stopped.
+    scrub       One keep-alive connection jumping to random positions and reading a short range
+                at each, like a user dragging the time slider.
+    concurrent  Several clients each playing the file sequentially at the same time.
+
+Reported per engine, file size and pattern: request count, bytes, throughput, and percentiles of
+time-to-first-byte and complete request time.  Results are written as JSON for comparison
+between runs.
+
+Example:
+
+    python benchmarks/bench_server.py --output before.json
+    ... make changes ...
+    python benchmarks/bench_server.py --output after.json --compare before.json
+"""
+
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(here))
+
+from jpy_video import server
+
+PATTERNS = ('probe', 'sequential', 'scrub', 'concurrent')
+
+MiB = 1024*1024
+
+#------------------------------------------------
+
+def make_files(folder, sizes_mib, seed=0):
+    """Write synthetic files of given sizes (MiB) into folder.  Returns list of file names.
+    Content is random so nothing downstream can take shortcuts on runs of zeros.
+    """
+    rng = random.Random(seed)
+    block = bytes(rng.getrandbits(8) for _ in range(MiB))
+
+    names = []
+    for size in sizes_mib:
+        name = 'synthetic_{}MiB.mp4'.format(size)
+        with open(os.path.join(folder, name), 'wb') as fo:
+            remaining = int(size*MiB)
+            while remaining > 0:
+                fo.write(block[:remaining])
+                remaining -= len(block)
+        names.append(name)
+
+    return names
+
+
+
+def percentiles(values):
+    """Return dict of p50/p90/p99/max of list of numbers, in milliseconds
+    """
+    values = sorted(values)
+    result = {}
+    for name, fraction in (('p50', 0.50), ('p90', 0.90), ('p99', 0.99), ('max', 1.0)):
+        if values:
+            result[name] = 1000*values[min(int(fraction*len(values)), len(values) - 1)]
+        else:
+            result[name] = None
+
+    return result
+
+
+
+class Client():
+    """Minimal keep-alive HTTP client that times each range request
+    """
+    read_size = 256*1024
+
+    def __init__(self, host, port, timeout=30):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.connection = None
+
+        self.ttfb = []
+        self.latency = []
+        self.bytes_read = 0
+        self.errors = 0
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def get(self, path, byte_range=None, limit=None):
+        """Request path, optionally with a Range header.  Read at most limit bytes of the body
+        then drop the connection, as browsers do.  Returns (status, Content-Range, bytes read).
+        """
+        if self.connection is None:
+            self.connection = http.client.HTTPConnection(self.host, self.port,
+                                                         timeout=self.timeout)
+
+        headers = {}
+        if byte_range:
+            headers['Range'] = byte_range
+
+        start = time.perf_counter()
+        try:
+            self.connection.request('GET', path, headers=headers)
+            response = self.connection.getresponse()
+            self.ttfb.append(time.perf_counter() - start)
+
+            count = 0
+            while limit is None or count < limit:
+                data = response.read(self.read_size)
+                if not data:
+                    break
+                count += len(data)
+        except (OSError, http.client.HTTPException):
+            self.errors += 1
+            self.close()
+            return None, None, 0
+
+        if limit is not None and count >= limit and not response.isclosed():
+            # Abandon rest of the response
+            self.close()
+
+        self.latency.append(time.perf_counter() - start)
+        self.bytes_read += count
+
+        return response.status, response.getheader('Content-Range'), count
+
+#------------------------------------------------
+# Request patterns
+
+def play_sequential(client, path, size):
+    """Fetch whole file with open-ended requests, resuming after each (possibly capped) response
+    """
+    position = 0
+    while position < size:
+        status, content_range, count = client.get(path, 'bytes={}-'.format(position))
+        if not count:
+            break
+        position += count
+
+
+def run_probe(host, port, path, size, repeat):
+    client = Client(host, port)
+    for k in range(repeat):
+        client.get(path, 'bytes=0-', limit=64*1024)
+        client.close()
+        client.get(path, 'bytes={}-'.format(max(size - MiB, 0)))
+        client.close()
+
+    return [client]
+
+
+def run_sequential(host, port, path, size, repeat):
+    client = Client(host, port)
+    for k in range(repeat):
+        play_sequential(client, path, size)
+    client.close()
+
+    return [client]
+
+
+def run_scrub(host, port, path, size, repeat, seeks=50, span=512*1024, seed=1):
+    rng = random.Random(seed)
+    client = Client(host, port)
+    for k in range(repeat*seeks):
+        first = rng.randrange(max(size - span, 1))
+        client.get(path, 'bytes={}-{}'.format(first, first + span - 1))
+    client.close()
+
+    return [client]
+
+
+def run_concurrent(host, port, path, size, repeat, clients=8):
+    pool = [Client(host, port) for k in range(clients)]
+
+    def work(client):
+        for k in range(repeat):
+            play_sequential(client, path, size)
+        client.close()
+
+    threads = [threading.Thread(target=work, args=(client,)) for client in pool]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return pool
+
+
+RUNNERS = {'probe': run_probe,
+           'sequential': run_sequential,
+           'scrub': run_scrub,
+           'concurrent': run_concurrent}
+
+#------------------------------------------------
+
+def run_pattern(srv, name, size, pattern, repeat, clients):
+    """Run one pattern against one file, return dict of results
+    """
+    host, port = srv.host, srv.port
+    path = '/' + name
+
+    kwargs = {}
+    if pattern == 'concurrent':
+        kwargs['clients'] = clients
+
+    time_start = time.perf_counter()
+    pool = RUNNERS[pattern](host, port, path, size, repeat, **kwargs)
+    elapsed = time.perf_counter() - time_start
+
+    ttfb = [t for client in pool for t in client.ttfb]
+    latency = [t for client in pool for t in client.latency]
+    bytes_read = sum(client.bytes_read for client in pool)
+
+    return {'pattern': pattern,
+            'file_size': size,
+            'requests': len(latency),
+            'errors': sum(client.errors for client in pool),
+            'bytes': bytes_read,
+            'seconds': elapsed,
+            'throughput_mib_s': bytes_read/MiB/elapsed if elapsed else None,
+            'ttfb_ms': percentiles(ttfb),
+            'latency_ms': percentiles(latency)}
+
+
+
+def run(folder, names, engines, patterns, repeat=3, clients=8, server_options=None):
+    """Run every pattern against every file on every engine.  Returns list of result dicts.
+    """
+    results = []
+    for engine in engines:
+        options = dict(server_options or {})
+        if engine == 'thread':
+            # Let every benchmark client in, the default per-client limit is for browsers
+            options['client_connections'] = max(clients, options.get('workers', 8))
+
+        srv = server.Server(folder, engine=engine, **options)
+        srv.start()
+        try:
+            for name in names:
+                size = os.path.getsize(os.path.join(folder, name))
+                for pattern in patterns:
+                    result = run_pattern(srv, name, size, pattern, repeat, clients)
+                    result['engine'] = engine
+                    results.append(result)
+                    print_result(result)
+        finally:
+            srv.stop()
+
+    return results
+
+
+
+def print_result(result):
+    print('{engine:8s} {size:>6.0f} MiB {pattern:11s} {requests:6d} req {throughput:9.1f} MiB/s  '
+          'ttfb p50 {ttfb_p50:7.2f} p99 {ttfb_p99:7.2f} ms  '
+          'latency p50 {lat_p50:8.2f} p99 {lat_p99:8.2f} ms  errors {errors}'.format(
+              engine=result['engine'],
+              size=result['file_size']/MiB,
+              pattern=result['pattern'],
+              requests=result['requests'],
+              throughput=result['throughput_mib_s'] or 0,
+              ttfb_p50=result['ttfb_ms']['p50'] or 0,
+              ttfb_p99=result['ttfb_ms']['p99'] or 0,
+              lat_p50=result['latency_ms']['p50'] or 0,
+              lat_p99=result['latency_ms']['p99'] or 0,
+              errors=result['errors']))
+
+
+
+def compare(results, baseline, tolerance):
+    """Return list of messages describing results that got worse than baseline by more than
+    tolerance (fraction).  Compares throughput and p99 time-to-first-byte.
+    """
+    def key(r):
+        return r['engine'], r['file_size'], r['pattern']
+
+    previous = {key(r): r for r in baseline['results']}
+
+    messages = []
+    for result in results:
+        old = previous.get(key(result))
+        if not old:
+            continue
+
+        label = '{} {:.0f} MiB {}'.format(result['engine'], result['file_size']/MiB,
+                                          result['pattern'])
+
+        if old['throughput_mib_s'] and result['throughput_mib_s'] is not None:
+            if result['throughput_mib_s'] < old['throughput_mib_s']*(1 - tolerance):
+                messages.append('{}: throughput {:.1f} -> {:.1f} MiB/s'.format(
+                    label, old['throughput_mib_s'], result['throughput_mib_s']))
+
+        old_p99 = old['ttfb_ms']['p99']
+        new_p99 = result['ttfb_ms']['p99']
+        if old_p99 and new_p99 is not None and new_p99 > old_p99*(1 + tolerance):
+            messages.append('{}: ttfb p99 {:.2f} -> {:.2f} ms'.format(label, old_p99, new_p99))
+
+        if result['errors'] > old['errors']:
+            messages.append('{}: errors {} -> {}'.format(label, old['errors'], result['errors']))
+
+    return messages
+
+#------------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark jpy_video.server range requests')
+    parser.add_argument('--sizes', type=float, nargs='+', default=[1, 16, 256],
+                        help='synthetic file sizes in MiB')
+    parser.add_argument('--engines', nargs='+', default=list(server.ENGINES),
+                        choices=server.ENGINES)
+    parser.add_argument('--patterns', nargs='+', default=list(PATTERNS), choices=PATTERNS)
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='repetitions of each pattern')
+    parser.add_argument('--clients', type=int, default=8,
+                        help='number of clients for the concurrent pattern')
+    parser.add_argument('--workers', type=int, default=8,
+                        help='worker threads for the thread engine')
+    parser.add_argument('--block-cache', type=int, default=0,
+                        help='server block cache memory budget in MiB, 0 disables')
+    parser.add_argument('--folder',
+                        help='folder for synthetic files, default is a temporary folder')
+    parser.add_argument('--output', help='write JSON results to this file')
+    parser.add_argument('--compare', help='JSON results of an earlier run to check against')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='allowed fractional slowdown relative to --compare')
+
+    args = parser.parse_args()
+
+    server_options = {'workers': args.workers,
+                      'block_cache': args.block_cache*MiB}
+
+    folder = args.folder or tempfile.mkdtemp(prefix='jpy_video_bench_')
+    try:
+        names = make_files(folder, args.sizes)
+        results = run(folder, names, args.engines, args.patterns, repeat=args.repeat,
+                      clients=args.clients, server_options=server_options)
+    finally:
+        if not args.folder:
+            shutil.rmtree(folder, ignore_errors=True)
+
+    report = {'timestamp': time.time(),
+              'python': platform.python_version(),
+              'platform': platform.platform(),
+              'arguments': vars(args),
+              'results': results}
+
+    if args.output:
+        with open(args.output, 'w') as fo:
+            json.dump(report, fo, indent=2)
+
+    if args.compare:
+        with open(args.compare) as fi:
+            baseline = json.load(fi)
+
+        messages = compare(results, baseline, args.tolerance)
+        for message in messages:
+            print('REGRESSION ' + message)
+
+        if messages:
+            sys.exit(1)
+
+
+
+if __name__ == '__main__':
+    main()
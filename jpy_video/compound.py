@@ -3,13 +3,14 @@ import os
 
 import IPython
 import ipywidgets
+import traitlets
 
 from ._version import __version__
 
 from .monotext_widget import MonoText
-from .video import Video, TimeCode
+from .video import Video, TimeCode, ScrubBar, SyncGroup
 
-__all__ = ['Player']
+__all__ = ['Player', 'MultiVideoPlayer']
 
 """
 Compound video player widget based on my own custom HTML5 video widget combined with various
@@ -63,16 +64,20 @@ Available Jupyter widgets:
 class VideoPlayer(ipywidgets.VBox):
     """Compound video player widget
 
-    Click the video display to start/stop playback.
+    Click the video display to start/stop playback.  The time slider shows thumbnails while
+    hovering and dragging, and only seeks the video on release.
     """
-    def __init__(self, source, timebase=1/30):
-        """Define a new player instance for supplied source
+    def __init__(self, source, timebase=1/30, previews=False):
+        """Define a new player instance for supplied source.  Set previews=True to give the
+        slider thumbnails once the video's metadata is in, see Video.make_previews().  The first
+        time round for each video that costs the browser a pass over the whole file.
         """
         super().__init__()
 
         # Build the parts
         self._source = source
         self._timebase = timebase
+        self._previews = previews
         self.wid_video = Video(source, timebase=timebase)
 
         # Video event handlers
@@ -90,11 +95,8 @@ class VideoPlayer(ipywidgets.VBox):
 
         # wid_button = ipywidgets.Button(icon='play')  # http://fontawesome.io/icon/pause/
 
-        # Progress bar/slider
-        self.wid_slider = ipywidgets.FloatSlider(min=0, max=1, step=timebase,
-                                                 continuous_update=True, orientation='horizontal',
-                                                 readout=False,
-                                                 slider_color='blue')
+        # Progress bar/slider with scrub previews
+        self.wid_slider = ScrubBar(self.wid_video, step=timebase)
         self.wid_slider.layout.width = '50%'
 
         # Text info
@@ -108,11 +110,15 @@ class VideoPlayer(ipywidgets.VBox):
 
         self.children = [self.wid_video, self.wid_box, self.wid_info]
 
-        # Link widgets at front end
+        # Link widgets at front end, the slider follows the video by itself
         # ipywidgets.jsdlink((self.wid_video, 'current_time'), (self.wid_progress, 'value'))
-        ipywidgets.jslink((self.wid_video, 'current_time'), (self.wid_slider, 'value'))
         ipywidgets.jsdlink((self.wid_video, 'current_time'), (self.wid_timecode, 'timecode'))
 
+        # Frame timing read from the video file, if available
+        traitlets.dlink((self.wid_video, 'timebase'), (self.wid_timecode, 'timebase'))
+        traitlets.dlink((self.wid_video, 'timebase'), (self.wid_slider, 'step'))
+        traitlets.dlink((self.wid_video, '_frame_times'), (self.wid_timecode, '_frame_times'))
+
     def _update_info(self):
         tpl = "Source: {} | Timebase: {:.1f} fps | Playback: {}x"
 
@@ -121,12 +127,25 @@ class VideoPlayer(ipywidgets.VBox):
         except KeyError:
             rate = 1
 
-        text = tpl.format(os.path.basename(self._source),
-                          1/self._timebase,
+        text = tpl.format(self._source_name(),
+                          1/self.wid_video.timebase,
                           rate)
 
         self.wid_info.text = text
 
+    def _source_name(self):
+        """Short name of what the video is playing, for any kind of source
+        """
+        video = self.wid_video
+        if video.filename:
+            return os.path.basename(video.filename)
+        if video.memory_file is not None:
+            return video.memory_file.name
+        if video.stream is not None:
+            return 'live stream'
+
+        return os.path.basename(video.src.split('?')[0].rstrip('/')) or video.src
+
     #--------------------------------------------
     def _handle_displayed(self, *args, **kwargs):
         """Do stuff that can only be done after widget is displayed
@@ -152,6 +171,86 @@ class VideoPlayer(ipywidgets.VBox):
         self.layout.align_self = 'center'
         self._update_info()
 
+        # Thumbnails come from the disk cache or, the first time, the front end
+        video = self.wid_video
+        if self._previews and not video._sprites and video._sprite_request is None:
+            video.make_previews()
+
+    def display(self):
+        IPython.display.display(self)
+
+    @property
+    def properties(self):
+        return self.wid_video.properties
+
+
+
+class MultiVideoPlayer(ipywidgets.VBox):
+    """Several videos side by side in a grid, e.g. camera angles of the same scene, playing in
+    step through a SyncGroup.
+
+    The first video is the master: its controls, time slider and timecode drive all the others.
+    Drift statistics are in player.sync.stats.
+    """
+    def __init__(self, sources, columns=None, timebase=1/30, offsets=None, **sync_options):
+        """Define a new player for sequence of sources.  Default columns makes a roughly square
+        grid.  Offsets shift videos relative to the first, in seconds.  Other keyword arguments
+        tune the SyncGroup.
+        """
+        super().__init__()
+
+        self._sources = list(sources)
+        if not self._sources:
+            raise ValueError('Need at least one video source')
+
+        if columns is None:
+            columns = int(len(self._sources)**0.5 + 0.999)
+
+        self.wid_videos = [Video(source, timebase=timebase) for source in self._sources]
+        for video in self.wid_videos:
+            video.layout.width = '100%'
+            video.layout.border = '1px solid grey'
+
+        self.wid_video = self.wid_videos[0]
+        for video in self.wid_videos[1:]:
+            video.on_displayed(self._handle_follower_displayed)
+        self.wid_video.on_event(self._handle_duration_change, 'durationchange')
+
+        self.sync = SyncGroup(self.wid_videos, offsets=list(offsets or []), **sync_options)
+
+        # Build the parts
+        self.wid_grid = ipywidgets.GridBox(children=self.wid_videos)
+        self.wid_grid.layout.grid_template_columns = 'repeat({}, 1fr)'.format(columns)
+        self.wid_grid.layout.grid_gap = '2px'
+
+        self.wid_timecode = TimeCode(timebase=timebase)
+        self.wid_slider = ipywidgets.FloatSlider(min=0, max=1, step=timebase,
+                                                 continuous_update=True, orientation='horizontal',
+                                                 readout=False)
+        self.wid_slider.layout.width = '50%'
+
+        self.wid_box = ipywidgets.HBox(children=[self.wid_timecode, self.wid_slider])
+        self.children = [self.wid_grid, self.wid_box]
+
+        # Link widgets at front end, followers take their time from the sync group
+        ipywidgets.jslink((self.wid_video, 'current_time'), (self.wid_slider, 'value'))
+        ipywidgets.jsdlink((self.wid_video, 'current_time'), (self.wid_timecode, 'timecode'))
+
+        traitlets.dlink((self.wid_video, 'timebase'), (self.wid_timecode, 'timebase'))
+        traitlets.dlink((self.wid_video, 'timebase'), (self.wid_slider, 'step'))
+        traitlets.dlink((self.wid_video, '_frame_times'), (self.wid_timecode, '_frame_times'))
+
+    #--------------------------------------------
+    def _handle_follower_displayed(self, video, **kwargs):
+        """Only the master keeps its controls
+        """
+        video.set_property('controls', False)
+
+    def _handle_duration_change(self, wid, properties):
+        """Update anything that depends on video duration
+        """
+        self.wid_slider.max = properties.duration
+
     def display(self):
         IPython.display.display(self)
 
@@ -159,6 +258,12 @@ class VideoPlayer(ipywidgets.VBox):
     def properties(self):
         return self.wid_video.properties
 
+    @property
+    def stats(self):
+        """Drift statistics of each video, see SyncGroup
+        """
+        return self.sync.stats
+
 
 #------------------------------------------------
 if __name__ == '__main__':
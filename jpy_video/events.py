@@ -0,0 +1,323 @@
+"""
+Helpers for dispatching front-end media events to user callback functions, see Video.on_event().
+"""
+
+import asyncio
+import collections
+import concurrent.futures
+import inspect
+import threading
+import time
+import traceback
+
+import IPython
+
+__all__ = ['EventCallback', 'EventExecutor']
+
+#------------------------------------------------
+
+def call_later(delay, function):
+    """Call function after delay seconds.  Runs on the running asyncio event loop if there is one
+    (the kernel's, between messages), otherwise from a timer thread.  Returns handle with a
+    cancel() method.
+    """
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+
+    if loop is not None:
+        return loop.call_later(delay, function)
+
+    timer = threading.Timer(delay, function)
+    timer.daemon = True
+    timer.start()
+
+    return timer
+
+def report_error():
+    """Show traceback of exception raised by user callback, same as CallbackDispatcher does
+    """
+    ip = IPython.get_ipython()
+    if ip is None:
+        traceback.print_exc()
+    else:
+        ip.showtraceback()
+
+#------------------------------------------------
+
+class EventCallback():
+    """Event handler function with a rate limit.  Events that arrive faster than the limit are
+    coalesced: intermediate updates are dropped and the callback gets the newest state.
+
+        throttle = T        # at most one call per T seconds.  The first event of a burst is
+                            # delivered at once, the last one at the end of the time window.
+        debounce = T        # one call once events have stopped for T seconds
+        latest_only = True  # one call for all events handled together, e.g. a batch from the
+                            # front end, after the batch is done
+
+    Called like any handler with (widget, properties).  properties is the widget's live state,
+    so a deferred call always sees the newest values.
+    """
+    def __init__(self, callback, throttle=None, debounce=None, latest_only=False):
+        self.callback = callback
+        self.throttle = throttle
+        self.debounce = debounce
+        self.latest_only = latest_only
+
+        self._lock = threading.Lock()
+        self._args = None
+        self._handle = None
+        self._deadline = 0
+        self._next_call = 0
+
+    def __repr__(self):
+        return '<EventCallback {!r} throttle={} debounce={} latest_only={}>'.format(
+            self.callback, self.throttle, self.debounce, self.latest_only)
+
+    def __call__(self, widget, properties):
+        now = time.monotonic()
+        with self._lock:
+            self._args = widget, properties
+            if self.debounce:
+                self._deadline = now + self.debounce
+
+            if self._handle is not None:
+                # Call already scheduled, it will pick up the newest state
+                return
+
+            if self.debounce:
+                delay = self.debounce
+            elif self.throttle:
+                delay = self._next_call - now
+            elif self.latest_only:
+                # Soon as the current batch of events is done
+                delay = 0
+            else:
+                delay = None
+
+            if delay is not None and (delay > 0 or not self.throttle):
+                self._handle = call_later(max(delay, 0), self._fire)
+                return
+
+            # Nothing to wait for
+            if self.throttle:
+                self._next_call = now + self.throttle
+            args = self._args
+            self._args = None
+
+        self._invoke(args)
+
+    def _fire(self):
+        """Timer expired, call back with the newest state unless the deadline moved on
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._handle = None
+            if self.debounce and now < self._deadline:
+                self._handle = call_later(self._deadline - now, self._fire)
+                return
+
+            if self.throttle:
+                self._next_call = now + self.throttle
+
+            args = self._args
+            self._args = None
+
+        self._invoke(args)
+
+    def _invoke(self, args):
+        if args is None:
+            return
+
+        try:
+            self.callback(*args)
+        except Exception:
+            report_error()
+
+    def cancel(self):
+        """Drop any pending call
+        """
+        with self._lock:
+            if self._handle is not None:
+                self._handle.cancel()
+                self._handle = None
+            self._args = None
+
+#------------------------------------------------
+
+class EventExecutor():
+    """Run event handler functions away from the widget's comm message handler, so slow handlers
+    don't hold up further messages from the front end.
+
+        mode = 'thread'   # on a pool of worker threads
+        mode = 'asyncio'  # as tasks on the kernel's asyncio event loop, coroutine functions and
+                          # other awaitable results are awaited
+
+    Events queued under the same key, e.g. event type, are handled one after the other in the
+    order they arrived.  Different keys run concurrently, at most workers at a time in thread
+    mode.
+    """
+    modes = ('thread', 'asyncio')
+
+    def __init__(self, mode='thread', workers=4, loop=None):
+        if mode not in self.modes:
+            raise ValueError('Unknown callback mode: {}, use one of {}'.format(mode, self.modes))
+
+        self.mode = mode
+        self.workers = workers
+
+        self._lock = threading.Lock()
+        self._queues = {}     # deques of (time queued, callbacks, args) by key
+        self._running = set()  # keys with a worker or task handling their queue
+        self._stats = {}
+        self._closed = False
+
+        self._pool = None
+        self._tasks = set()
+        self.loop = None
+        if mode == 'thread':
+            self._pool = concurrent.futures.ThreadPoolExecutor(
+                max_workers=workers, thread_name_prefix='jpy_video-events')
+        else:
+            self.loop = loop or asyncio.get_event_loop()
+
+    def __repr__(self):
+        return '<EventExecutor {} {} queued>'.format(self.mode, self.queued)
+
+    @property
+    def queued(self):
+        """Number of events waiting to be handled
+        """
+        with self._lock:
+            return sum(len(queue) for queue in self._queues.values())
+
+    def submit(self, key, callbacks, args):
+        """Queue a call of each function in callbacks with args, after all earlier calls queued
+        under key.  Returns False if the executor is closed.
+        """
+        with self._lock:
+            if self._closed:
+                return False
+
+            queue = self._queues.setdefault(key, collections.deque())
+            queue.append((time.perf_counter(), list(callbacks), args))
+
+            stats = self._stats_for(key)
+            stats['max_queued'] = max(stats['max_queued'], len(queue))
+
+            if key in self._running:
+                return True
+            self._running.add(key)
+
+        self._start(key)
+        return True
+
+    def _start(self, key):
+        if self._pool is not None:
+            try:
+                self._pool.submit(self._run_next, key)
+            except RuntimeError:
+                # Pool shut down by close() in the meantime
+                pass
+        else:
+            self.loop.call_soon_threadsafe(self._start_task, key)
+
+    def _stats_for(self, key):
+        if key not in self._stats:
+            self._stats[key] = {'calls': 0, 'max_queued': 0,
+                                'wait_total': 0., 'wait_max': 0.,
+                                'latency_total': 0., 'latency_max': 0.}
+        return self._stats[key]
+
+    def _next(self, key):
+        """Take the next queued call for key, or mark key idle if there is none
+        """
+        with self._lock:
+            queue = self._queues.get(key)
+            if not queue:
+                self._running.discard(key)
+                return None
+
+            return queue.popleft()
+
+    def _record(self, key, wait, latency):
+        with self._lock:
+            stats = self._stats_for(key)
+            stats['calls'] += 1
+            stats['wait_total'] += wait
+            stats['wait_max'] = max(stats['wait_max'], wait)
+            stats['latency_total'] += latency
+            stats['latency_max'] = max(stats['latency_max'], latency)
+
+    def _run_next(self, key):
+        """Handle one queued call for key on a worker thread, then hand the worker back to the
+        pool so busy keys can't starve the others
+        """
+        item = self._next(key)
+        if item is None:
+            return
+
+        time_queued, callbacks, args = item
+        time_start = time.perf_counter()
+        for callback in callbacks:
+            try:
+                callback(*args)
+            except Exception:
+                report_error()
+
+        self._record(key, time_start - time_queued, time.perf_counter() - time_start)
+        self._start(key)
+
+    def _start_task(self, key):
+        task = self.loop.create_task(self._run_queue(key))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run_queue(self, key):
+        """Handle queued calls for key on the event loop until there are none left
+        """
+        while True:
+            item = self._next(key)
+            if item is None:
+                return
+
+            time_queued, callbacks, args = item
+            time_start = time.perf_counter()
+            for callback in callbacks:
+                try:
+                    result = callback(*args)
+                    if inspect.isawaitable(result):
+                        await result
+                except Exception:
+                    report_error()
+
+            self._record(key, time_start - time_queued, time.perf_counter() - time_start)
+
+    def stats(self):
+        """Return dict by key of handler statistics: number of calls, current and peak queue
+        depth, mean and max seconds waited in the queue and spent in handler functions
+        """
+        result = {}
+        with self._lock:
+            for key, stats in self._stats.items():
+                calls = stats['calls']
+                result[key] = {'calls': calls,
+                               'queued': len(self._queues.get(key, ())),
+                               'max_queued': stats['max_queued'],
+                               'wait_mean': stats['wait_total']/calls if calls else 0.,
+                               'wait_max': stats['wait_max'],
+                               'latency_mean': stats['latency_total']/calls if calls else 0.,
+                               'latency_max': stats['latency_max']}
+
+        return result
+
+    def close(self):
+        """Drop queued calls and stop the workers.  Calls already running are finished.
+        """
+        with self._lock:
+            self._closed = True
+            self._queues.clear()
+
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
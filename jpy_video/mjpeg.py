@@ -0,0 +1,332 @@
+"""
+Live Motion JPEG streams of frames generated in Python: camera feeds, simulation renderers, etc.
+
+A FrameStream takes frames (uint8 arrays, height x width x 3) from a generator, an iterator or a
+queue, JPEG-encodes them on a small pool of worker threads and keeps the most recent encoded
+frame for any number of viewers.  The internal http server sends it to the browser as a
+multipart/x-mixed-replace response, see server.Server.register().
+
+Nothing upstream ever waits on the browser.  Each viewer is sent the newest frame whenever it is
+ready for another one, frames it was too slow for are skipped.  Frames are dropped before
+encoding when the workers fall behind, i.e. when encoding more would exceed max_pending frames or
+max_queue_bytes of frame data.  An optional frame rate limit paces generators and thins out
+queues.
+"""
+
+import collections.abc
+import concurrent.futures
+import functools
+import io
+import queue
+import secrets
+import threading
+import time
+
+__all__ = ['FrameStream', 'encode_jpeg']
+
+MJPEG_BOUNDARY = 'jpy_video_frame'
+MJPEG_CONTENT_TYPE = 'multipart/x-mixed-replace; boundary={}'.format(MJPEG_BOUNDARY)
+
+#------------------------------------------------
+
+def encode_jpeg(frame, quality=80):
+    """Encode uint8 array (height x width x 3 RGB, or height x width grayscale) as JPEG bytes.
+    Needs Pillow.
+    """
+    try:
+        import PIL.Image
+    except ImportError:
+        raise ImportError('Encoding JPEG frames needs Pillow: pip install pillow')
+
+    output = io.BytesIO()
+    PIL.Image.fromarray(frame).save(output, format='JPEG', quality=quality)
+    return output.getvalue()
+
+def frame_part(jpeg):
+    """Return one complete part of the multipart/x-mixed-replace response for JPEG bytes
+    """
+    head = '--{}\r\nContent-Type: image/jpeg\r\nContent-Length: {}\r\n\r\n'.format(
+        MJPEG_BOUNDARY, len(jpeg))
+    return head.encode('ascii') + jpeg + b'\r\n'
+
+def is_frame_source(source):
+    """Return True if source looks like a FrameStream source: an iterator (e.g. a generator) or
+    a queue.  File objects such as io.BytesIO iterate too, but like other bytes-like objects
+    they hold encoded video, not frames.
+    """
+    if isinstance(source, (io.IOBase, str, bytes, bytearray, memoryview)):
+        return False
+
+    try:
+        memoryview(source)
+    except TypeError:
+        pass
+    else:
+        return False
+
+    return isinstance(source, collections.abc.Iterator) or (hasattr(source, 'get') and
+                                                           hasattr(source, 'put'))
+
+def frame_nbytes(frame):
+    """Memory taken up by frame's pixel data
+    """
+    nbytes = getattr(frame, 'nbytes', None)
+    if nbytes is None:
+        nbytes = memoryview(frame).nbytes
+
+    return nbytes
+
+#------------------------------------------------
+
+class FrameStream():
+    """Live stream of JPEG-encoded frames for the internal http server.
+
+    Source is a generator or other iterable of frames, or a queue.Queue (anything with a get()
+    method) that frames are put into.  Frames may also be pushed directly with push().  A None
+    taken from a queue, or the end of an iterable, ends the stream once the last frames are
+    encoded.
+
+        fps = None                # frame rate limit, generators are paced and queues thinned out
+        quality = 80              # JPEG quality for the default encoder
+        workers = 2               # encoding threads
+        max_pending = None        # frames waiting for or being encoded, default is 2*workers
+        max_queue_bytes = 64 MiB  # memory budget for those frames
+        copy = True               # copy frames on arrival, producers often reuse one array
+        encoder = None            # function(frame) -> JPEG bytes, default encode_jpeg()
+
+    Viewers get the newest frame with latest() or wait().
+    """
+    name = 'live.mjpg'
+    content_type = MJPEG_CONTENT_TYPE
+
+    def __init__(self, source=None, fps=None, quality=80, workers=2, max_pending=None,
+                 max_queue_bytes=64*1024*1024, copy=True, encoder=None):
+        if fps is not None and fps <= 0:
+            raise ValueError('Frame rate must be positive: {}'.format(fps))
+
+        self.fps = fps
+        self.max_pending = max_pending or 2*workers
+        self.max_queue_bytes = max_queue_bytes
+        self.copy = copy
+        self.encoder = encoder or functools.partial(encode_jpeg, quality=quality)
+        self.token = secrets.token_hex(10)
+
+        self._pool = concurrent.futures.ThreadPoolExecutor(max_workers=workers,
+                                                           thread_name_prefix='jpy_video-jpeg')
+        self._condition = threading.Condition()
+        self._listeners = []
+        self._closed = False
+
+        self._next_time = 0
+        self._submitted = 0   # sequence number of last frame handed to the encoders
+        self._sequence = 0    # sequence number of newest encoded frame
+        self._part = None
+        self._pending = 0
+        self._pending_bytes = 0
+
+        self.frames_in = 0
+        self.frames_encoded = 0
+        self.frames_dropped = 0
+        self.errors = 0
+        self.last_error = None
+
+        self._stop = threading.Event()
+        self._thread = None
+        if source is not None:
+            self._thread = threading.Thread(target=self._pump, args=(source,),
+                                            name='jpy_video-frames', daemon=True)
+            self._thread.start()
+
+    def __repr__(self):
+        return '<FrameStream {} frames, {} dropped>'.format(self.frames_encoded,
+                                                              self.frames_dropped)
+
+    @property
+    def closed(self):
+        return self._closed
+
+    #--------------------------------------------
+    # Producer side
+    def push(self, frame):
+        """Hand frame over for encoding without blocking.  Returns False if the frame was
+        dropped: stream closed, frame early for the rate limit, or encoders falling behind.
+        """
+        nbytes = frame_nbytes(frame)
+        now = time.monotonic()
+
+        with self._condition:
+            self.frames_in += 1
+
+            if (self._closed or
+                    (self.fps and now < self._next_time) or
+                    self._pending >= self.max_pending or
+                    (self._pending and self._pending_bytes + nbytes > self.max_queue_bytes)):
+                self.frames_dropped += 1
+                return False
+
+            if self.fps:
+                self._schedule(now)
+
+            self._pending += 1
+            self._pending_bytes += nbytes
+            self._submitted += 1
+            sequence = self._submitted
+
+        if self.copy and hasattr(frame, 'copy'):
+            frame = frame.copy()
+
+        try:
+            self._pool.submit(self._encode, sequence, frame, nbytes)
+        except RuntimeError:
+            # Pool shut down by close() in the meantime
+            self._encoded(None, nbytes)
+            return False
+
+        return True
+
+    def _schedule(self, now):
+        """Advance the frame rate limiter's next time slot.  Stays on a regular cadence unless
+        frames arrive more than a frame interval late.
+        """
+        interval = 1/self.fps
+        if now - self._next_time > interval:
+            self._next_time = now + interval
+        else:
+            self._next_time += interval
+
+    def _pump(self, source):
+        """Feed frames from iterable or queue source, runs in background thread
+        """
+        try:
+            if hasattr(source, 'get'):
+                self._pump_queue(source)
+            else:
+                self._pump_iterable(source)
+        except Exception as error:
+            self.errors += 1
+            self.last_error = error
+        finally:
+            self.close(wait=True)
+
+    def _pump_iterable(self, source):
+        for frame in source:
+            if self._stop.is_set():
+                break
+
+            if self.fps:
+                # Pace the producer instead of throwing away frames it has already made
+                delay = self._next_time - time.monotonic()
+                if delay > 0 and self._stop.wait(delay):
+                    break
+
+            self.push(frame)
+
+    def _pump_queue(self, source):
+        while not self._stop.is_set():
+            try:
+                frame = source.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+            if frame is None:
+                break
+
+            self.push(frame)
+
+    def _encode(self, sequence, frame, nbytes):
+        """Encode frame, runs on the worker pool
+        """
+        try:
+            part = frame_part(self.encoder(frame))
+        except Exception as error:
+            self.errors += 1
+            self.last_error = error
+            part = None
+
+        self._encoded(part, nbytes, sequence)
+
+    def _encoded(self, part, nbytes, sequence=0):
+        """Publish newly encoded frame, unless a later one beat it to it
+        """
+        with self._condition:
+            self._pending -= 1
+            self._pending_bytes -= nbytes
+
+            if part is None:
+                return
+
+            if sequence <= self._sequence:
+                self.frames_dropped += 1
+                return
+
+            self._sequence = sequence
+            self._part = part
+            self.frames_encoded += 1
+            self._condition.notify_all()
+            listeners = list(self._listeners)
+
+        for callback in listeners:
+            callback()
+
+    #--------------------------------------------
+    # Viewer side
+    def latest(self):
+        """Return sequence number and multipart response part of the newest frame, (0, None)
+        before the first frame is ready
+        """
+        with self._condition:
+            return self._sequence, self._part
+
+    def wait(self, sequence=0, timeout=None):
+        """Block until there is a frame newer than sequence, the stream closes, or timeout
+        seconds pass.  Returns (sequence, part) of the newest frame, part is None if there is
+        nothing new.
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self._sequence > sequence or self._closed,
+                                     timeout)
+            if self._sequence > sequence:
+                return self._sequence, self._part
+            else:
+                return sequence, None
+
+    def add_listener(self, callback):
+        """Call callback() from the encoding thread whenever a new frame is ready, and when the
+        stream closes.  For viewers that can't block in wait(), e.g. on an asyncio event loop.
+        """
+        with self._condition:
+            self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        with self._condition:
+            if callback in self._listeners:
+                self._listeners.remove(callback)
+
+    def stats(self):
+        """Return dict of frame counters
+        """
+        with self._condition:
+            return {'frames_in': self.frames_in,
+                    'frames_encoded': self.frames_encoded,
+                    'frames_dropped': self.frames_dropped,
+                    'pending': self._pending,
+                    'pending_bytes': self._pending_bytes,
+                    'errors': self.errors}
+
+    #--------------------------------------------
+    def close(self, wait=False):
+        """Stop taking frames and end the stream for all viewers.  Set wait=True to let frames
+        already handed to the encoders be published first.
+        """
+        self._stop.set()
+        self._pool.shutdown(wait=wait)
+
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify_all()
+            listeners = list(self._listeners)
+
+        for callback in listeners:
+            callback()
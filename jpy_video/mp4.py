@@ -0,0 +1,985 @@
+"""
+Minimal reader for the ISO base media file format (MP4, MOV, M4V) box structure.
+
+Faststart remapping: files written by cameras and screen recorders often place the 'moov' box
+(all the metadata needed to start playback) after the 'mdat' box holding the media data.  A
+browser then has to fetch the start of the file, seek to the end for 'moov', then come back
+again before it can show anything.  faststart_layout() describes a virtual copy of such a file
+with 'moov' moved up front and its chunk offset tables ('stco', 'co64') rewritten to match,
+without touching the file on disk.  Files with other absolute offsets in 'moov' ('iloc' item
+locations, 'saio' auxiliary info offsets) are left as they are.
+
+Frame index: the sample tables of the first video track ('stts', 'ctts', 'stss', plus the
+track's edit list) give the presentation time of every frame and which frames are keyframes.
+read_frame_index() turns these into a compact FrameIndex, and frame_index() caches the result on
+disk so each file is only parsed once.
+
+HLS playlists: a fragmented MP4 file (a 'moov' box followed by many 'moof'/'mdat' pairs) can be
+played as an HLS stream whose segments are byte ranges of the original file.  read_fragments()
+finds the fragments and their durations, hls_playlist() groups them into segments and writes
+the playlist.  Plain (non-fragmented) MP4 files would need remuxing and are not supported.
+
+https://developer.apple.com/library/archive/documentation/QuickTime/QTFF/QTFFChap2/qtff2.html
+"""
+
+import array
+import bisect
+import collections
+import hashlib
+import math
+import os
+import struct
+import sys
+import threading
+
+__all__ = ['FaststartLayout', 'FaststartCache', 'faststart_layout',
+           'FrameIndex', 'read_frame_index', 'frame_index',
+           'Fragments', 'FragmentCache', 'read_fragments', 'hls_playlist']
+
+# Boxes along the path from 'moov' down to the chunk offset tables
+CONTAINER_BOXES = {b'moov', b'trak', b'mdia', b'minf', b'stbl'}
+
+# Boxes holding absolute file offsets that rewrite_box() doesn't remap
+ABSOLUTE_OFFSET_BOXES = {b'iloc', b'saio'}
+
+# MIME types of files worth inspecting
+MP4_TYPES = {'video/mp4', 'video/quicktime', 'video/x-m4v', 'video/3gpp', 'audio/mp4'}
+
+#------------------------------------------------
+
+def parse_box_header(data, offset, end):
+    """Parse box header found at offset in buffer data.  Box must end at or before end, which
+    may lie beyond the end of data when only the header has been read.  Returns tuple
+    (box type, box size, header size).  Raises ValueError for malformed boxes.
+    """
+    available = min(end, len(data)) - offset
+    if available < 8:
+        raise ValueError('Truncated box header at {}'.format(offset))
+
+    size, kind = struct.unpack_from('>I4s', data, offset)
+    header_size = 8
+    if size == 1:
+        if available < 16:
+            raise ValueError('Truncated box header at {}'.format(offset))
+        size, = struct.unpack_from('>Q', data, offset + 8)
+        header_size = 16
+    elif size == 0:
+        # Box extends to end of enclosing space
+        size = end - offset
+
+    if size < header_size or offset + size > end:
+        raise ValueError('Invalid {} box size {} at {}'.format(kind, size, offset))
+
+    return kind, size, header_size
+
+
+
+def iter_boxes(data, start, end):
+    """Yield (box type, offset, size, header size) for each box in data[start:end]
+    """
+    offset = start
+    while offset < end:
+        kind, size, header_size = parse_box_header(data, offset, end)
+        yield kind, offset, size, header_size
+        offset += size
+
+
+
+def read_top_level_boxes(fp, file_size):
+    """Return list of (box type, offset, size, header size) for top-level boxes of an open file
+    """
+    boxes = []
+    offset = 0
+    while offset < file_size:
+        fp.seek(offset)
+        header = fp.read(16)
+        kind, size, header_size = parse_box_header(header, 0, file_size - offset)
+        boxes.append((kind, offset, size, header_size))
+        offset += size
+
+    return boxes
+
+
+
+def make_box_header(kind, payload_size, header_size=8):
+    """Return header bytes for box of given type whose payload is payload_size bytes long.
+    Keeps a 16-byte header if the original box had one.
+    """
+    size = payload_size + header_size
+    if header_size == 16 or size > 0xFFFFFFFF:
+        return struct.pack('>I4sQ', 1, kind, payload_size + 16)
+    else:
+        return struct.pack('>I4s', size, kind)
+
+#------------------------------------------------
+
+def chunk_offsets(data, offset, size, header_size):
+    """Return list of offsets from 'stco' or 'co64' box
+    """
+    kind = data[offset + 4:offset + 8]
+    start = offset + header_size
+    count, = struct.unpack_from('>I', data, start + 4)
+    if kind == b'stco':
+        fmt, width = '>{}I', 4
+    else:
+        fmt, width = '>{}Q', 8
+
+    if 8 + count*width > size - header_size:
+        raise ValueError('Truncated {} box at {}'.format(kind, offset))
+
+    return list(struct.unpack_from(fmt.format(count), data, start + 8))
+
+
+
+def max_chunk_offset(data, start, end):
+    """Return largest stco (32-bit) chunk offset below data[start:end], or -1 if none
+    """
+    result = -1
+    for kind, offset, size, header_size in iter_boxes(data, start, end):
+        if kind in CONTAINER_BOXES:
+            result = max(result, max_chunk_offset(data, offset + header_size, offset + size))
+        elif kind == b'stco':
+            result = max([result] + chunk_offsets(data, offset, size, header_size))
+
+    return result
+
+
+
+def has_other_offsets(data, start, end):
+    """Return True if any box below data[start:end] holds absolute file offsets besides the
+    chunk offset tables, see ABSOLUTE_OFFSET_BOXES.  Moving the media data would break them.
+    """
+    for kind, offset, size, header_size in iter_boxes(data, start, end):
+        if kind in ABSOLUTE_OFFSET_BOXES:
+            return True
+
+        if kind in CONTAINER_BOXES:
+            found = has_other_offsets(data, offset + header_size, offset + size)
+        elif kind == b'udta':
+            # QuickTime user data may end in a bare zero terminator, nothing to find then
+            try:
+                found = has_other_offsets(data, offset + header_size, offset + size)
+            except ValueError:
+                found = False
+        elif kind == b'meta':
+            # ISO 'meta' is a full box, QuickTime's a plain container.  Assume the worst if
+            # neither reading makes sense.
+            try:
+                found = has_other_offsets(data, offset + header_size + 4, offset + size)
+            except ValueError:
+                try:
+                    found = has_other_offsets(data, offset + header_size, offset + size)
+                except ValueError:
+                    found = True
+        else:
+            found = False
+
+        if found:
+            return True
+
+    return False
+
+
+
+def rewrite_box(data, offset, size, header_size, remap, use_co64=False):
+    """Return bytes of box at offset with every chunk offset passed through function remap().
+    Containers on the way down are rebuilt with corrected sizes.  With use_co64 True, 32-bit
+    'stco' tables are widened to 'co64'.
+    """
+    kind = data[offset + 4:offset + 8]
+
+    if kind in CONTAINER_BOXES:
+        children = iter_boxes(data, offset + header_size, offset + size)
+        payload = b''.join(rewrite_box(data, child, child_size, child_header, remap, use_co64)
+                           for _, child, child_size, child_header in children)
+        return make_box_header(kind, len(payload), header_size) + payload
+
+    if kind in (b'stco', b'co64'):
+        start = offset + header_size
+        version_flags = data[start:start + 4]
+        offsets = [remap(value) for value in chunk_offsets(data, offset, size, header_size)]
+
+        if kind == b'co64' or use_co64:
+            kind = b'co64'
+            table = struct.pack('>{}Q'.format(len(offsets)), *offsets)
+        else:
+            table = struct.pack('>{}I'.format(len(offsets)), *offsets)
+
+        payload = version_flags + struct.pack('>I', len(offsets)) + table
+        return make_box_header(kind, len(payload), header_size) + payload
+
+    return bytes(data[offset:offset + size])
+
+#------------------------------------------------
+
+class FaststartLayout():
+    """Virtual byte layout of an MP4 file with its 'moov' box moved in front of the media data.
+
+    The virtual file is a sequence of segments, each either a span of the real file or a
+    buffer held in memory (the rewritten 'moov').
+    """
+    def __init__(self, segments):
+        """segments is a list of (length, data, file_offset) tuples in virtual order.  data is
+        None for spans copied from the file at file_offset.
+        """
+        self.segments = []
+        self.starts = []
+
+        position = 0
+        for length, data, file_offset in segments:
+            if length <= 0:
+                continue
+            if data is not None:
+                data = memoryview(data)
+            self.starts.append(position)
+            self.segments.append((position, length, data, file_offset))
+            position += length
+
+        self.size = position
+
+    def __repr__(self):
+        return 'FaststartLayout(size={}, segments={})'.format(self.size, len(self.segments))
+
+    def pieces(self, first, last):
+        """Yield pieces making up inclusive virtual byte range first-last.  Each piece is a
+        tuple (data, file_first, file_last).  data is a memoryview to send as-is, or None to
+        send inclusive range file_first-file_last of the real file.
+        """
+        index = bisect.bisect_right(self.starts, first) - 1
+        while index < len(self.segments) and first <= last:
+            start, length, data, file_offset = self.segments[index]
+            stop = min(start + length - 1, last)
+
+            if data is not None:
+                yield data[first - start:stop - start + 1], None, None
+            else:
+                yield None, file_offset + first - start, file_offset + stop - start
+
+            first = stop + 1
+            index += 1
+
+
+
+def faststart_layout(fp, file_size):
+    """Return FaststartLayout for open MP4 file whose 'moov' box follows its media data, or
+    None when there is nothing to gain (already faststart, not MP4, fragmented, or damaged) or
+    'moov' holds offsets that can't be rewritten.
+    """
+    try:
+        boxes = read_top_level_boxes(fp, file_size)
+    except (ValueError, struct.error):
+        return None
+
+    kinds = [kind for kind, _, _, _ in boxes]
+    if b'moov' not in kinds or b'mdat' not in kinds or b'moof' in kinds:
+        return None
+
+    moov_index = kinds.index(b'moov')
+    mdat_index = kinds.index(b'mdat')
+    if moov_index < mdat_index:
+        return None
+
+    _, moov_offset, moov_size, moov_header = boxes[moov_index]
+    moov_end = moov_offset + moov_size
+    insert_at = boxes[mdat_index][1]
+
+    fp.seek(moov_offset)
+    moov = fp.read(moov_size)
+    if len(moov) != moov_size:
+        return None
+
+    def remapper(shift):
+        def remap(value):
+            # Data between insertion point and old 'moov' moves down by size of new 'moov',
+            # data after old 'moov' moves down by the difference in size.
+            if value >= moov_end:
+                return value + shift - moov_size
+            elif value >= insert_at:
+                return value + shift
+            else:
+                return value
+        return remap
+
+    try:
+        if has_other_offsets(moov, moov_header, moov_size):
+            return None
+
+        # Rewritten 'moov' is the same size as the original unless 32-bit offsets overflow
+        # and tables need widening, which in turn grows 'moov'.  Converges in a step or two.
+        largest = max_chunk_offset(moov, moov_header, moov_size)
+        shift = moov_size
+        use_co64 = False
+        for attempt in range(4):
+            use_co64 = use_co64 or (largest >= 0 and remapper(shift)(largest) > 0xFFFFFFFF)
+            new_moov = rewrite_box(moov, 0, moov_size, moov_header, remapper(shift), use_co64)
+            if len(new_moov) == shift:
+                break
+            shift = len(new_moov)
+        else:
+            return None
+    except (ValueError, struct.error):
+        return None
+
+    return FaststartLayout([(insert_at, None, 0),
+                            (len(new_moov), new_moov, None),
+                            (moov_offset - insert_at, None, insert_at),
+                            (file_size - moov_end, None, moov_end)])
+
+#------------------------------------------------
+
+class FileInfoCache():
+    """LRU cache of information derived from the contents of MP4 files, keyed by file identity
+    (device, inode, size, mtime) so a modified file gets looked at again.  Negative results
+    (None) are remembered too.  Subclasses implement compute().
+    """
+    def __init__(self, max_files=64):
+        self.max_files = max_files
+
+        self._items = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._items)
+
+    def key(self, fs):
+        return fs.st_dev, fs.st_ino, fs.st_size, fs.st_mtime_ns
+
+    def known(self, fs):
+        """Return True if file described by os.stat() result fs has already been looked at
+        """
+        with self._lock:
+            return self.key(fs) in self._items
+
+    def compute(self, fp, file_size):
+        """Return information about open file, or None
+        """
+        raise NotImplementedError()
+
+    def get(self, path, fs, content_type=None):
+        """Return cached information for file at path, computing it first if needed.  Only files
+        whose MIME type is one of MP4_TYPES are inspected, None is returned for anything else.
+        In-memory files (server.MemoryFile) bring their own open() and may stand in for path.
+        """
+        key = self.key(fs)
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                return self._items[key]
+
+        item = None
+        if content_type in MP4_TYPES:
+            opener = getattr(path, 'open', None)
+            try:
+                with opener() if opener else open(path, 'rb') as fp:
+                    item = self.compute(fp, fs.st_size)
+            except OSError:
+                return None
+
+        with self._lock:
+            self._items[key] = item
+            while len(self._items) > self.max_files:
+                self._items.popitem(last=False)
+
+        return item
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+
+class FaststartCache(FileInfoCache):
+    """Cache of FaststartLayout objects, see faststart_layout()
+    """
+    def compute(self, fp, file_size):
+        return faststart_layout(fp, file_size)
+
+    def layout(self, path, fs, content_type=None):
+        """Return FaststartLayout for file at path, or None if it should be served unchanged
+        """
+        return self.get(path, fs, content_type)
+
+#------------------------------------------------
+# Frame index
+
+class FrameIndex():
+    """Presentation times of the frames of a video track, and of its keyframes.
+
+    Times are in seconds, sorted, and held in array('d') objects: 8 bytes per frame.
+    """
+    def __init__(self, times, keyframes, duration):
+        self.times = array.array('d', times)
+        self.keyframes = array.array('d', keyframes)
+        self.duration = duration
+
+    def __len__(self):
+        return len(self.times)
+
+    def __repr__(self):
+        return 'FrameIndex(frames={}, keyframes={}, duration={:.3f})'.format(
+            len(self.times), len(self.keyframes), self.duration)
+
+    @property
+    def frame_rate(self):
+        """Average number of frames per second
+        """
+        if len(self.times) > 1 and self.times[-1] > self.times[0]:
+            return (len(self.times) - 1)/(self.times[-1] - self.times[0])
+        else:
+            return 0
+
+    def frame_at(self, time):
+        """Return index of frame on screen at given time
+        """
+        return max(bisect.bisect_right(self.times, time + TIME_TOLERANCE) - 1, 0)
+
+    def frame_time(self, index):
+        """Return presentation time of frame number index, clamped to the valid range
+        """
+        index = min(max(index, 0), len(self.times) - 1)
+        return self.times[index]
+
+    def snap(self, time):
+        """Return start time of frame on screen at given time
+        """
+        return self.frame_time(self.frame_at(time))
+
+    def step(self, time, frames=1):
+        """Return start time of frame given number of frames before or after the one at time
+        """
+        return self.frame_time(self.frame_at(time) + frames)
+
+    def keyframe_before(self, time):
+        """Return time of last keyframe at or before given time
+        """
+        index = bisect.bisect_right(self.keyframes, time + TIME_TOLERANCE) - 1
+        return self.keyframes[max(index, 0)]
+
+    def nearest_keyframe(self, time):
+        """Return time of keyframe closest to given time
+        """
+        index = bisect.bisect_left(self.keyframes, time)
+        candidates = self.keyframes[max(index - 1, 0):index + 1]
+        return min(candidates, key=lambda t: abs(t - time))
+
+    def save(self, fname):
+        """Write index to binary file
+        """
+        times = array.array('d', self.times)
+        keyframes = array.array('d', self.keyframes)
+        if sys.byteorder == 'big':
+            times.byteswap()
+            keyframes.byteswap()
+
+        with open(fname, 'wb') as fo:
+            fo.write(FRAME_INDEX_MAGIC)
+            fo.write(struct.pack('<dII', self.duration, len(times), len(keyframes)))
+            times.tofile(fo)
+            keyframes.tofile(fo)
+
+    @classmethod
+    def load(cls, fname):
+        """Read index from file written by save().  Raises ValueError if file is not valid.
+        """
+        with open(fname, 'rb') as fi:
+            if fi.read(len(FRAME_INDEX_MAGIC)) != FRAME_INDEX_MAGIC:
+                raise ValueError('Not a frame index file: {}'.format(fname))
+
+            try:
+                duration, num_times, num_keyframes = struct.unpack('<dII', fi.read(16))
+                times = array.array('d')
+                times.fromfile(fi, num_times)
+                keyframes = array.array('d')
+                keyframes.fromfile(fi, num_keyframes)
+            except (struct.error, EOFError):
+                raise ValueError('Truncated frame index file: {}'.format(fname))
+
+        if sys.byteorder == 'big':
+            times.byteswap()
+            keyframes.byteswap()
+
+        return cls(times, keyframes, duration)
+
+
+# Allowance for rounding when comparing times, e.g. currentTime reported by a browser
+TIME_TOLERANCE = 1e-6
+
+FRAME_INDEX_MAGIC = b'JPYFRAMES1'
+
+
+
+def child_boxes(data, offset, size, header_size):
+    """Return dict mapping box type to (offset, size, header size) of first child of each type
+    """
+    children = {}
+    for kind, child, child_size, child_header in iter_boxes(data, offset + header_size,
+                                                           offset + size):
+        children.setdefault(kind, (child, child_size, child_header))
+
+    return children
+
+
+
+def full_box_payload(data, box):
+    """Return (version, payload offset) for a 'full box' with version and flags fields
+    """
+    offset, size, header_size = box
+    return data[offset + header_size], offset + header_size + 4
+
+
+
+def media_timescale(data, box):
+    """Return timescale field of 'mvhd' or 'mdhd' box
+    """
+    version, start = full_box_payload(data, box)
+    if version == 1:
+        return struct.unpack_from('>I', data, start + 16)[0]
+    else:
+        return struct.unpack_from('>I', data, start + 8)[0]
+
+
+
+def table_entries(data, box, fmt):
+    """Return list of entries of sample table box, each unpacked with struct format fmt
+    """
+    offset, size, header_size = box
+    version, start = full_box_payload(data, box)
+    count, = struct.unpack_from('>I', data, start)
+
+    entry = struct.Struct(fmt)
+    if entry.size*count > offset + size - start - 4:
+        raise ValueError('Truncated sample table at {}'.format(offset))
+
+    return list(entry.iter_unpack(data[start + 4:start + 4 + entry.size*count]))
+
+
+
+def edit_offset(data, trak, movie_timescale):
+    """Return (media time of first frame shown in media timescale units, initial delay in
+    seconds) from the track's edit list.  Defaults to (0, 0) without an edit list.
+    """
+    edts = child_boxes(data, *trak).get(b'edts')
+    if not edts:
+        return 0, 0
+
+    elst = child_boxes(data, *edts).get(b'elst')
+    if not elst:
+        return 0, 0
+
+    version, start = full_box_payload(data, elst)
+    fmt = '>Qq4x' if version == 1 else '>Ii4x'
+
+    delay = 0
+    for segment_duration, media_time in table_entries(data, elst, fmt):
+        if media_time == -1:
+            # Empty edit, track starts later
+            delay += segment_duration/movie_timescale if movie_timescale else 0
+        else:
+            return media_time, delay
+
+    return 0, delay
+
+
+
+def read_frame_index(fp, file_size):
+    """Build FrameIndex for first video track of open MP4 file.  Returns None if the file has no
+    video track or can't be parsed.
+    """
+    try:
+        boxes = read_top_level_boxes(fp, file_size)
+    except (ValueError, struct.error):
+        return None
+
+    for kind, moov_offset, moov_size, moov_header in boxes:
+        if kind == b'moov':
+            break
+    else:
+        return None
+
+    fp.seek(moov_offset)
+    data = fp.read(moov_size)
+    if len(data) != moov_size:
+        return None
+
+    try:
+        moov = child_boxes(data, 0, moov_size, moov_header)
+        movie_timescale = media_timescale(data, moov[b'mvhd']) if b'mvhd' in moov else 0
+
+        for kind, offset, size, header_size in iter_boxes(data, moov_header, moov_size):
+            if kind != b'trak':
+                continue
+
+            trak = offset, size, header_size
+            mdia = child_boxes(data, *trak).get(b'mdia')
+            if not mdia:
+                continue
+
+            mdia_children = child_boxes(data, *mdia)
+            hdlr = mdia_children.get(b'hdlr')
+            if not hdlr:
+                continue
+
+            version, start = full_box_payload(data, hdlr)
+            if data[start + 4:start + 8] != b'vide':
+                continue
+
+            timescale = media_timescale(data, mdia_children[b'mdhd'])
+            stbl = child_boxes(data, *child_boxes(data, *mdia_children[b'minf'])[b'stbl'])
+            media_time, delay = edit_offset(data, trak, movie_timescale)
+
+            return frame_index_from_tables(data, stbl, timescale, media_time, delay)
+    except (KeyError, ValueError, struct.error, ZeroDivisionError):
+        return None
+
+    return None
+
+
+
+def frame_index_from_tables(data, stbl, timescale, media_time=0, delay=0):
+    """Build FrameIndex from a video track's sample table boxes
+    """
+    # Decode times, from sample durations
+    decode_times = []
+    time = 0
+    delta = 0
+    for count, delta in table_entries(data, stbl[b'stts'], '>II'):
+        decode_times.extend(range(time, time + count*delta, delta) if delta else [time]*count)
+        time += count*delta
+    end_time = time
+    last_duration = delta
+
+    # Presentation times, decode times plus composition offsets for B-frames
+    if b'ctts' in stbl:
+        # Offsets are signed in version 1 only, but plenty of muxers write negative offsets
+        # into version 0 boxes.  Real offsets never come near 2**31 either way.
+        sample = 0
+        for count, offset in table_entries(data, stbl[b'ctts'], '>Ii'):
+            for k in range(sample, min(sample + count, len(decode_times))):
+                decode_times[k] += offset
+            sample += count
+
+    scale = 1/timescale
+    times = [(t - media_time)*scale + delay for t in decode_times]
+
+    # Keyframes.  Without a sync sample table every frame is a keyframe.
+    if b'stss' in stbl:
+        keyframes = [times[number - 1] for number, in table_entries(data, stbl[b'stss'], '>I')
+                     if 0 < number <= len(times)]
+    else:
+        keyframes = times
+
+    # Frames before the start of the edit are never shown
+    times = sorted(t for t in times if t >= -TIME_TOLERANCE)
+    keyframes = sorted(t for t in keyframes if t >= -TIME_TOLERANCE)
+    if not times:
+        return None
+    if not keyframes:
+        keyframes = times[:1]
+
+    duration = max((end_time - media_time)*scale + delay, times[-1] + last_duration*scale)
+
+    return FrameIndex(times, keyframes, duration)
+
+
+
+def default_cache_folder(kind='frames'):
+    """Folder for cached frame indexes, or other kind of cached data, following the XDG
+    convention
+    """
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'jpy_video', kind)
+
+
+
+def cache_digest(path, fs):
+    """Return cache key of file at real path with os.stat() result fs.  Changes whenever the file
+    is replaced or modified.
+    """
+    key = '{}|{}|{}|{}|{}'.format(path, fs.st_dev, fs.st_ino, fs.st_size, fs.st_mtime_ns)
+    return hashlib.sha1(key.encode('utf-8', 'surrogateescape')).hexdigest()
+
+
+
+def frame_index(path, cache_folder=None):
+    """Return FrameIndex for MP4 file at path, or None if it has no readable video track.
+
+    Indexes are cached on disk in cache_folder (default ~/.cache/jpy_video/frames), keyed by
+    path and file identity, so a modified file is parsed again.  Set cache_folder=False to
+    skip the disk cache.
+    """
+    path = os.path.realpath(path)
+    fs = os.stat(path)
+
+    fname = None
+    if cache_folder is not False:
+        digest = cache_digest(path, fs)
+        fname = os.path.join(cache_folder or default_cache_folder(), digest + '.idx')
+
+        try:
+            return FrameIndex.load(fname)
+        except (OSError, ValueError):
+            pass
+
+    with open(path, 'rb') as fp:
+        index = read_frame_index(fp, fs.st_size)
+
+    if index is not None and fname:
+        try:
+            os.makedirs(os.path.dirname(fname), exist_ok=True)
+            # Write to temporary name first so readers never see a partial file
+            temp = '{}.{}.tmp'.format(fname, os.getpid())
+            index.save(temp)
+            os.replace(temp, fname)
+        except OSError:
+            pass
+
+    return index
+
+#------------------------------------------------
+# HLS playlists for fragmented MP4
+
+# Top-level boxes that may precede a 'moof' as part of the same fragment
+FRAGMENT_LEAD_BOXES = {b'styp', b'sidx', b'ssix', b'prft', b'emsg'}
+
+
+
+class Fragments():
+    """Byte ranges and durations of the movie fragments of a fragmented MP4 file.
+
+    init_size is the length of the initialization section at the start of the file ('ftyp' and
+    'moov').  Fragment k spans offsets[k] to offsets[k] + sizes[k] - 1 and plays for
+    durations[k] seconds.
+    """
+    def __init__(self, init_size, offsets, sizes, durations):
+        self.init_size = init_size
+        self.offsets = array.array('Q', offsets)
+        self.sizes = array.array('Q', sizes)
+        self.durations = array.array('d', durations)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __repr__(self):
+        return 'Fragments(count={}, duration={:.3f})'.format(len(self), self.duration)
+
+    @property
+    def duration(self):
+        return sum(self.durations)
+
+    def segments(self, target_duration=6):
+        """Group consecutive fragments into segments of about target_duration seconds.  Returns
+        list of (offset, size, duration) tuples.
+        """
+        segments = []
+        offset = size = duration = 0
+        for k in range(len(self.offsets)):
+            if not size:
+                offset = self.offsets[k]
+            size = self.offsets[k] + self.sizes[k] - offset
+            duration += self.durations[k]
+
+            if duration >= target_duration:
+                segments.append((offset, size, duration))
+                size = duration = 0
+
+        if size:
+            segments.append((offset, size, duration))
+
+        return segments
+
+
+
+def track_info(data, moov):
+    """Return (track ID, timescale, default sample duration) of the first video track in 'moov'
+    box, or of the first track if there is no video.  moov is (offset, size, header size).
+    """
+    moov_children = child_boxes(data, *moov)
+
+    tracks = []
+    for kind, offset, size, header_size in iter_boxes(data, moov[0] + moov[2],
+                                                      moov[0] + moov[1]):
+        if kind != b'trak':
+            continue
+
+        trak = child_boxes(data, offset, size, header_size)
+        version, start = full_box_payload(data, trak[b'tkhd'])
+        track_id, = struct.unpack_from('>I', data, start + (16 if version == 1 else 8))
+
+        mdia = child_boxes(data, *trak[b'mdia'])
+        timescale = media_timescale(data, mdia[b'mdhd'])
+
+        version, start = full_box_payload(data, mdia[b'hdlr'])
+        is_video = data[start + 4:start + 8] == b'vide'
+
+        tracks.append((not is_video, track_id, timescale))
+
+    if not tracks:
+        raise ValueError('No tracks found')
+
+    _, track_id, timescale = min(tracks)
+
+    # Defaults for the track's fragments
+    default_duration = 0
+    mvex = moov_children.get(b'mvex')
+    if mvex:
+        for kind, offset, size, header_size in iter_boxes(data, mvex[0] + mvex[2],
+                                                          mvex[0] + mvex[1]):
+            if kind == b'trex':
+                version, start = full_box_payload(data, (offset, size, header_size))
+                trex_id, _, duration = struct.unpack_from('>III', data, start)
+                if trex_id == track_id:
+                    default_duration = duration
+
+    return track_id, timescale, default_duration
+
+
+
+def fragment_duration(data, track_id, default_duration):
+    """Return total sample duration (in track timescale units) of given track within a 'moof'
+    box held in data
+    """
+    kind, size, header_size = parse_box_header(data, 0, len(data))
+
+    total = 0
+    for kind, offset, traf_size, traf_header in iter_boxes(data, header_size, size):
+        if kind != b'traf':
+            continue
+
+        traf = child_boxes(data, offset, traf_size, traf_header)
+        version, start = full_box_payload(data, traf[b'tfhd'])
+        flags = struct.unpack_from('>I', data, start - 4)[0] & 0xFFFFFF
+        tfhd_track_id, = struct.unpack_from('>I', data, start)
+        if tfhd_track_id != track_id:
+            continue
+
+        # Optional tfhd fields, in order: base data offset (8 bytes), sample description index,
+        # default sample duration, ...
+        duration = default_duration
+        position = start + 4
+        if flags & 0x01:
+            position += 8
+        if flags & 0x02:
+            position += 4
+        if flags & 0x08:
+            duration, = struct.unpack_from('>I', data, position)
+
+        for kind, trun, trun_size, trun_header in iter_boxes(data, offset + traf_header,
+                                                             offset + traf_size):
+            if kind != b'trun':
+                continue
+
+            flags = struct.unpack_from('>I', data, trun + trun_header)[0] & 0xFFFFFF
+            count, = struct.unpack_from('>I', data, trun + trun_header + 4)
+
+            if not flags & 0x100:
+                total += count*duration
+                continue
+
+            # Per-sample fields follow optional data offset and first sample flags
+            position = trun + trun_header + 8
+            if flags & 0x01:
+                position += 4
+            if flags & 0x04:
+                position += 4
+
+            stride = 4*bin(flags & 0xF00).count('1')
+            if position + count*stride > trun + trun_size:
+                raise ValueError('Truncated trun box at {}'.format(trun))
+
+            for k in range(count):
+                total += struct.unpack_from('>I', data, position + k*stride)[0]
+
+    return total
+
+
+
+def read_fragments(fp, file_size):
+    """Return Fragments describing open fragmented MP4 file, or None if the file is not
+    fragmented or can't be parsed.
+    """
+    try:
+        boxes = read_top_level_boxes(fp, file_size)
+    except (ValueError, struct.error):
+        return None
+
+    kinds = [kind for kind, _, _, _ in boxes]
+    if b'moov' not in kinds or b'moof' not in kinds or kinds.index(b'moov') > kinds.index(b'moof'):
+        return None
+
+    _, moov_offset, moov_size, moov_header = boxes[kinds.index(b'moov')]
+    fp.seek(moov_offset)
+    data = fp.read(moov_size)
+    if len(data) != moov_size:
+        return None
+
+    try:
+        track_id, timescale, default_duration = track_info(data, (0, moov_size, moov_header))
+
+        offsets = []
+        durations = []
+        ends = []
+        lead = None
+        for kind, offset, size, header_size in boxes:
+            if kind in FRAGMENT_LEAD_BOXES:
+                # Segment type, index etc. belong with the fragment that follows
+                if lead is None:
+                    lead = offset
+                continue
+
+            if kind == b'moof':
+                fp.seek(offset)
+                moof = fp.read(size)
+                offsets.append(offset if lead is None else lead)
+                durations.append(fragment_duration(moof, track_id, default_duration)/timescale)
+                ends.append(offset + size)
+            elif kind == b'mdat' and offsets:
+                ends[-1] = offset + size
+
+            lead = None
+    except (KeyError, ValueError, struct.error, ZeroDivisionError):
+        return None
+
+    # Fragment runs until the next one starts, picking up any boxes in between
+    sizes = [next_offset - offset for offset, next_offset in zip(offsets, offsets[1:])]
+    sizes.append(ends[-1] - offsets[-1])
+
+    return Fragments(moov_offset + moov_size, offsets, sizes, durations)
+
+
+
+def hls_playlist(fragments, uri, target_duration=6):
+    """Return text of an HLS media playlist for fragmented MP4 file.  Every segment is a byte
+    range of the file at uri (relative to the playlist, already URL-quoted).
+    """
+    segments = fragments.segments(target_duration)
+    longest = max([duration for _, _, duration in segments] + [1])
+
+    lines = ['#EXTM3U',
+             '#EXT-X-VERSION:7',
+             '#EXT-X-TARGETDURATION:{}'.format(int(math.ceil(longest))),
+             '#EXT-X-MEDIA-SEQUENCE:0',
+             '#EXT-X-PLAYLIST-TYPE:VOD',
+             '#EXT-X-INDEPENDENT-SEGMENTS',
+             '#EXT-X-MAP:URI="{}",BYTERANGE="{}@0"'.format(uri, fragments.init_size)]
+
+    for offset, size, duration in segments:
+        lines.append('#EXTINF:{:.6f},'.format(duration))
+        lines.append('#EXT-X-BYTERANGE:{}@{}'.format(size, offset))
+        lines.append(uri)
+
+    lines.append('#EXT-X-ENDLIST')
+
+    return '\n'.join(lines) + '\n'
+
+
+
+class FragmentCache(FileInfoCache):
+    """Cache of Fragments objects, see read_fragments()
+    """
+    def compute(self, fp, file_size):
+        return read_fragments(fp, file_size)
+
+    def fragments(self, path, fs, content_type=None):
+        """Return Fragments for file at path, or None if it is not a fragmented MP4 file
+        """
+        return self.get(path, fs, content_type)
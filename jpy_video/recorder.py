@@ -0,0 +1,185 @@
+"""
+Compact history of a Video widget's playback events, see Video.record_events().
+
+Each event is 17 bytes in three fixed-size ring buffers: when it happened (float64 seconds
+since the epoch, from the browser's clock where available), an event type code (uint8) and the
+video's currentTime (float64).  Once full the oldest events are overwritten.
+
+Every record is written twice, at its slot and again one capacity further on, so the buffers
+take 34 bytes per event of capacity.  Whatever the position of the ring, the retained events
+are one contiguous stretch of each buffer in chronological order, so arrays() hands out NumPy
+views without copying anything.  Those views change as later events overwrite the ring, ask for
+copies to keep a snapshot.
+"""
+
+import array
+import time
+
+__all__ = ['EventRecorder']
+
+# Event type codes known up front, others are numbered as they first turn up
+EVENT_TYPES = ['', 'timeupdate', 'play', 'playing', 'pause', 'seeking', 'seeked', 'ended',
+               'ratechange', 'durationchange', 'loadedmetadata', 'loadeddata', 'canplay',
+               'canplaythrough', 'waiting', 'stalled', 'volumechange', 'emptied', 'progress',
+               'resize']
+
+#------------------------------------------------
+
+def import_numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError('Event history queries need NumPy: pip install numpy')
+
+    return numpy
+
+#------------------------------------------------
+
+class EventRecorder():
+    """Ring buffers of the most recent capacity playback events.
+
+    Recorded events are exported with arrays() as NumPy views: timestamps, type codes and
+    current times, oldest first.  event_types[code] is the name of a type code.  The query
+    helpers, coverage(), dwell() and seek_count(), work on the whole arrays at once.
+    """
+    def __init__(self, capacity=65536):
+        if capacity < 1:
+            raise ValueError('Capacity must be at least one event: {}'.format(capacity))
+
+        self.capacity = capacity
+        self.event_types = list(EVENT_TYPES)
+        self._codes = {name: code for code, name in enumerate(self.event_types)}
+
+        self._timestamps = array.array('d', bytes(16*capacity))
+        self._types = array.array('B', bytes(2*capacity))
+        self._current_times = array.array('d', bytes(16*capacity))
+
+        self.count = 0   # events recorded since creation or clear(), including overwritten ones
+
+    def __repr__(self):
+        return '<EventRecorder {} of {} events>'.format(len(self), self.capacity)
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def clear(self):
+        """Forget all recorded events
+        """
+        self.count = 0
+
+    def type_code(self, event_type):
+        """Return code of event type name, numbering new names as they turn up.  Code 0 stands
+        for types past the 256th.
+        """
+        code = self._codes.get(event_type)
+        if code is None:
+            if len(self.event_types) > 255:
+                return 0
+            code = len(self.event_types)
+            self.event_types.append(event_type)
+            self._codes[event_type] = code
+
+        return code
+
+    def record(self, event_type, current_time, timestamp=None):
+        """Append one event.  Default timestamp is now.
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        if current_time is None:
+            current_time = float('nan')
+
+        code = self.type_code(event_type)
+
+        slot = self.count % self.capacity
+        for index in (slot, slot + self.capacity):
+            self._timestamps[index] = timestamp
+            self._types[index] = code
+            self._current_times[index] = current_time
+
+        self.count += 1
+
+    #--------------------------------------------
+    def arrays(self, copy=False):
+        """Return recorded events as NumPy arrays (timestamps, type codes, current times), oldest
+        first.  These are read-only views of the ring buffers, valid only until more events are
+        recorded: later events overwrite the slots they look at.  Set copy=True for arrays of
+        your own that keep the snapshot.
+        """
+        numpy = import_numpy()
+
+        size = len(self)
+        first = (self.count - size) % self.capacity
+
+        result = []
+        for values in (self._timestamps, self._types, self._current_times):
+            view = numpy.frombuffer(values, dtype=values.typecode, count=size,
+                                    offset=first*values.itemsize)
+            if copy:
+                view = view.copy()
+            else:
+                view.flags.writeable = False
+            result.append(view)
+
+        return tuple(result)
+
+    def playback_steps(self, max_step=1.0, max_gap=2.0):
+        """Return (current times, steps) of stretches of normal playback between consecutive
+        events: current time moved forward by at most max_step seconds within max_gap seconds
+        of wall-clock time.  Jumps from seeking and long gaps don't count.
+        """
+        numpy = import_numpy()
+
+        timestamps, codes, current_times = self.arrays()
+        steps = numpy.diff(current_times)
+        gaps = numpy.diff(timestamps)
+
+        with numpy.errstate(invalid='ignore'):
+            played = (steps > 0) & (steps <= max_step) & (gaps <= max_gap)
+
+        return current_times[:-1][played], steps[played]
+
+    def coverage(self, bins=100, duration=None, max_step=1.0, max_gap=2.0):
+        """Histogram of how much of the video was watched.  Returns (seconds, edges): seconds of
+        video played back within each of bins equal stretches of 0...duration, and the
+        bin edges.  A stretch watched twice counts twice.  Default duration is the furthest
+        current time recorded.
+        """
+        numpy = import_numpy()
+
+        starts, steps = self.playback_steps(max_step=max_step, max_gap=max_gap)
+        if duration is None:
+            duration = float(numpy.nanmax(self.arrays()[2])) if len(self) else 0.
+        duration = max(duration, 1e-9)
+
+        return numpy.histogram(starts, bins=bins, range=(0., duration), weights=steps)
+
+    def dwell(self, timebase, max_gap=None):
+        """Wall-clock seconds spent on each frame, as array indexed by frame number.  The time
+        between one event and the next is credited to the frame shown at the first one,
+        including time spent paused.  Gaps between events are capped at max_gap seconds if
+        given.
+        """
+        numpy = import_numpy()
+
+        timestamps, codes, current_times = self.arrays()
+        if len(timestamps) < 2:
+            return numpy.zeros(0)
+
+        gaps = numpy.diff(timestamps)
+        if max_gap is not None:
+            gaps = numpy.minimum(gaps, max_gap)
+
+        times = current_times[:-1]
+        valid = numpy.isfinite(times) & (times >= 0) & (gaps > 0)
+        frames = numpy.floor(times[valid]/timebase + 1e-6).astype(numpy.intp)
+
+        return numpy.bincount(frames, weights=gaps[valid])
+
+    def seek_count(self):
+        """Number of seeks recorded
+        """
+        numpy = import_numpy()
+
+        codes = self.arrays()[1]
+        return int(numpy.count_nonzero(codes == self.type_code('seeking')))
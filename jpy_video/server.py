@@ -15,283 +15,2646 @@ https://github.com/danvk/RangeHTTPServer
 https://docs.python.org/3/library/http.server.html
 """
 
+import asyncio
+import atexit
+import collections
+import contextvars
+import datetime
+import email.parser
+import email.utils
+import hmac
+import html
+import inspect
+import ipaddress
+import itertools
+import http
+import http.client
 import http.server
+import io
+import json
+import mimetypes
+import mmap
 import os
+import queue
 import re
+import secrets
 import socket
 import socketserver
+import stat
 import sys
 import threading
 import time
 import urllib.parse
+import uuid
 
-__all__ = ['Server']
+from . import mjpeg
+from . import mp4
+
+__all__ = ['Server', 'shared_server']
+
+ENGINES = ('thread', 'asyncio')
+
+#------------------------------------------------
+
+BYTE_RANGE_RE = re.compile(r'^\s*(\d*)\s*-\s*(\d*)\s*$')
+
+# Refuse to honor a Range header listing more parts than this
+MAX_BYTE_RANGES = 64
+
+def parse_byte_ranges(byte_range):
+    """Returns list of (first, last) number pairs in 'bytes=0-99,200-,-500' or throws ValueError.
+
+    https://tools.ietf.org/html/rfc7233#section-2.1
+
+    Open-ended range 'N-' is returned as (N, None) and suffix range '-N' (final N bytes of the
+    file) as (None, N).  An empty header returns an empty list.
+    """
+    if byte_range.strip() == '':
+        return []
+
+    unit, _, specs = byte_range.partition('=')
+    if unit.strip() != 'bytes' or not specs.strip():
+        raise ValueError('Invalid byte range: {}'.format(byte_range))
+
+    ranges = []
+    for spec in specs.split(','):
+        if not spec.strip():
+            # RFC 7230 list syntax tolerates empty elements
+            continue
+
+        m = BYTE_RANGE_RE.match(spec)
+        if not m or m.groups() == ('', ''):
+            raise ValueError('Invalid byte range: {}'.format(byte_range))
+
+        first, last = [int(x) if x else None for x in m.groups()]
+        if first is not None and last is not None and last < first:
+            raise ValueError('Invalid byte range: {}'.format(byte_range))
+
+        ranges.append((first, last))
+
+    if not ranges or len(ranges) > MAX_BYTE_RANGES:
+        raise ValueError('Invalid byte range: {}'.format(byte_range))
+
+    return ranges
+
+def parse_byte_range(byte_range):
+    """Returns the two numbers in 'bytes=123-456' or throws ValueError.
+
+    The last number or both numbers may be None.  Only a single range with a first position is
+    accepted, use parse_byte_ranges() for multiple and suffix ranges.
+    """
+    ranges = parse_byte_ranges(byte_range)
+    if not ranges:
+        return None, None
+
+    if len(ranges) != 1 or ranges[0][0] is None:
+        raise ValueError('Invalid byte range: {}'.format(byte_range))
+
+    return ranges[0]
+
+def clamp_byte_range(first, last, file_size):
+    """Fit parsed byte range to the size of the file being served.
+
+    Returns inclusive (first, last) positions, or None if the range is not satisfiable.
+    """
+    if first >= file_size:
+        # https://tools.ietf.org/html/rfc7233
+        return None
+
+    if last is None:
+        # Range end is unspecified, so server gets to decide.
+        last = first + file_size  #1024*1024
+
+    if last >= file_size:
+        # Don't go past end of file
+        last = file_size - 1
+
+    return first, last
+
+def resolve_byte_ranges(ranges, file_size):
+    """Fit list of parsed byte ranges to the size of the file being served.
+
+    Suffix ranges are converted to absolute positions, unsatisfiable ranges are dropped, and
+    overlapping or adjacent ranges are coalesced.  Returns sorted list of inclusive (first, last)
+    positions, empty if nothing requested is satisfiable.
+    """
+    resolved = []
+    for first, last in ranges:
+        if first is None:
+            # Suffix range, final 'last' bytes of file
+            if last == 0:
+                continue
+            first = max(file_size - last, 0)
+            last = None
+
+        byte_range = clamp_byte_range(first, last, file_size)
+        if byte_range:
+            resolved.append(byte_range)
+
+    resolved.sort()
+
+    coalesced = []
+    for first, last in resolved:
+        if coalesced and first <= coalesced[-1][1] + 1:
+            coalesced[-1] = coalesced[-1][0], max(last, coalesced[-1][1])
+        else:
+            coalesced.append((first, last))
+
+    return coalesced
+
+def multipart_byteranges(ranges, content_type, file_size, boundary):
+    """Framing for a multipart/byteranges response body.
+
+    https://tools.ietf.org/html/rfc7233#appendix-A
+
+    Returns list of (part header bytes, first, last) tuples, the closing delimiter bytes and the
+    total Content-Length of the body.
+    """
+    parts = []
+    content_length = 0
+    for first, last in ranges:
+        head = ('\r\n--{}\r\n'
+                'Content-Type: {}\r\n'
+                'Content-Range: bytes {}-{}/{}\r\n\r\n').format(boundary, content_type,
+                                                                first, last, file_size)
+        head = head.encode('latin-1')
+        parts.append((head, first, last))
+        content_length += len(head) + last - first + 1
+
+    tail = '\r\n--{}--\r\n'.format(boundary).encode('latin-1')
+    content_length += len(tail)
+
+    return parts, tail, content_length
+
+#------------------------------------------------
+
+class RangeCap():
+    """Adaptive size limit for open-ended 'bytes=N-' responses on one connection.
+
+    A browser asking for 'bytes=N-' will usually abort the response at its next seek, so there's
+    no point committing to stream the rest of a multi-GB file.  The limit starts small and is
+    tuned by how the client behaves: a request picking up exactly where the previous response
+    ended looks like sequential playback and doubles the limit (up to maximum), anything else
+    looks like scrubbing or frame-stepping and halves it (down to minimum).
+    """
+    def __init__(self, minimum, maximum):
+        self.minimum = min(minimum, maximum)
+        self.maximum = maximum
+        self.size = self.minimum
+        self._next = None
+
+    def limit(self, first):
+        """Return maximum response size for open-ended range starting at byte position first
+        """
+        if self._next is not None:
+            if first == self._next:
+                self.size = min(self.size*2, self.maximum)
+            else:
+                self.size = max(self.size//2, self.minimum)
+
+        return self.size
+
+    def served(self, first, last):
+        """Record byte range actually sent to the client
+        """
+        self._next = last + 1
+
+def cap_open_range(ranges, range_cap):
+    """Apply adaptive limit to a lone open-ended range, return updated list of ranges
+    """
+    if range_cap and len(ranges) == 1:
+        first, last = ranges[0]
+        if first is not None and last is None:
+            ranges = [(first, first + range_cap.limit(first) - 1)]
+
+    return ranges
+
+#------------------------------------------------
+# Validators for conditional requests
+# https://tools.ietf.org/html/rfc7232
+
+def file_identity(fs):
+    """Tuple of os.stat() fields that change whenever the file's contents are replaced
+    """
+    return fs.st_ino, fs.st_size, fs.st_mtime_ns
+
+def file_version(fs):
+    """Short string identifying file contents, built from os.stat() inode, size and mtime
+    """
+    return '{:x}-{:x}-{:x}'.format(*file_identity(fs))
+
+def file_etag(fs, layout=None):
+    """Strong entity tag for file described by os.stat() result.  Bytes served rearranged by an
+    mp4.FaststartLayout are a different representation and get a different tag.
+    """
+    if layout is not None:
+        return '"{}-faststart"'.format(file_version(fs))
+
+    return '"{}"'.format(file_version(fs))
+
+def validator_headers(fs, layout=None):
+    """Caching and validator headers sent with every file response, including 304.  There is no
+    Last-Modified when a layout is applied, since the file's date also stands for the bytes as
+    stored on disk.
+    """
+    # https://developer.mozilla.org/en-US/docs/Web/HTTP/Headers/Cache-Control
+    # https://developer.mozilla.org/en-US/docs/Web/HTTP/Caching
+    headers = [('ETag', file_etag(fs, layout))]
+    if layout is None:
+        headers.append(('Last-Modified', email.utils.formatdate(fs.st_mtime, usegmt=True)))
+    headers.append(('Cache-Control', 'public, max-age=31536000'))
+
+    return headers
+
+def parse_http_date(text):
+    """Return POSIX timestamp for HTTP date string, or None if it can't be parsed
+    """
+    try:
+        when = email.utils.parsedate_to_datetime(text)
+    except (TypeError, ValueError, IndexError, OverflowError):
+        return None
+
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=datetime.timezone.utc)
+
+    return when.timestamp()
+
+def not_modified(headers, fs, layout=None):
+    """Return True if If-None-Match or If-Modified-Since show the client's cached copy is current.
+    Only If-None-Match counts when a layout is applied.
+    """
+    if 'If-None-Match' in headers:
+        # Weak comparison, If-Modified-Since is ignored when If-None-Match is present
+        etag = file_etag(fs, layout)
+        tags = [tag.strip() for tag in headers['If-None-Match'].split(',')]
+        return '*' in tags or etag in tags or 'W/' + etag in tags
+
+    if 'If-Modified-Since' in headers and layout is None:
+        since = parse_http_date(headers['If-Modified-Since'])
+        return since is not None and int(fs.st_mtime) <= since
+
+    return False
+
+def range_applies(headers, fs, layout=None):
+    """Return False if If-Range shows the client's partial copy is stale, meaning its Range
+    header must be ignored and the whole file sent.  A date never matches bytes rearranged by a
+    layout.
+    """
+    if_range = headers.get('If-Range', '').strip()
+    if not if_range:
+        return True
+
+    if if_range.startswith('"'):
+        # Strong comparison
+        return if_range == file_etag(fs, layout)
+
+    if if_range.startswith('W/') or layout is not None:
+        return False
+
+    since = parse_http_date(if_range)
+    return since is not None and int(fs.st_mtime) == since
+
+def translate_path(path_base, path):
+    """Map URL path onto local file system path rooted at path_base.  Not memoized, realpath()
+    looks at the file system and symlinks may be retargeted while the server runs.
+
+    http://louistiao.me/posts/python-simplehttpserver-recipe-serve-specific-directory/
+    """
+    path = os.path.realpath(urllib.parse.unquote(path))
+    words = path.split('/')
+    words = filter(None, words)
+
+    path_work = path_base
+    for word in words:
+        drive, word = os.path.splitdrive(word)
+        head, word = os.path.split(word)
+        if word in (os.curdir, os.pardir):
+            continue
+
+        path_work = os.path.join(path_work, word)
+
+    # Strip off any parameters
+    parts = path_work.split('?')
+    return parts[0]
+
+def resolve_url_path(path_base, roots, path):
+    """Map URL path onto local file system path.
+
+    URLs of the form '/<token>/...' are resolved against the file or folder registered under that
+    token in dict roots, anything else against folder path_base.  Returns None if the URL doesn't
+    map onto anything this server is allowed to serve.  Registered in-memory files and live
+    streams are returned as their MemoryFile or mjpeg.FrameStream.
+    """
+    if roots:
+        url_path = urllib.parse.urlsplit(path).path
+        token, _, rest = url_path.lstrip('/').partition('/')
+        root = roots.get(token)
+        if root is not None:
+            if isinstance(root, (MemoryFile, mjpeg.FrameStream)):
+                return root
+            elif os.path.isdir(root):
+                return translate_path(root, '/' + rest)
+            else:
+                # Registered file, trailing file name in URL is only cosmetic
+                return root
+
+    if path_base is None:
+        return None
+
+    return translate_path(path_base, path)
+
+def registered_url(roots, path):
+    """Return True if URL path is resolved through a token in dict roots, see resolve_url_path()
+    """
+    if not roots:
+        return False
+
+    url_path = urllib.parse.urlsplit(path).path
+    token = url_path.lstrip('/').partition('/')[0]
+    return token in roots
+
+# Playlist URL of a media file is the file's URL plus this suffix
+HLS_SUFFIX = '.m3u8'
+HLS_CONTENT_TYPE = 'application/vnd.apple.mpegurl'
+
+def playlist_media_path(path_base, roots, path, path_work=None):
+    """Return local path (or MemoryFile) of the media file whose HLS playlist is requested by
+    URL path, or None.
+    Playlist URLs are the media file's URL with HLS_SUFFIX appended.  Real playlist files on disk
+    (path_work) take precedence.
+    """
+    url_path = urllib.parse.urlsplit(path).path
+    if not url_path.endswith(HLS_SUFFIX):
+        return None
+
+    if path_work and path_work.endswith(HLS_SUFFIX) and os.path.isfile(path_work):
+        return None
+
+    media = resolve_url_path(path_base, roots, url_path[:-len(HLS_SUFFIX)])
+    if isinstance(media, MemoryFile) or (isinstance(media, str) and os.path.isfile(media)):
+        return media
+    else:
+        return None
+
+def playlist_body(fragment_cache, media, path, segment_duration=6):
+    """Return HLS playlist as bytes for fragmented MP4 file media requested via URL path, or
+    None if the file is not fragmented.  Segment URIs are relative to the playlist and keep the
+    URL's query string.
+    """
+    fs, content_type = source_stat(media)
+    fragments = fragment_cache.fragments(media, fs, content_type)
+    if fragments is None:
+        return None
+
+    parts = urllib.parse.urlsplit(path)
+    uri = parts.path[:-len(HLS_SUFFIX)].rsplit('/', 1)[-1]
+    if parts.query:
+        uri += '?' + parts.query
+
+    return mp4.hls_playlist(fragments, uri, segment_duration).encode('utf-8')
+
+def guess_mime_type(path):
+    """Return MIME type for file based on its extension
+    """
+    return mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+#------------------------------------------------
+# In-memory files
+
+# Fake device number for in-memory files, keeps them apart from real files in caches keyed on
+# os.stat() fields
+MEMORY_DEVICE = -1
+
+_memory_inodes = itertools.count(1)
+
+class MemoryFile():
+    """Video data held in memory, served like a registered local file (see Server.register()).
+
+    Accepts bytes, bytearray, memoryview, io.BytesIO, or anything else supporting the buffer
+    protocol, e.g. a NumPy array of encoded bytes.  Nothing is copied: responses are slices of
+    a memoryview on the caller's buffer.  Name is cosmetic apart from determining the MIME type.
+
+    The buffer stays exported until close() and any responses still in flight are done with it.
+    Don't modify it in the meantime.
+    """
+    def __init__(self, data, name='video.mp4', content_type=None):
+        if isinstance(data, io.BytesIO):
+            data = data.getbuffer()
+
+        source = memoryview(data)
+        if not source.c_contiguous:
+            source.release()
+            raise ValueError('In-memory video data must be a contiguous buffer')
+
+        self.view = source.cast('B') if source.format != 'B' or source.ndim != 1 else source
+        self._source = source
+
+        self.name = name
+        self.content_type = content_type or guess_mime_type(name)
+        self.token = secrets.token_hex(10)
+
+        # Synthetic os.stat() result for validators and caches.  Each instance is a new "file".
+        now = time.time()
+        now_ns = int(now*1e9)
+        self.fs = os.stat_result((stat.S_IFREG | 0o444, next(_memory_inodes), MEMORY_DEVICE, 1,
+                                  0, 0, self.view.nbytes, int(now), int(now), int(now),
+                                  now, now, now, now_ns, now_ns, now_ns))
+
+    def __repr__(self):
+        return '<MemoryFile {} ({} bytes)>'.format(self.name, self.size)
+
+    @property
+    def size(self):
+        return self.fs.st_size
+
+    @property
+    def closed(self):
+        return self._source is None
+
+    def open(self):
+        """Return new MemoryReader file object on the data
+        """
+        if self.closed:
+            raise OSError('In-memory file is closed: {}'.format(self.name))
+
+        return MemoryReader(self.view)
+
+    def close(self):
+        """Stop serving the data.  The underlying buffer is released once open readers close.
+        """
+        if self.closed:
+            return
+
+        if self.view is not self._source:
+            self.view.release()
+        self._source.release()
+        self._source = None
+
+
+
+class MemoryReader(io.RawIOBase):
+    """Read-only, seekable file object on a memoryview.  Holds its own view of the buffer so it
+    keeps working after the MemoryFile it came from is closed.
+    """
+    def __init__(self, view):
+        super().__init__()
+        self.view = view[:]
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_SET:
+            self._position = offset
+        elif whence == os.SEEK_CUR:
+            self._position += offset
+        elif whence == os.SEEK_END:
+            self._position = len(self.view) + offset
+        else:
+            raise ValueError('Invalid whence: {}'.format(whence))
+
+        self._position = max(self._position, 0)
+        return self._position
+
+    def tell(self):
+        return self._position
+
+    def readinto(self, buffer):
+        data = self.view[self._position:self._position + len(buffer)]
+        count = len(data)
+        memoryview(buffer).cast('B')[:count] = data
+        self._position += count
+        return count
+
+    def slice(self, first, last):
+        """Zero-copy memoryview of inclusive byte range
+        """
+        return self.view[first:last + 1]
+
+    def close(self):
+        if not self.closed:
+            self.view.release()
+        super().close()
+
+#------------------------------------------------
+# Opening files
+
+def open_source(source, file_cache=None, guess_type=guess_mime_type):
+    """Open local file at path source (through file_cache when given), or a MemoryFile.
+    Returns file object, os.stat() result and MIME type.  Raises OSError if there is no such file.
+    """
+    if isinstance(source, MemoryFile):
+        return source.open(), source.fs, source.content_type
+
+    if file_cache is not None:
+        fp = file_cache.open(source, guess_type)
+        return fp, fp.fs, fp.content_type
+
+    fp = open(source, 'rb')
+    return fp, os.fstat(fp.fileno()), guess_type(source)
+
+def source_stat(source):
+    """Return os.stat() result and MIME type of local file at path source, or of a MemoryFile
+    """
+    if isinstance(source, MemoryFile):
+        return source.fs, source.content_type
+
+    return os.stat(source), guess_mime_type(source)
+
+def record_key(path_work, path):
+    """Key for request metrics: local file path, or URL path for anything else
+    """
+    if isinstance(path_work, str):
+        return path_work
+
+    return urllib.parse.urlsplit(path).path
+
+#------------------------------------------------
+
+class CachedFile():
+    """Open file shared by every request for the same path, see FileCache.
+    """
+    def __init__(self, path, content_type, use_mmap=False):
+        self.path = path
+        self.content_type = content_type
+        self.fp = open(path, 'rb')
+        self.fs = os.fstat(self.fp.fileno())
+
+        self.mmap = None
+        self.view = None
+        if use_mmap and self.fs.st_size > 0:
+            self.mmap = mmap.mmap(self.fp.fileno(), 0, access=mmap.ACCESS_READ)
+            self.view = memoryview(self.mmap)
+
+        self.references = 0
+        self.retired = False
+        self.validated = self.used = time.monotonic()
+        self.lock = threading.Lock()
+
+    def close(self):
+        if self.view is not None:
+            self.view.release()
+            self.mmap.close()
+            self.view = self.mmap = None
+        self.fp.close()
+
+
+
+class FileHandle():
+    """One request's reference to a CachedFile.
+
+    Behaves enough like a binary file object for copy_chunks() and loop.sendfile(): fileno(),
+    seek(), tell(), readinto() and close().  Reads are positional (mmap or pread) so concurrent
+    requests never fight over the shared file position.  Closing the handle releases the
+    reference, it does not close the shared file.
+    """
+    def __init__(self, cache, entry):
+        self._cache = cache
+        self._entry = entry
+        self._position = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @property
+    def fs(self):
+        return self._entry.fs
+
+    @property
+    def content_type(self):
+        return self._entry.content_type
+
+    def fileno(self):
+        return self._entry.fp.fileno()
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self._position
+        elif whence == os.SEEK_END:
+            offset += self._entry.fs.st_size
+        self._position = offset
+        return self._position
+
+    def tell(self):
+        return self._position
+
+    def readinto(self, buffer):
+        entry = self._entry
+        if entry.view is not None:
+            num_read = max(min(len(buffer), entry.fs.st_size - self._position), 0)
+            buffer[:num_read] = entry.view[self._position:self._position + num_read]
+        elif hasattr(os, 'preadv'):
+            num_read = os.preadv(entry.fp.fileno(), [buffer], self._position)
+        else:
+            with entry.lock:
+                entry.fp.seek(self._position)
+                num_read = entry.fp.readinto(buffer)
+
+        self._position += num_read
+        return num_read
+
+    def close(self):
+        if self._entry is not None:
+            self._cache.release(self._entry)
+            self._entry = None
+
+
+
+class FileCache():
+    """LRU cache of open files together with their os.stat() results and MIME types.
+
+    Saves the open/fstat/guess_type round trip on every one of the hundreds of range requests a
+    browser makes while scrubbing through a video.  Entries are checked against the file on disk
+    (inode, size, mtime) at most once per validate_interval seconds, closed after idle_timeout
+    seconds without use, and at most max_files descriptors are held open at a time.  Files in use
+    by a request are never closed out from under it.
+    """
+    def __init__(self, max_files=32, idle_timeout=60, validate_interval=1, use_mmap=False):
+        self.max_files = max_files
+        self.idle_timeout = idle_timeout
+        self.validate_interval = validate_interval
+        self.use_mmap = use_mmap
+
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, path):
+        """True if path is cached and was recently confirmed to be a regular file
+        """
+        entry = self._entries.get(path)
+        if entry is None:
+            return False
+
+        return time.monotonic() - entry.validated < self.validate_interval
+
+    def open(self, path, guess_type=guess_mime_type):
+        """Return FileHandle for local file, opening it if not already cached.  Raises OSError
+        if the file can't be opened.
+        """
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(path)
+            stale = entry is not None and now - entry.validated >= self.validate_interval
+
+        if stale:
+            # Stat outside the lock, network file systems can be slow
+            try:
+                fs = os.stat(path)
+            except OSError:
+                fs = None
+
+            with self._lock:
+                if fs and file_identity(fs) == file_identity(entry.fs):
+                    entry.validated = now
+                else:
+                    self._retire(entry)
+                    entry = None
+
+        if entry is None:
+            entry = CachedFile(path, guess_type(path), use_mmap=self.use_mmap)
+
+            with self._lock:
+                current = self._entries.get(path)
+                if current is not None:
+                    # Another thread got here first
+                    entry.close()
+                    entry = current
+                else:
+                    self._entries[path] = entry
+
+        with self._lock:
+            entry.references += 1
+            entry.used = now
+            if not entry.retired:
+                self._entries.move_to_end(path)
+            self._evict(now)
+
+        return FileHandle(self, entry)
+
+    def release(self, entry):
+        """Drop a request's reference to cached file
+        """
+        with self._lock:
+            entry.references -= 1
+            if entry.retired and entry.references <= 0:
+                entry.close()
+
+    def clear(self):
+        """Close all cached files not currently in use
+        """
+        with self._lock:
+            for entry in list(self._entries.values()):
+                self._retire(entry)
+
+    def _retire(self, entry):
+        """Remove entry from cache, close it once no request is using it.  Call with lock held.
+        """
+        if self._entries.get(entry.path) is entry:
+            del self._entries[entry.path]
+
+        if not entry.retired:
+            entry.retired = True
+            if entry.references <= 0:
+                entry.close()
+
+    def _evict(self, now):
+        """Enforce file descriptor budget and idle timeout.  Call with lock held.
+        """
+        excess = len(self._entries) - self.max_files
+        for entry in list(self._entries.values()):
+            idle = now - entry.used > self.idle_timeout
+            if excess <= 0 and not idle:
+                # Entries are in least-recently-used order, nothing further along is idle
+                break
+
+            if entry.references <= 0:
+                self._retire(entry)
+                excess -= 1
+
+
+
+class BlockCache():
+    """In-memory LRU cache of aligned file blocks.
+
+    Meant for videos living on slow or network file systems (NFS, SMB), where every seek back to
+    a recently viewed part of the file would otherwise go back over the network.  Blocks are
+    keyed by file identity (device, inode, size, mtime) so a modified file never serves stale
+    data.  Least-recently-used blocks are dropped once memory_budget bytes are in use.
+    """
+    def __init__(self, memory_budget=256*1024*1024, block_size=1024*1024):
+        self.memory_budget = memory_budget
+        self.block_size = block_size
+
+        self._blocks = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_used = 0
+        self.reset_stats()
+
+    def __len__(self):
+        return len(self._blocks)
+
+    def reset_stats(self):
+        """Zero the hit/miss counters
+        """
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def stats(self):
+        """Return dict of cache counters
+        """
+        with self._lock:
+            return {'hits': self.hits,
+                    'misses': self.misses,
+                    'evictions': self.evictions,
+                    'blocks': len(self._blocks),
+                    'bytes': self.memory_used,
+                    'memory_budget': self.memory_budget,
+                    'block_size': self.block_size}
+
+    def key(self, fs, index):
+        """Cache key for block number index of file described by os.stat() result fs
+        """
+        return (fs.st_dev,) + file_identity(fs) + (index,)
+
+    def lookup(self, fs, index):
+        """Return cached block, or None on a cache miss
+        """
+        key = self.key(fs, index)
+        with self._lock:
+            block = self._blocks.get(key)
+            if block is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._blocks.move_to_end(key)
+
+        return block
+
+    def load(self, fs, src, index):
+        """Read block from file object src and add it to the cache
+        """
+        block = bytearray(self.block_size)
+        src.seek(index*self.block_size)
+        num_read = src.readinto(block)
+        del block[num_read:]
+
+        key = self.key(fs, index)
+        with self._lock:
+            if key not in self._blocks:
+                self._blocks[key] = block
+                self.memory_used += len(block)
+
+            while self.memory_used > self.memory_budget and self._blocks:
+                key_old, block_old = self._blocks.popitem(last=False)
+                self.memory_used -= len(block_old)
+                self.evictions += 1
+
+        return block
+
+    def get(self, fs, src, index):
+        """Return block from cache, reading it from file object src on a miss
+        """
+        block = self.lookup(fs, index)
+        if block is None:
+            block = self.load(fs, src, index)
+
+        return block
+
+    def blocks(self, first, last):
+        """Yield (index, start, stop) for each block overlapping inclusive byte range, where start
+        and stop are offsets within the block.
+        """
+        position = first
+        while position <= last:
+            index = position//self.block_size
+            start = position - index*self.block_size
+            stop = min(self.block_size, last + 1 - index*self.block_size)
+            yield index, start, stop
+            position += stop - start
+
+    def clear(self):
+        """Drop all cached blocks
+        """
+        with self._lock:
+            self._blocks.clear()
+            self.memory_used = 0
 
 #------------------------------------------------
+# Directory listings
+
+class DirectoryListing():
+    """Sorted snapshot of a folder's contents.
+
+    Each entry is a tuple (name, is_dir, size, mtime, content_type).  Size and content type are
+    None for sub-folders.
+    """
+    def __init__(self, path, mtime_ns, entries):
+        self.path = path
+        self.mtime_ns = mtime_ns
+        self.entries = entries
+
+        # Rendered pages, keyed by everything that goes into the response body
+        self.pages = collections.OrderedDict()
+
+    @classmethod
+    def scan(cls, path):
+        """Read folder contents from disk.  Raises OSError if folder can't be read.
+        """
+        mtime_ns = os.stat(path).st_mtime_ns
+
+        entries = []
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    fs = entry.stat()
+                except OSError:
+                    # Broken link or file vanished since scandir() saw it
+                    continue
+
+                if stat.S_ISDIR(fs.st_mode):
+                    entries.append((entry.name, True, None, fs.st_mtime, None))
+                else:
+                    entries.append((entry.name, False, fs.st_size, fs.st_mtime,
+                                    guess_mime_type(entry.name)))
+
+        entries.sort(key=lambda e: e[0].lower())
+
+        return cls(path, mtime_ns, entries)
+
+    def page_count(self, page_size):
+        return max((len(self.entries) + page_size - 1)//page_size, 1)
+
+    def page(self, number, page_size):
+        """Return entries on given page, first page is number 1
+        """
+        first = (number - 1)*page_size
+        return self.entries[first:first + page_size]
+
+
+
+class DirectoryCache():
+    """LRU cache of DirectoryListing objects for folders with many files.
+
+    A cached listing is used for as long as the folder's modification time is unchanged, which
+    covers files being added, removed or renamed.  Changes to the size of a file already in the
+    folder show up once the folder itself changes.  Rendered pages are cached with the listing.
+    """
+    # Rendered pages kept per listing
+    max_pages = 8
+
+    def __init__(self, max_dirs=16):
+        self.max_dirs = max_dirs
+
+        self._listings = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._listings)
+
+    def listing(self, path):
+        """Return current DirectoryListing for local folder path.  Raises OSError if folder
+        can't be read.
+        """
+        mtime_ns = os.stat(path).st_mtime_ns
+        with self._lock:
+            listing = self._listings.get(path)
+            if listing is not None and listing.mtime_ns == mtime_ns:
+                self._listings.move_to_end(path)
+                return listing
+
+        # Scan outside the lock, big folders take a while
+        listing = DirectoryListing.scan(path)
+
+        with self._lock:
+            self._listings[path] = listing
+            self._listings.move_to_end(path)
+            while len(self._listings) > self.max_dirs:
+                self._listings.popitem(last=False)
+
+        return listing
+
+    def render(self, path, url_path, query, page_size=1000):
+        """Return (body, content_type) for one page of folder listing, see render_directory()
+        """
+        listing = self.listing(path)
+        key = url_path, query, page_size
+
+        with self._lock:
+            result = listing.pages.get(key)
+            if result is not None:
+                listing.pages.move_to_end(key)
+                return result
+
+        result = render_directory(listing, url_path, query, page_size)
+
+        with self._lock:
+            listing.pages[key] = result
+            while len(listing.pages) > self.max_pages:
+                listing.pages.popitem(last=False)
+
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._listings.clear()
+
+
+
+def render_directory(listing, url_path, query, page_size=1000):
+    """Return (body, content_type) for one page of a folder listing.
+
+    Query parameters:
+        page=N        page number, starting from 1
+        per_page=N    entries per page, default page_size
+        format=json   JSON document instead of HTML
+    """
+    params = urllib.parse.parse_qs(query)
+
+    def int_param(name, default):
+        try:
+            return max(int(params[name][0]), 1)
+        except (KeyError, ValueError):
+            return default
+
+    page_size = int_param('per_page', page_size)
+    page_count = listing.page_count(page_size)
+    number = min(int_param('page', 1), page_count)
+    entries = listing.page(number, page_size)
+
+    if params.get('format', [''])[0] == 'json':
+        doc = {'path': urllib.parse.unquote(url_path),
+               'page': number,
+               'pages': page_count,
+               'per_page': page_size,
+               'total': len(listing.entries),
+               'entries': [{'name': name,
+                            'type': 'directory' if is_dir else 'file',
+                            'size': size,
+                            'mtime': mtime,
+                            'mime': content_type}
+                           for name, is_dir, size, mtime, content_type in entries]}
+
+        body = json.dumps(doc, separators=(',', ':')).encode('utf-8', 'surrogateescape')
+        return body, 'application/json'
+
+    items = []
+    for name, is_dir, size, mtime, content_type in entries:
+        if is_dir:
+            name += '/'
+        items.append('<li><a href="{}">{}</a></li>'.format(urllib.parse.quote(name),
+                                                           html.escape(name)))
+
+    nav = ''
+    if page_count > 1:
+        links = []
+        for label, target in (('previous', number - 1), ('next', number + 1)):
+            if 1 <= target <= page_count:
+                links.append('<a href="?page={}&amp;per_page={}">{}</a>'.format(target, page_size,
+                                                                                label))
+        nav = '<p>Page {} of {} {}</p>\n'.format(number, page_count, ' '.join(links))
+
+    displaypath = html.escape(urllib.parse.unquote(url_path))
+    body = _directory_template.format(path=displaypath, items='\n'.join(items), nav=nav)
+
+    return body.encode('utf-8', 'surrogateescape'), 'text/html; charset=utf-8'
+
+
+
+def directory_page(directory_cache, path_work, url, page_size=1000):
+    """Return (body, content_type) listing local folder path_work requested via url.  Uses
+    directory_cache when given, otherwise scans the folder afresh.  Raises OSError if the folder
+    can't be read.
+    """
+    parts = urllib.parse.urlsplit(url)
+    if directory_cache is not None:
+        return directory_cache.render(path_work, parts.path, parts.query, page_size)
+    else:
+        return render_directory(DirectoryListing.scan(path_work), parts.path, parts.query,
+                                page_size)
+
+
+_directory_template = """<!DOCTYPE HTML>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>Directory listing for {path}</title>
+</head>
+<body>
+<h1>Directory listing for {path}</h1>
+<hr>
+{nav}<ul>
+{items}
+</ul>
+<hr>
+</body>
+</html>
+"""
+
+#------------------------------------------------
+
+class RequestRecord():
+    """Outcome and timing of a single request, filled in as the response goes out
+    """
+    __slots__ = ('key', 'start', 'status', 'first_byte', 'bytes_sent')
+
+    def __init__(self, key=None):
+        self.key = key
+        self.start = time.perf_counter()
+        self.status = None
+        self.first_byte = None
+        self.bytes_sent = 0
+
+    def response_started(self, status):
+        """Note status code and time at which response headers went out
+        """
+        self.status = status
+        self.first_byte = time.perf_counter()
+
+
+
+class LatencyReservoir():
+    """Most recent latency samples, enough for percentiles without unbounded memory
+    """
+    def __init__(self, size=1024):
+        self.samples = collections.deque(maxlen=size)
+        self.count = 0
+
+    def add(self, value):
+        self.samples.append(value)
+        self.count += 1
+
+    def summary(self):
+        """Return dict of count and p50/p90/p99/max in seconds over retained samples
+        """
+        values = sorted(self.samples)
+        result = {'count': self.count}
+        for name, fraction in (('p50', 0.50), ('p90', 0.90), ('p99', 0.99), ('max', 1.0)):
+            if values:
+                result[name] = values[min(int(fraction*len(values)), len(values) - 1)]
+            else:
+                result[name] = None
+
+        return result
+
+
+
+class RequestCounters():
+    """Request, byte, status code and latency counters for one file or for the whole server
+    """
+    def __init__(self, reservoir_size=1024):
+        self.requests = 0
+        self.bytes_sent = 0
+        self.status = collections.Counter()
+        self.time_to_first_byte = LatencyReservoir(reservoir_size)
+        self.transfer_time = LatencyReservoir(reservoir_size)
+
+    def add(self, record, now):
+        self.requests += 1
+        self.bytes_sent += record.bytes_sent
+        self.status[record.status] += 1
+        if record.first_byte is not None:
+            self.time_to_first_byte.add(record.first_byte - record.start)
+        self.transfer_time.add(now - record.start)
+
+    def summary(self):
+        return {'requests': self.requests,
+                'bytes_sent': self.bytes_sent,
+                'status': dict(self.status),
+                'time_to_first_byte': self.time_to_first_byte.summary(),
+                'transfer_time': self.transfer_time.summary()}
+
+
+
+class ServerStats():
+    """Per-file and aggregate request metrics for a server.
+
+    Recording a request costs a dict lookup, a few integer increments and two deque appends, so
+    this is cheap enough to leave switched on.  Latency percentiles are computed over a window of
+    recent samples only when a snapshot is taken.
+
+    A request is added once its last byte has been handed to the socket, which can be a moment
+    after the client has the whole response.  Requests in between are counted as active, and
+    snapshot(wait=...) waits for them to be added.
+    """
+    # Beyond this many distinct files, further files are lumped together under key OTHER
+    max_files = 1000
+    OTHER = '(other)'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._finished = threading.Condition(self._lock)
+        self.active_connections = 0
+        self.active_requests = 0
+        self.reset()
+
+    def reset(self):
+        """Zero all counters.  Active connection and request counts are left alone, they are
+        gauges.
+        """
+        with self._lock:
+            self.since = time.time()
+            self.connections = 0
+            self.refused = 0
+            self.total = RequestCounters()
+            self.files = {}
+
+    def connection_opened(self):
+        with self._lock:
+            self.connections += 1
+            self.active_connections += 1
+
+    def connection_closed(self):
+        with self._lock:
+            self.active_connections -= 1
+
+    def connection_refused(self):
+        with self._lock:
+            self.refused += 1
+
+    def request_started(self):
+        with self._lock:
+            self.active_requests += 1
+
+    def record(self, record):
+        """Add completed request to the counters.  Every request_started() call must be
+        matched by one call to record().
+        """
+        now = time.perf_counter()
+        key = record.key or self.OTHER
+
+        with self._lock:
+            self.active_requests = max(self.active_requests - 1, 0)
+            self._finished.notify_all()
+
+            counters = self.files.get(key)
+            if counters is None:
+                if len(self.files) >= self.max_files:
+                    key = self.OTHER
+                    counters = self.files.get(key)
+                if counters is None:
+                    counters = self.files[key] = RequestCounters(reservoir_size=256)
+
+            counters.add(record, now)
+            self.total.add(record, now)
+
+    def snapshot(self, files=True, wait=0):
+        """Return dict of current metrics, optionally including per-file breakdown.  Waits up
+        to wait seconds for active requests to finish first.
+        """
+        with self._lock:
+            if wait:
+                self._finished.wait_for(lambda: not self.active_requests, timeout=wait)
+
+            result = self.total.summary()
+            result.update({'since': self.since,
+                           'elapsed': time.time() - self.since,
+                           'connections': self.connections,
+                           'active_connections': self.active_connections,
+                           'active_requests': self.active_requests,
+                           'refused_connections': self.refused})
+            if files:
+                result['files'] = {key: counters.summary() for key, counters in self.files.items()}
+
+        return result
+
+#------------------------------------------------
+
+
+class PathHTTPServer(http.server.HTTPServer):
+    """http://louistiao.me/posts/python-simplehttpserver-recipe-serve-specific-directory/
+    """
+    # https://github.com/rust-lang/rust/issues/18847
+    # Class attribute so it is in place before server_activate() calls listen().
+    request_queue_size = 25
+
+    # Bounds for RangeCap, the adaptive size of open-ended range responses.  None means no cap.
+    open_range_minimum = 256*1024
+    open_range_limit = None
+
+    # Optional FileCache of open files shared by all request handlers
+    file_cache = None
+
+    # Optional BlockCache of file contents shared by all request handlers
+    block_cache = None
+
+    # Optional DirectoryCache of folder listings, and number of entries per listing page
+    directory_cache = None
+    directory_page_size = 1000
+
+    # Optional mp4.FaststartCache, serve MP4 files with their metadata up front
+    faststart_cache = None
+
+    # Optional mp4.FragmentCache for HLS playlists of fragmented MP4 files, and target segment
+    # duration in seconds
+    fragment_cache = None
+    hls_segment_duration = 6
+
+    # Optional ServerStats request metrics
+    stats = None
+
+    # Send Access-Control-Allow-Origin with responses for registered files and folders
+    cross_origin = False
+
+    # Optional dict mapping URL tokens to registered files and folders, see Server.register()
+    roots = None
+
+    # Set by server_close(), ends long-lived responses such as live streams
+    closed = False
+
+    def __init__(self, path_base, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        # Stored on the server instance, not the shared RequestHandlerClass, so that several
+        # servers can run side by side.
+        self.path_base = path_base
+
+    def server_close(self):
+        self.closed = True
+        super().server_close()
+
+
+
+class PoolingMixIn():
+    """Handle each connection on a bounded pool of worker threads.
+
+    Similar to socketserver.ThreadingMixIn, except the number of worker threads is capped at
+    max_workers.  Connections wait in a queue for a free worker.  A remote client address is
+    served at most max_client_connections connections at a time, its further connections wait
+    until one of those closes, so that one greedy client can't starve the others.  Connections
+    from this machine, e.g. the browser showing the notebook, are not limited per client.  Once
+    max_queued_connections are waiting, new connections are refused with a 503 response.
+    """
+    max_workers = 8
+    max_client_connections = 6
+    max_queued_connections = 64
+
+    _requests = None
+
+    def _pool_setup(self):
+        """Lazily start worker threads and connection bookkeeping
+        """
+        if self._requests is None:
+            self._requests = queue.Queue()
+            self._client_lock = threading.Lock()
+            self._client_connections = collections.Counter()
+            self._waiting = collections.deque()  # connections over their client's limit
+            self._queued = 0                     # connections not yet picked up by a worker
+
+            # Daemon threads, same as socketserver.ThreadingMixIn.daemon_threads
+            for k in range(self.max_workers):
+                name = 'jpy_video-worker-{}'.format(k)
+                thread = threading.Thread(target=self._pool_worker, name=name, daemon=True)
+                thread.start()
+
+    def _pool_worker(self):
+        """Worker thread main loop
+        """
+        requests = self._requests
+        while True:
+            item = requests.get()
+            if item is None:
+                break
+            with self._client_lock:
+                self._queued -= 1
+            self.process_request_thread(*item)
+
+    def client_key(self, client_address):
+        """Key that connections are counted under for max_client_connections, or None for
+        clients on this machine, which are not limited
+        """
+        host = client_address[0]
+        try:
+            if ipaddress.ip_address(host).is_loopback:
+                return None
+        except ValueError:
+            pass
+
+        return host
+
+    def process_request(self, request, client_address):
+        """Hand connection over to the worker pool
+        """
+        self._pool_setup()
+
+        client = self.client_key(client_address)
+        with self._client_lock:
+            refuse = self._queued >= self.max_queued_connections
+            wait = False
+            if not refuse:
+                self._queued += 1
+                if client is None:
+                    pass
+                elif self._client_connections[client] >= self.max_client_connections:
+                    wait = True
+                    self._waiting.append((request, client_address))
+                else:
+                    self._client_connections[client] += 1
+
+        if refuse:
+            self.refuse_request(request, client_address)
+        elif not wait:
+            self._requests.put((request, client_address))
+
+    def process_request_thread(self, request, client_address):
+        """Same as in socketserver.ThreadingMixIn, runs in a worker thread
+        """
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self._connection_done(client_address)
+
+    def _connection_done(self, client_address):
+        """Release client's connection slot, passing it on to the first waiting connection from
+        the same client
+        """
+        client = self.client_key(client_address)
+        if client is None:
+            return
+
+        with self._client_lock:
+            self._client_connections[client] -= 1
+            for item in self._waiting:
+                if self.client_key(item[1]) == client:
+                    self._waiting.remove(item)
+                    self._client_connections[client] += 1
+                    self._requests.put(item)
+                    break
+            else:
+                if self._client_connections[client] <= 0:
+                    del self._client_connections[client]
+
+    def refuse_request(self, request, client_address):
+        """Tell client to come back later, then hang up
+        """
+        if self.stats is not None:
+            self.stats.connection_refused()
+
+        try:
+            request.sendall(b'HTTP/1.1 503 Service Unavailable\r\n'
+                            b'Retry-After: 1\r\n'
+                            b'Content-Length: 0\r\n'
+                            b'Connection: close\r\n\r\n')
+        except socket.error:
+            pass
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        if self._requests is not None:
+            with self._client_lock:
+                waiting = list(self._waiting)
+                self._waiting.clear()
+            for request, client_address in waiting:
+                self.shutdown_request(request)
+
+            for k in range(self.max_workers):
+                self._requests.put(None)
+            self._requests = None
+
+
+
+class PoolingPathHTTPServer(PoolingMixIn, PathHTTPServer):
+    """Concurrent version of PathHTTPServer backed by a bounded pool of worker threads
+    """
+    pass
+
+
+
+class RangeRequestHandler(http.server.SimpleHTTPRequestHandler):
+    """Adds support for HTTP 'Range' requests to SimpleHTTPRequestHandler
+
+    The approach is to:
+    - Override send_head to look for 'Range' and respond appropriately.
+    - Override copyfile to only transmit a range when requested.
+    """
+    verbose = False
+
+    # Keep-alive connections waiting for their next request give up their worker thread after
+    # idle_timeout seconds.  Transfers that make no progress for timeout seconds are abandoned.
+    idle_timeout = 5
+    timeout = 30
+
+    # Buffer size for sources that can't be sent with sendfile
+    chunk_size = 256*1024
+    _chunk_buffer = None
+
+    # Persistent connections.  Must be a class attribute: BaseRequestHandler.__init__ handles
+    # the whole connection before returning.
+    protocol_version = 'HTTP/1.1'
+
+    # Headers and body go out in separate writes, don't let Nagle hold the body back
+    disable_nagle_algorithm = True
+
+    # Add Access-Control-Allow-Origin to the current response, see send_head()
+    allow_origin = False
+
+    def setup(self):
+        super().setup()
+
+        self.record = None
+        if self.server.stats is not None:
+            self.server.stats.connection_opened()
+
+        # Adaptive limit for open-ended ranges, lives as long as the connection
+        if self.server.open_range_limit:
+            self.range_cap = RangeCap(self.server.open_range_minimum,
+                                      self.server.open_range_limit)
+        else:
+            self.range_cap = None
+
+    def handle(self):
+        """
+        http://stackoverflow.com/questions/6063416/python-basehttpserver-how-do-i-catch-trap-broken-pipe-errors
+        """
+        try:
+            http.server.SimpleHTTPRequestHandler.handle(self)
+        except socket.error:
+            pass
+
+    def handle_one_request(self):
+        """Wait at most idle_timeout seconds for the request line, see parse_request()
+        """
+        self.connection.settimeout(self.idle_timeout)
+        super().handle_one_request()
+
+    def parse_request(self):
+        # Request line is in, transfers get the longer timeout
+        self.connection.settimeout(self.timeout)
+        return super().parse_request()
+
+    def finish(self):
+        try:
+            super().finish()
+        finally:
+            if self.server.stats is not None:
+                self.server.stats.connection_closed()
+
+    def send_response(self, code, message=None):
+        super().send_response(code, message)
+        if self.record is not None:
+            self.record.status = code
+
+    def end_headers(self):
+        if self.allow_origin:
+            self.send_header('Access-Control-Allow-Origin', '*')
+            self.allow_origin = False
+
+        super().end_headers()
+        if self.record is not None:
+            self.record.first_byte = time.perf_counter()
+
+    def log_message(self, *args, **kwargs):
+        """
+        Log an arbitrary message.  This is used by all other logging functions.
+
+        Overridden here to enable/disable writing to stderr.
+        """
+        if self.verbose:
+            super().log_message(*args, **kwargs)
+
+    def do_GET(self):
+        """Serve a GET request
+        """
+        self.begin_record()
+        try:
+            fp = self.send_head()
+            if isinstance(fp, mjpeg.FrameStream):
+                self.record_bytes(self.copy_stream(fp, self.wfile))
+            elif fp:
+                try:
+                    if self.multipart:
+                        self.record_bytes(self.copy_multipart(fp, self.wfile))
+                    else:
+                        self.record_bytes(self.copy_chunks(fp, self.wfile))
+                finally:
+                    fp.close()
+        finally:
+            self.end_record()
+
+    def do_HEAD(self):
+        """Serve a HEAD request
+        """
+        self.begin_record()
+        try:
+            fp = self.send_head()
+            if fp and not isinstance(fp, mjpeg.FrameStream):
+                fp.close()
+        finally:
+            self.end_record()
+
+    def begin_record(self):
+        """Start timing a request for the server's metrics
+        """
+        if self.server.stats is not None:
+            self.record = RequestRecord()
+            self.server.stats.request_started()
+
+    def record_bytes(self, count):
+        if self.record is not None and count:
+            self.record.bytes_sent += count
+
+    def end_record(self):
+        """Hand finished request over to the server's metrics
+        """
+        if self.record is not None:
+            self.server.stats.record(self.record)
+            self.record = None
+
+    def send_head(self):
+        """Send response status and headers for a file or folder.  Returns file object to be
+        copied to the client, or None if there's nothing more to send.
+        """
+        if self.verbose:
+            print(self.headers)
+
+        path_work = self.translate_path(self.path)
+        self.file_size = None
+        self.file_stat = None
+        self.layout = None
+        self.multipart = None
+        self.allow_origin = self.server.cross_origin and registered_url(self.server.roots,
+                                                                         self.path)
+
+        if self.record is not None:
+            self.record.key = record_key(path_work, self.path)
+
+        file_cache = self.server.file_cache
+        media = None
+        if self.server.fragment_cache is not None:
+            media = playlist_media_path(self.server.path_base, self.server.roots, self.path,
+                                        path_work)
+
+        if media is not None:
+            return self.send_playlist_head(media)
+        elif path_work is None:
+            pass
+        elif isinstance(path_work, MemoryFile):
+            return self.send_file_head(path_work)
+        elif isinstance(path_work, mjpeg.FrameStream):
+            return self.send_stream_head(path_work)
+        elif (file_cache is not None and path_work in file_cache) or os.path.isfile(path_work):
+            return self.send_file_head()
+        elif  os.path.isdir(path_work):
+            return self.send_directory_head()
+
+        self.send_error(404, 'File not found')
+        return None
+
+    def send_buffer_head(self, body, content_type):
+        """Send headers for a response generated in memory.  Returns buffer holding the body.
+        """
+        self.send_response(200)
+        self.send_header('Content-type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+
+        self.file_size = len(body)
+        self.range = 0, self.file_size-1
+
+        return io.BytesIO(body)
+
+    def send_stream_head(self, stream):
+        """Send headers for live Motion JPEG stream.  Returns the stream, see copy_stream().
+        """
+        self.send_response(200)
+        self.send_header('Content-type', stream.content_type)
+        self.send_header('Cache-Control', 'no-cache, no-store')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+
+        # No Content-Length, the end of the stream is the end of the connection
+        self.close_connection = True
+
+        return stream
+
+    def send_playlist_head(self, media):
+        """Send headers for HLS playlist of fragmented MP4 file.  Returns buffer holding the
+        playlist.
+        """
+        try:
+            body = playlist_body(self.server.fragment_cache, media, self.path,
+                                 self.server.hls_segment_duration)
+        except OSError:
+            body = None
+
+        if body is None:
+            self.send_error(404, 'No HLS playlist for this file')
+            return None
+
+        return self.send_buffer_head(body, HLS_CONTENT_TYPE)
+
+    def send_directory_head(self):
+        """Send headers for one page of a folder listing, HTML or JSON (see render_directory()).
+        Returns buffer holding the listing.
+        """
+        path_work = self.translate_path(self.path)
+
+        try:
+            body, content_type = directory_page(self.server.directory_cache, path_work,
+                                                self.path, self.server.directory_page_size)
+        except OSError:
+            self.send_error(404, 'No permission to list directory')
+            return None
+
+        return self.send_buffer_head(body, content_type)
+
+    def send_file_head(self, path_work=None):
+        """Derived from SimpleHTTPServer.py with added support for byte-range requests.
+
+        A request for several ranges is answered with a multipart/byteranges response, see
+        copy_multipart().  Conditional requests are answered with 304 Not Modified when the
+        client's validators still match.
+        """
+        # Handle ranges
+        try:
+            ranges = parse_byte_ranges(self.headers.get('Range', ''))
+        except ValueError:
+            self.send_error(400, 'Invalid byte range')
+            return None
+
+        # Continue with serving requested file data
+        if not path_work:
+            path_work = self.translate_path(self.path)
+
+        try:
+            fp, fs, content_type = open_source(path_work, self.server.file_cache,
+                                               self.guess_type)
+        except IOError:
+            self.send_error(404, 'File not found')
+            return None
+
+        if not self.file_size:
+            self.file_size = fs.st_size
+        self.file_stat = fs
+
+        if self.server.faststart_cache is not None:
+            self.layout = self.server.faststart_cache.layout(path_work, fs, content_type)
+            if self.layout is not None:
+                self.file_size = self.layout.size
+
+        try:
+            if not_modified(self.headers, fs, self.layout):
+                fp.close()
+                self.send_response(304)
+                for keyword, value in validator_headers(fs, self.layout):
+                    self.send_header(keyword, value)
+                self.end_headers()
+                return None
+
+            if not range_applies(self.headers, fs, self.layout):
+                ranges = []
+
+            if not ranges:
+                # Whole file
+                code = 200
+                self.range = 0, self.file_size - 1
+                content_range = None
+                response_length = self.file_size
+            else:
+                code = 206
+                ranges = resolve_byte_ranges(cap_open_range(ranges, self.range_cap),
+                                             self.file_size)
+                if not ranges:
+                    fp.close()
+                    self.send_response(416)
+                    self.send_header('Content-Range', 'bytes */{}'.format(self.file_size))
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return None
+
+                if len(ranges) == 1:
+                    # Update internal range values
+                    self.range = first, last = ranges[0]
+
+                    if self.range_cap:
+                        self.range_cap.served(first, last)
+
+                    content_range = 'bytes {}-{}/{}'.format(first, last, self.file_size)
+                    response_length = last - first + 1
+                else:
+                    boundary = uuid.uuid4().hex
+                    self.range = None
+                    self.multipart = multipart_byteranges(ranges, content_type, self.file_size,
+                                                          boundary)
+
+                    content_range = None
+                    content_type = 'multipart/byteranges; boundary={}'.format(boundary)
+                    response_length = self.multipart[2]
+
+            self.send_response(code)
+            self.send_header('Content-type', content_type)
+            self.send_header('Accept-Ranges', 'bytes')
+            if content_range:
+                self.send_header('Content-Range', content_range)
+            self.send_header('Content-Length', str(response_length))
+            for keyword, value in validator_headers(fs, self.layout):
+                self.send_header(keyword, value)
+
+            self.end_headers()
+            return fp
+        except:
+            fp.close()
+            raise
+
+    def copy_multipart(self, src, dst):
+        """Copy each part of a multipart/byteranges response from source file to destination.
+        """
+        parts, tail, content_length = self.multipart
+
+        bytes_copied = 0
+        try:
+            for head, first, last in parts:
+                dst.write(head)
+                self.range = first, last
+                bytes_copied += self.copy_chunks(src, dst)
+            dst.write(tail)
+        except (ConnectionResetError, BrokenPipeError):
+            pass
+
+        return bytes_copied
+
+    def copy_stream(self, stream, dst):
+        """Send each new frame of live stream until it ends, the client goes away, or the server
+        shuts down.  A slow client only ever gets the newest frame, it never holds up the stream.
+        """
+        bytes_copied = 0
+        sequence = 0
+        while not self.server.closed:
+            sequence, part = stream.wait(sequence, timeout=1)
+            if part is None:
+                if stream.closed:
+                    break
+                continue
+
+            try:
+                dst.write(part)
+            except (ConnectionResetError, BrokenPipeError):
+                break
+
+            bytes_copied += len(part)
+
+        return bytes_copied
+
+    def copy_chunks(self, src, dst):
+        """Copy requested byte range from source file to destination.
+
+        Regular files are handed straight to the kernel via sendfile, or served from the block
+        cache when the server has one.  In-memory files are written as slices of their buffer.
+        Anything else (e.g. the in-memory directory listing) is copied in little chunks through a
+        reusable buffer.
+        """
+        first, last = self.range  # defined earlier in method send_head()
+
+        if last is None or last >= self.file_size:
+            # This issue should have been handled earlier.
+            raise ValueError('Unexpected range: {}'.format(self.range))
+
+        if last < first:
+            # Empty file
+            return 0
+
+        if self.layout is None:
+            return self.copy_file_range(src, dst, first, last)
+
+        # Remapped MP4, mix of rewritten metadata held in memory and spans of the file
+        bytes_copied = 0
+        for data, file_first, file_last in self.layout.pieces(first, last):
+            if data is not None:
+                try:
+                    dst.write(data)
+                except (ConnectionResetError, BrokenPipeError):
+                    break
+                bytes_copied += len(data)
+            else:
+                count = self.copy_file_range(src, dst, file_first, file_last)
+                bytes_copied += count
+                if count < file_last - file_first + 1:
+                    break
+
+        return bytes_copied
+
+    def copy_file_range(self, src, dst, first, last):
+        """Copy inclusive byte range of source file to destination
+        """
+        count = last - first + 1
+        if count <= 0:
+            # Careful, sendfile treats a count of zero as "until EOF".
+            return 0
+
+        if isinstance(src, MemoryReader):
+            return self.copy_chunks_memory(src, dst, first, last)
+        elif self.server.block_cache is not None and self.file_stat is not None:
+            return self.copy_chunks_cached(src, dst, first, last)
+        elif dst is self.wfile and can_sendfile(src):
+            return self.copy_chunks_sendfile(src, first, count)
+        else:
+            return self.copy_chunks_buffered(src, dst, first, count)
+
+    def copy_chunks_cached(self, src, dst, first, last):
+        """Copy data through the server's in-memory block cache
+        """
+        block_cache = self.server.block_cache
+
+        bytes_copied = 0
+        for index, start, stop in block_cache.blocks(first, last):
+            block = block_cache.get(self.file_stat, src, index)
+            if stop > len(block):
+                # File got shorter since it was opened
+                break
+
+            try:
+                dst.write(memoryview(block)[start:stop])
+            except (ConnectionResetError, BrokenPipeError):
+                break
+
+            bytes_copied += stop - start
 
-BYTE_RANGE_RE = re.compile(r'bytes=(\d+)-(\d+)?$')
-def parse_byte_range(byte_range):
-    """Returns the two numbers in 'bytes=123-456' or throws ValueError.
+        return bytes_copied
 
-    The last number or both numbers may be None.
-    """
-    if byte_range.strip() == '':
-        return None, None
+    def copy_chunks_memory(self, src, dst, first, last):
+        """Zero-copy transfer from in-memory file to socket
+        """
+        try:
+            dst.write(src.slice(first, last))
+        except (ConnectionResetError, BrokenPipeError):
+            return 0
 
-    m = BYTE_RANGE_RE.match(byte_range)
-    if not m:
-        raise ValueError('Invalid byte range: {}'.format(byte_range))
+        return last - first + 1
 
-    first, last = [x and int(x) for x in m.groups()]
-    # if last and last < first:
-    #     raise ValueError('Invalid byte range: {}'.format(byte_range))
+    def copy_chunks_sendfile(self, src, offset, count):
+        """Zero-copy transfer from file to socket
+        """
+        try:
+            return self.connection.sendfile(src, offset, count)
+        except (ConnectionResetError, BrokenPipeError):
+            return 0
 
-    return first, last
+    def copy_chunks_buffered(self, src, dst, offset, count):
+        """Copy data from source file to destination file in little chunks using a buffer that
+        is allocated once per connection.
+        """
+        if self._chunk_buffer is None:
+            self._chunk_buffer = memoryview(bytearray(self.chunk_size))
+        buffer = self._chunk_buffer
+
+        # Keep reading/writing until nothing left to copy.
+        bytes_copied = 0
+        src.seek(offset)
+        while count - bytes_copied > 0:
+            # Read it
+            num_read = src.readinto(buffer[:min(self.chunk_size, count - bytes_copied)])
+            if not num_read:
+                break
 
-#------------------------------------------------
+            # Write it
+            try:
+                dst.write(buffer[:num_read])
+            except (ConnectionResetError, BrokenPipeError):
+                break
 
+            # Count it
+            bytes_copied += num_read
 
-# class PathHTTPServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
-class PathHTTPServer(http.server.HTTPServer):
-    """http://louistiao.me/posts/python-simplehttpserver-recipe-serve-specific-directory/
-    """
-    def __init__(self, path_base, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.RequestHandlerClass.path_base = path_base
+        return bytes_copied
 
-        # https://github.com/rust-lang/rust/issues/18847
-        self.request_queue_size = 25
+    def translate_path(self, path):
+        """Map URL path onto local file system path, None if there is no such path
+        """
+        return resolve_url_path(self.server.path_base, self.server.roots, path)
 
+#------------------------------------------------
 
+class AsyncRangeServer():
+    """HTTP file server with byte-range support built on asyncio streams.
 
-class RangeRequestHandler(http.server.SimpleHTTPRequestHandler):
-    """Adds support for HTTP 'Range' requests to SimpleHTTPRequestHandler
+    Alternative engine to PathHTTPServer/RangeRequestHandler.  All connections are handled as
+    coroutines on a single event loop, so thousands of idle keep-alive connections cost little
+    more than their sockets.  Range semantics are the same as RangeRequestHandler: 206 with
+    Content-Range or multipart/byteranges, 416 when not satisfiable, 304 and If-Range handling
+    for conditional requests.
 
-    The approach is to:
-    - Override send_head to look for 'Range' and respond appropriately.
-    - Override copyfile to only transmit a range when requested.
+    Mimics the small part of the socketserver API used by Server (socket, serve_forever,
+    shutdown, server_close) so either engine may be plugged in.
     """
     verbose = False
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.protocol_version = 'HTTP/1.1'
 
-    def handle(self):
-        """
-        http://stackoverflow.com/questions/6063416/python-basehttpserver-how-do-i-catch-trap-broken-pipe-errors
-        """
-        try:
-            http.server.SimpleHTTPRequestHandler.handle(self)
-        except socket.error:
-            pass
+    # Idle keep-alive connections are closed after this many seconds
+    timeout = 60
 
-    def log_message(self, *args, **kwargs):
-        """
-        Log an arbitrary message.  This is used by all other logging functions.
+    server_version = 'jpy_video'
 
-        Overridden here to enable/disable writing to stderr.
-        """
-        if self.verbose:
-            super().log_message(*args, **kwargs)
+    # Bounds for RangeCap, the adaptive size of open-ended range responses.  None means no cap.
+    open_range_minimum = 256*1024
+    open_range_limit = None
 
-    def do_GET(self):
-        """Serve a GET request
-        """
-        if self.verbose:
-            print(self.headers)
+    # Optional FileCache of open files shared by all connections
+    file_cache = None
 
-        path_work = self.translate_path(self.path)
-        self.file_size = None
+    # Optional dict mapping URL tokens to registered files and folders, see Server.register()
+    roots = None
 
-        if os.path.isfile(path_work):
-            fp = self.send_file_head()
-        elif  os.path.isdir(path_work):
-            fp = self.send_directory_head()
-        else:
-            return
+    # Optional BlockCache of file contents shared by all connections
+    block_cache = None
 
-        if fp:
-            try:
-                self.copy_chunks(fp, self.wfile)
-            finally:
-                fp.close()
+    # Optional DirectoryCache of folder listings, and number of entries per listing page
+    directory_cache = None
+    directory_page_size = 1000
 
-    def send_directory_head(self):
-        """Parse contents of directory and generate a respones.
+    # Optional mp4.FaststartCache, serve MP4 files with their metadata up front
+    faststart_cache = None
+
+    # Optional mp4.FragmentCache for HLS playlists of fragmented MP4 files, and target segment
+    # duration in seconds
+    fragment_cache = None
+    hls_segment_duration = 6
+
+    # Optional ServerStats request metrics
+    stats = None
+
+    # Send Access-Control-Allow-Origin with responses for registered files and folders
+    cross_origin = False
+
+    def __init__(self, path_base, server_address):
+        self.path_base = path_base
+        self.socket = socket.create_server(server_address)
+
+        self._loop = None
+        self._shutdown_request = None
+        self._connections = set()
+        self._started = threading.Event()
+        self._stopped = threading.Event()
+
+    def serve_forever(self):
+        """Run event loop in the calling thread until shutdown() is called.
         """
-        path_work = self.translate_path(self.path)
-        parts = urllib.parse.urlsplit(self.path)
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._loop.run_until_complete(self._serve())
+        finally:
+            self._loop.close()
+            self._stopped.set()
+
+    def shutdown(self):
+        """Stop the event loop and wait for serve_forever() to return.  Must be called from a
+        different thread than serve_forever().
+        """
+        self._started.wait()
+        self._loop.call_soon_threadsafe(self._shutdown_request.set)
+        self._stopped.wait()
 
-        # List directory contents into string buffer
-        buffer = self.list_directory(path_work)
+    def server_close(self):
+        """Clean up the listening socket
+        """
+        self.socket.close()
 
-        if not buffer:
-            return
+    async def _serve(self):
+        self._shutdown_request = asyncio.Event()
+        server = await asyncio.start_server(self._handle_connection, sock=self.socket)
+        self._started.set()
 
-        # Store file size
-        buffer.seek(0, os.SEEK_END)
-        self.file_size = buffer.tell()
-        buffer.seek(0)
+        async with server:
+            await self._shutdown_request.wait()
 
-        path_work = buffer
+        # Cancel transfers still in progress
+        for task in list(self._connections):
+            task.cancel()
+        await asyncio.gather(*self._connections, return_exceptions=True)
 
-        self.range = 0, self.file_size-1
+    async def _handle_connection(self, reader, writer):
+        """Serve requests from one client connection until it closes or goes idle
+        """
+        task = asyncio.current_task()
+        self._connections.add(task)
+        if self.stats is not None:
+            self.stats.connection_opened()
+
+        # Response headers and body go out in separate writes.  Without TCP_NODELAY the body of
+        # a short range response can sit behind Nagle's algorithm waiting on a delayed ACK.
+        sock = writer.get_extra_info('socket')
+        if sock is not None and sock.family in (socket.AF_INET, socket.AF_INET6):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        # Adaptive limit for open-ended ranges, lives as long as the connection
+        if self.open_range_limit:
+            range_cap = RangeCap(self.open_range_minimum, self.open_range_limit)
+        else:
+            range_cap = None
 
-        return path_work
+        try:
+            keep_alive = True
+            while keep_alive:
+                request_line = await asyncio.wait_for(reader.readline(), self.timeout)
+                if not request_line:
+                    break
+
+                header_lines = []
+                while True:
+                    line = await asyncio.wait_for(reader.readline(), self.timeout)
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    header_lines.append(line)
+
+                if self.stats is None:
+                    keep_alive = await self._handle_request(request_line, header_lines, reader,
+                                                            writer, range_cap)
+                    continue
+
+                # Per-request metrics reach the _send_*() methods through a context variable
+                record = RequestRecord()
+                self.stats.request_started()
+                _request_record.set(record)
+                try:
+                    keep_alive = await self._handle_request(request_line, header_lines, reader,
+                                                            writer, range_cap)
+                finally:
+                    _request_record.set(None)
+                    self.stats.record(record)
+        except (ConnectionError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError):
+            # Client went away, went quiet, or sent garbage
+            pass
+        except asyncio.CancelledError:
+            # Server is shutting down
+            pass
+        finally:
+            self._connections.discard(task)
+            if self.stats is not None:
+                self.stats.connection_closed()
+            writer.close()
+
+    async def _handle_request(self, request_line, header_lines, reader, writer,
+                              range_cap=None):
+        """Parse and respond to a single request.  Returns True if the connection may be reused.
+        """
+        _allow_origin.set(False)
+        words = request_line.decode('iso-8859-1').split()
+        if len(words) != 3 or not words[2].startswith('HTTP/'):
+            await self._send_error(writer, 400, 'Bad request syntax')
+            return False
 
-    def send_file_head(self, path_work=None):
-        """Derived from SimpleHTTPServer.py with added support for byte-range requests.
+        method, path, version = words
+        _allow_origin.set(self.cross_origin and registered_url(self.roots, path))
+        headers = email.parser.Parser(_class=http.client.HTTPMessage).parsestr(
+            b''.join(header_lines).decode('iso-8859-1'))
+
+        if self.verbose:
+            print(request_line)
+            print(headers)
+
+        keep_alive = version == 'HTTP/1.1'
+        connection = headers.get('Connection', '').lower()
+        if connection == 'close':
+            keep_alive = False
+        elif connection == 'keep-alive':
+            keep_alive = True
+
+        if method not in ('GET', 'HEAD'):
+            await self._send_error(writer, 501, 'Unsupported method ({})'.format(method))
+            return keep_alive
+
+        # Resolving the path touches the file system (realpath, stat), keep that off the event
+        # loop unless the file cache already vouches for it
+        loop = asyncio.get_running_loop()
+        kind, path_work, media = await loop.run_in_executor(None, self._locate, path)
+
+        record = _request_record.get()
+        if record is not None:
+            record.key = record_key(path_work, path)
+
+        if kind == 'playlist':
+            await self._send_playlist(writer, method, path, media)
+        elif kind == 'file':
+            await self._send_file(writer, method, headers, path_work, range_cap)
+        elif kind == 'stream':
+            await self._send_stream(reader, writer, method, path_work)
+            return False
+        elif kind == 'directory':
+            await self._send_directory(writer, method, path, path_work)
+        else:
+            await self._send_error(writer, 404, 'File not found', method)
+
+        return keep_alive
+
+    def _locate(self, path):
+        """Work out what URL path refers to.  Returns tuple (kind, path_work, media) where kind is
+        one of 'playlist', 'file', 'stream', 'directory' or None if there's nothing to serve.
+        Blocking, call on an executor.
         """
-        # Handle ranges
-        if 'Range' in self.headers:
-            try:
-                self.range = parse_byte_range(self.headers['Range'])
-            except ValueError:
-                self.send_error(400, 'Invalid byte range')
-                return None
+        path_work = resolve_url_path(self.path_base, self.roots, path)
+
+        if self.fragment_cache is not None:
+            media = playlist_media_path(self.path_base, self.roots, path, path_work)
+            if media is not None:
+                return 'playlist', path_work, media
+
+        file_cache = self.file_cache
+        if path_work is None:
+            kind = None
+        elif isinstance(path_work, MemoryFile):
+            kind = 'file'
+        elif isinstance(path_work, mjpeg.FrameStream):
+            kind = 'stream'
+        elif (file_cache is not None and path_work in file_cache) or os.path.isfile(path_work):
+            kind = 'file'
+        elif os.path.isdir(path_work):
+            kind = 'directory'
         else:
-            self.range = 0, None
+            kind = None
 
-        # Extract requested byte range
-        first, last = self.range
+        return kind, path_work, None
 
-        # Continue with serving requested file data
-        if not path_work:
-            path_work = self.translate_path(self.path)
+    async def _send_file(self, writer, method, headers, path_work, range_cap=None):
+        """Respond with requested byte range(s) of a local file or MemoryFile
+        """
+        # Handle ranges
+        try:
+            ranges = parse_byte_ranges(headers.get('Range', ''))
+        except ValueError:
+            await self._send_error(writer, 400, 'Invalid byte range', method)
+            return
 
-        fp = None
+        file_cache = self.file_cache
         try:
-            fp = open(path_work, 'rb')
+            if isinstance(path_work, MemoryFile) or (file_cache is not None and
+                                                     path_work in file_cache):
+                # Nothing to open or stat
+                fp, fs, content_type = open_source(path_work, file_cache)
+            else:
+                loop = asyncio.get_running_loop()
+                fp, fs, content_type = await loop.run_in_executor(None, open_source, path_work,
+                                                                  file_cache)
         except IOError:
-            self.send_error(404, 'File not found')
-            return None
+            await self._send_error(writer, 404, 'File not found', method)
+            return
 
-        fs = os.fstat(fp.fileno())
-        if not self.file_size:
-            self.file_size = fs[6]
+        with fp:
+            file_size = fs.st_size
+
+            layout = None
+            if self.faststart_cache is not None:
+                if self.faststart_cache.known(fs):
+                    layout = self.faststart_cache.layout(path_work, fs, content_type)
+                else:
+                    # First look at this file reads its metadata, keep that off the event loop
+                    loop = asyncio.get_running_loop()
+                    layout = await loop.run_in_executor(None, self.faststart_cache.layout,
+                                                        path_work, fs, content_type)
+                if layout is not None:
+                    file_size = layout.size
+
+            if not_modified(headers, fs, layout):
+                self._write_head(writer, 304, validator_headers(fs, layout))
+                await writer.drain()
+                return
+
+            if not range_applies(headers, fs, layout):
+                ranges = []
+
+            if not ranges:
+                # Whole file
+                code = 200
+                parts = [(b'', 0, file_size - 1)]
+                tail = b''
+                response_length = file_size
+                range_headers = [('Content-type', content_type)]
+            else:
+                code = 206
+                ranges = resolve_byte_ranges(cap_open_range(ranges, range_cap), file_size)
+                if not ranges:
+                    content_range = 'bytes */{}'.format(file_size)
+                    self._write_head(writer, 416, [('Content-Range', content_range),
+                                                   ('Content-Length', '0')])
+                    await writer.drain()
+                    return
+
+                if len(ranges) == 1:
+                    first, last = ranges[0]
+                    parts = [(b'', first, last)]
+                    if range_cap:
+                        range_cap.served(first, last)
+                    tail = b''
+                    response_length = last - first + 1
+                    range_headers = [('Content-type', content_type),
+                                     ('Content-Range', 'bytes {}-{}/{}'.format(first, last,
+                                                                               file_size))]
+                else:
+                    boundary = uuid.uuid4().hex
+                    parts, tail, response_length = multipart_byteranges(ranges, content_type,
+                                                                        file_size, boundary)
+                    range_headers = [('Content-type',
+                                      'multipart/byteranges; boundary={}'.format(boundary))]
+
+            self._write_head(writer, code, range_headers + [
+                ('Accept-Ranges', 'bytes'),
+                ('Content-Length', str(response_length)),
+            ] + validator_headers(fs, layout))
+            await writer.drain()
+
+            if method == 'HEAD':
+                return
+
+            # A client disconnect surfaces here as ConnectionError and ends the transfer.
+            for head, first, last in parts:
+                if head:
+                    writer.write(head)
+                    await writer.drain()
+                if last >= first:
+                    await self._send_range(writer, fp, fs, first, last, layout)
+
+            if tail:
+                writer.write(tail)
+                await writer.drain()
+
+    async def _send_range(self, writer, fp, fs, first, last, layout=None):
+        """Send inclusive byte range of file, or of its faststart layout when given
+        """
+        if layout is None:
+            pieces = [(None, first, last)]
+        else:
+            pieces = layout.pieces(first, last)
+
+        for data, file_first, file_last in pieces:
+            if data is not None:
+                writer.write(data)
+                await writer.drain()
+
+                record = _request_record.get()
+                if record is not None:
+                    record.bytes_sent += len(data)
+            elif isinstance(fp, MemoryReader):
+                await self._send_memory(writer, fp, file_first, file_last)
+            elif self.block_cache is not None:
+                await self._send_cached(writer, fp, fs, file_first, file_last)
+            else:
+                await self._send_chunks(writer, fp, file_first, file_last)
 
-        if first is None:
-            raise ValueError('errrr need to figure out this part: {}'.format(self.range))
+    async def _send_chunks(self, writer, fp, first, last):
+        """Send inclusive byte range of file.  Zero-copy where the platform allows, otherwise
+        asyncio falls back to read/write.
+        """
+        loop = asyncio.get_running_loop()
+        bytes_sent = await loop.sendfile(writer.transport, fp, first, last - first + 1)
 
-        if first >= self.file_size:
-            # https://tools.ietf.org/html/rfc7233
-            self.send_error(416, 'Requested byte range not satisfiable')
-            return None
+        record = _request_record.get()
+        if record is not None:
+            record.bytes_sent += bytes_sent
 
-        if last is None:
-            # Range end is unspecified, so server gets to decide.
-            last = first + self.file_size  #1024*1024
+    async def _send_memory(self, writer, fp, first, last):
+        """Send inclusive byte range of in-memory file, straight from its buffer
+        """
+        writer.write(fp.slice(first, last))
+        await writer.drain()
 
-        if last >= self.file_size:
-            # Don't go past end of file
-            last = self.file_size - 1
+        record = _request_record.get()
+        if record is not None:
+            record.bytes_sent += last - first + 1
 
-        # Update internal range values
-        self.range = first, last
+    async def _send_cached(self, writer, fp, fs, first, last):
+        """Send inclusive byte range of file through the in-memory block cache.  Blocks missing
+        from the cache are read on the default executor so slow disks don't stall the event loop.
+        """
+        loop = asyncio.get_running_loop()
+        block_cache = self.block_cache
 
-        response_length = last - first + 1
+        for index, start, stop in block_cache.blocks(first, last):
+            block = block_cache.lookup(fs, index)
+            if block is None:
+                block = await loop.run_in_executor(None, block_cache.load, fs, fp, index)
 
-        try:
-            self.send_response(206)
-            self.send_header('Content-type', self.guess_type(path_work))
-            self.send_header('Accept-Ranges', 'bytes')
-            self.send_header('Content-Range', 'bytes {}-{}/{}'.format(first, last, self.file_size))
-            self.send_header('Content-Length', str(response_length))
-            self.send_header('Last-Modified', self.date_time_string(fs.st_mtime))
+            if stop > len(block):
+                # File got shorter since it was opened
+                raise ConnectionAbortedError('File truncated during transfer')
 
-            # Cache stuff, but doesn't appear to work woith range requests :(
-            # https://developer.mozilla.org/en-US/docs/Web/HTTP/Headers/Cache-Control
-            # https://developer.mozilla.org/en-US/docs/Web/HTTP/Caching
-            self.send_header('Cache-Control', 'public, max-age=31536000')
+            writer.write(memoryview(block)[start:stop])
+            await writer.drain()
 
-            self.end_headers()
-            return fp
-        except:
-            fp.close()
-            raise
+            record = _request_record.get()
+            if record is not None:
+                record.bytes_sent += stop - start
 
-    def copy_chunks(self, src, dst):
-        """Copy data from source file to destination file in little chunks.
+    async def _send_directory(self, writer, method, path, path_work):
+        """Respond with one page of a folder listing, HTML or JSON (see render_directory()).
+        Folders are scanned on the default executor, big ones take a while.
         """
-        buffer_size = 256*1024
+        loop = asyncio.get_running_loop()
+        try:
+            body, content_type = await loop.run_in_executor(None, directory_page,
+                                                            self.directory_cache, path_work,
+                                                            path, self.directory_page_size)
+        except OSError:
+            await self._send_error(writer, 404, 'No permission to list directory', method)
+            return
 
-        first, last = self.range  # defined earlier in method send_head()
+        await self._send_buffer(writer, method, body, content_type)
 
-        if last is None or last >= self.file_size:
-            # This issue should have been handled earlier.
-            raise ValueError('Unexpected range: {}'.format(self.range))
-            # last = self.file_size - 1
-            # self.range = first, last
+    async def _send_stream(self, reader, writer, method, stream):
+        """Respond with live Motion JPEG stream, one part per new frame until the stream ends or
+        the client goes away.  The encoding threads wake this coroutine through a listener.
+        While no frames arrive the reader is watched for end of file, so a client hanging up on a
+        stalled stream doesn't leave this coroutine waiting forever.
+        """
+        self._write_head(writer, 200, [('Content-type', stream.content_type),
+                                       ('Cache-Control', 'no-cache, no-store'),
+                                       ('Connection', 'close')])
+        await writer.drain()
 
-        # Keep reading/writing until nothing left tot copy.
-        position = first
-        src.seek(first)
-        while last - position + 1 > 0:
-            # Read it
-            buffer_read = min(buffer_size, last-position+1)
-            data = src.read(buffer_read)
-            if len(data) == 0:
-                break
+        if method == 'HEAD':
+            return
 
-            # Count it
-            position += len(data)
+        loop = asyncio.get_running_loop()
+        ready = asyncio.Event()
 
-            # Write it
+        def wake():
             try:
-                dst.write(data)
-            except ConnectionResetError as e:
-                # print(e)
-                # print(first, position, last)
-                break
+                loop.call_soon_threadsafe(ready.set)
+            except RuntimeError:
+                # Event loop already closed
+                pass
 
-        # Finish
-        bytes_copied = position - first + 1
-        return bytes_copied
+        async def watch():
+            # Anything the client sends now is ignored, the connection closes after the stream
+            try:
+                while await reader.read(64*1024):
+                    pass
+            except ConnectionError:
+                pass
+
+        record = _request_record.get()
+        hangup = loop.create_task(watch())
+        stream.add_listener(wake)
+        try:
+            sequence = 0
+            while not hangup.done() and not writer.is_closing():
+                ready.clear()
+                latest, part = stream.latest()
+                if latest > sequence:
+                    sequence = latest
+                    writer.write(part)
+                    await writer.drain()
+
+                    if record is not None:
+                        record.bytes_sent += len(part)
+                elif stream.closed:
+                    break
+                else:
+                    woken = loop.create_task(ready.wait())
+                    try:
+                        await asyncio.wait([woken, hangup], return_when=asyncio.FIRST_COMPLETED)
+                    finally:
+                        woken.cancel()
+        finally:
+            stream.remove_listener(wake)
+            hangup.cancel()
+
+    async def _send_playlist(self, writer, method, path, media):
+        """Respond with HLS playlist of fragmented MP4 file.  The file's fragments are read on
+        the default executor the first time round.
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            body = await loop.run_in_executor(None, playlist_body, self.fragment_cache, media,
+                                              path, self.hls_segment_duration)
+        except OSError:
+            body = None
 
-    def translate_path(self, path):
-        """http://louistiao.me/posts/python-simplehttpserver-recipe-serve-specific-directory/
+        if body is None:
+            await self._send_error(writer, 404, 'No HLS playlist for this file', method)
+            return
+
+        await self._send_buffer(writer, method, body, HLS_CONTENT_TYPE)
+
+    async def _send_buffer(self, writer, method, body, content_type):
+        """Respond with body generated in memory
+        """
+        self._write_head(writer, 200, [('Content-type', content_type),
+                                       ('Content-Length', str(len(body)))])
+        if method != 'HEAD':
+            writer.write(body)
+
+            record = _request_record.get()
+            if record is not None:
+                record.bytes_sent += len(body)
+        await writer.drain()
+
+    async def _send_error(self, writer, code, message, method=None):
+        """Respond with short HTML error page, just the headers for HEAD requests
         """
-        path = os.path.realpath(urllib.parse.unquote(path))
-        words = path.split('/')
-        words = filter(None, words)
+        status = http.HTTPStatus(code)
+        body = http.server.DEFAULT_ERROR_MESSAGE % {'code': code,
+                                                    'message': html.escape(message),
+                                                    'explain': html.escape(status.description)}
+        body = body.encode('utf-8', 'replace')
+
+        self._write_head(writer, code, [('Content-Type', http.server.DEFAULT_ERROR_CONTENT_TYPE),
+                                        ('Content-Length', str(len(body)))])
+        if method != 'HEAD':
+            writer.write(body)
+        await writer.drain()
+
+    def _write_head(self, writer, code, headers):
+        """Write status line and headers into the transport's buffer
+        """
+        lines = ['HTTP/1.1 {} {}'.format(code, http.HTTPStatus(code).phrase),
+                 'Server: {}'.format(self.server_version),
+                 'Date: {}'.format(email.utils.formatdate(usegmt=True))]
+        lines += ['{}: {}'.format(k, v) for k, v in headers]
+        if _allow_origin.get():
+            lines.append('Access-Control-Allow-Origin: *')
+
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1', 'strict'))
+
+        record = _request_record.get()
+        if record is not None:
+            record.response_started(code)
 
-        path_work = self.path_base
-        for word in words:
-            drive, word = os.path.splitdrive(word)
-            head, word = os.path.split(word)
-            if word in (os.curdir, os.pardir):
-                continue
 
-            path_work = os.path.join(path_work, word)
 
-        # Strip off any parameters
-        parts = path_work.split('?')
-        return parts[0]
+# RequestRecord of the request being handled by the current connection task
+_request_record = contextvars.ContextVar('_request_record', default=None)
+
+# True if the current response should carry Access-Control-Allow-Origin
+_allow_origin = contextvars.ContextVar('_allow_origin', default=False)
 
 #------------------------------------------------
 
 class Server():
     """Handy wrapper for my http file server.
+
+    Files are served either relative to a single local folder (path), or through opaque URL
+    tokens for any number of individually registered files and folders (see register()).
     """
-    def __init__(self, path='.', host='localhost', port=0, verbose=False):
+    def __init__(self, path='.', host='localhost', port=0, verbose=False, workers=8,
+                 client_connections=6, engine='thread', open_range_limit=16*1024*1024,
+                 open_files=32, mmap_files=False, block_cache=0, block_size=1024*1024,
+                 stats=True, cached_directories=16, directory_page_size=1000, faststart=True,
+                 hls=True, hls_segment_duration=6, cross_origin=True):
         """Make a new server instance, choosing a port at random from those available.
 
+           Set path=None to only serve registered files and folders.
+
            Default address parameters:
                host = 'localhost'
                port = 0   # 0 means system will pick a port number at random from those available
+
+           Concurrency parameters:
+               workers = 8             # size of worker thread pool, 0 means single-threaded
+               client_connections = 6  # max simultaneous connections served to any one remote
+                                       # client, more wait their turn.  Not applied to
+                                       # connections from this machine.
+
+           Serving engine:
+               engine = 'thread'   # socketserver with pool of worker threads
+               engine = 'asyncio'  # asyncio streams, one event loop thread for all connections
+                                   # (workers and client_connections are ignored)
+
+           Open-ended range requests ('bytes=N-'):
+               open_range_limit = 16 MiB  # upper bound on adaptive response size, None for no cap
+
+           Open-file cache:
+               open_files = 32     # max number of files held open between requests, 0 disables
+               mmap_files = False  # memory-map cached files for non-sendfile reads
+
+           In-memory block cache, useful for videos on slow or network file systems:
+               block_cache = 0     # memory budget in bytes, 0 disables
+               block_size = 1 MiB  # size of cached blocks
+
+           Request metrics, see stats():
+               stats = True  # count requests, bytes and latencies per file, False disables
+
+           Folder listings, add '?format=json' to a folder URL for JSON:
+               cached_directories = 16     # max number of folder listings cached, 0 disables
+               directory_page_size = 1000  # entries per page, override with '?per_page=N'
+
+           MP4 files with their metadata ('moov' box) at the end are served as if it came first,
+           so playback can start after a single sequential read.  Files on disk are unchanged:
+               faststart = True
+
+           Fragmented MP4 files are also available as HLS streams with byte-range segments of
+           the original file, at the file's URL plus '.m3u8' (see playlist_url()):
+               hls = True
+               hls_segment_duration = 6  # target segment length in seconds
+
+           Registered files and folders are sent with 'Access-Control-Allow-Origin: *', so the
+           notebook page can fetch HLS segments and read decoded frames back from a canvas.
+           Their token URLs are unguessable, folder-relative URLs never get the header:
+               cross_origin = True
         """
-        if not path:
+        if path == '':
             path = os.path.curdir
 
+        if engine not in ENGINES:
+            raise ValueError('Unknown server engine: {}'.format(engine))
 
         self._reset_properties()
         self._path = None
         self.path = path
+
+        # Registered files and folders, see register()
+        self._roots = {}
+        self._root_references = collections.Counter()
+        self._roots_lock = threading.Lock()
         self.host = host
         self.port = port
         self.verbose = verbose
+        self.workers = workers
+        self.client_connections = client_connections
+        self.engine = engine
+        self.open_range_limit = open_range_limit
+
+        if open_files:
+            self.file_cache = FileCache(max_files=open_files, use_mmap=mmap_files)
+        else:
+            self.file_cache = None
+
+        if block_cache:
+            self.block_cache = BlockCache(memory_budget=block_cache, block_size=block_size)
+        else:
+            self.block_cache = None
+
+        if stats:
+            self._stats = ServerStats()
+        else:
+            self._stats = None
+
+        if cached_directories:
+            self.directory_cache = DirectoryCache(max_dirs=cached_directories)
+        else:
+            self.directory_cache = None
+        self.directory_page_size = directory_page_size
+
+        if faststart:
+            self.faststart_cache = mp4.FaststartCache()
+        else:
+            self.faststart_cache = None
+
+        if hls:
+            self.fragment_cache = mp4.FragmentCache()
+        else:
+            self.fragment_cache = None
+        self.hls_segment_duration = hls_segment_duration
+        self.cross_origin = cross_origin
 
     def __del__(self):
+        if sys.is_finalizing():
+            # Too late for a clean shutdown, the daemon thread goes down with the interpreter
+            return
+
         try:
             self.stop()
         except:
@@ -314,25 +2677,18 @@ class Server():
 
     @path.setter
     def path(self, path_new):
-        """Set new path for serving content.
-        If server is running then stop and restart with new path.
-        Port number will also change...
-        """
-        path_new = os.path.realpath(path_new)
-
-        if not os.path.isdir(path_new):
-            raise ValueError('Path does not exist: {}'.format(path_new))
-
-        if self._path != path_new:
-            # Set new path for serving content
-            if self.running:
-                # Stop and restart with new path.  Port number will change...
-                self.stop()
-                self._path = path_new
-                self.start()
-            else:
-                # Just set it
-                self._path = path_new
+        """Set new path for serving content.  Takes effect immediately, a running server keeps
+        its port number.
+        """
+        if path_new is not None:
+            path_new = os.path.realpath(path_new)
+
+            if not os.path.isdir(path_new):
+                raise ValueError('Path does not exist: {}'.format(path_new))
+
+        self._path = path_new
+        if self._httpd is not None:
+            self._httpd.path_base = path_new
 
     @property
     def url(self):
@@ -346,22 +2702,53 @@ class Server():
         address = self.host, self.port
         RequestHandler = RangeRequestHandler
         RequestHandler.verbose = self.verbose
-        self._httpd = PathHTTPServer(self.path, address, RequestHandler)
+
+        if self.engine == 'asyncio':
+            self._httpd = AsyncRangeServer(self.path, address)
+            self._httpd.verbose = self.verbose
+        elif self.workers:
+            self._httpd = PoolingPathHTTPServer(self.path, address, RequestHandler)
+            self._httpd.max_workers = self.workers
+            self._httpd.max_client_connections = self.client_connections
+        else:
+            self._httpd = PathHTTPServer(self.path, address, RequestHandler)
+
+        self._httpd.roots = self._roots
+        self._httpd.open_range_limit = self.open_range_limit
+        self._httpd.file_cache = self.file_cache
+        self._httpd.block_cache = self.block_cache
+        self._httpd.stats = self._stats
+        self._httpd.directory_cache = self.directory_cache
+        self._httpd.directory_page_size = self.directory_page_size
+        self._httpd.faststart_cache = self.faststart_cache
+        self._httpd.fragment_cache = self.fragment_cache
+        self._httpd.hls_segment_duration = self.hls_segment_duration
+        self._httpd.cross_origin = self.cross_origin
 
         # Update self with actual hostname and port number
         self.host, self.port = self._httpd.socket.getsockname()
 
-        self._thread = threading.Thread(target=self._httpd.serve_forever)
-        self._thread.setDaemon(True)  # background thread is killed automaticalled when main thread exits.
+        # Daemon thread is killed automatically when the main thread exits
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
         self._thread.start()
 
     def stop(self):
         """Stop the server application
         """
+        if not self.running:
+            return
+
         self._httpd.shutdown()
+        self._httpd.server_close()
         self._thread.join()
         self._reset_properties()
 
+        if self.file_cache is not None:
+            self.file_cache.clear()
+
+        if self.directory_cache is not None:
+            self.directory_cache.clear()
+
     @property
     def running(self):
         """Return True if application is running in background thread
@@ -375,16 +2762,67 @@ class Server():
         """Return pretty status string
         """
         if self.running:
-            return 'Serving {} on {}'.format(self.path, self.url)
+            if self.path:
+                return 'Serving {} on {}'.format(self.path, self.url)
+            else:
+                return 'Serving {} registered item(s) on {}'.format(len(self._roots), self.url)
         else:
             return 'Server not running'
 
+    def stats(self, files=True, reset=False, wait=0):
+        """Return snapshot of request metrics as a dict, or None if metrics are disabled.
+
+        Top-level keys cover the whole server: request and byte counts, counts per status code,
+        connection counts, and time-to-first-byte and transfer time summaries in seconds (count,
+        p50, p90, p99, max over recent requests).  The same request figures for each local file
+        are under key 'files', and block cache counters under 'block_cache' when enabled.
+
+        A request is counted once its last byte is handed to the socket, which may be just
+        after the client has received it.  Pass wait in seconds to wait for requests in progress
+        (key 'active_requests') to be counted first, e.g. when checking a response just read.
+        Live streams stay in progress until they end.
+
+        Set reset=True to zero all counters once the snapshot is taken.
+        """
+        if self._stats is None:
+            return None
+
+        result = self._stats.snapshot(files=files, wait=wait)
+        if self.block_cache is not None:
+            result['block_cache'] = self.block_cache.stats()
+
+        if reset:
+            self.reset_stats()
+
+        return result
+
+    def reset_stats(self):
+        """Zero request metrics and block cache counters
+        """
+        if self._stats is not None:
+            self._stats.reset()
+
+        if self.block_cache is not None:
+            self.block_cache.reset_stats()
+
+    def cache_stats(self):
+        """Return dict of block cache counters (hits, misses, evictions, memory use), or None if
+        the server has no block cache.
+        """
+        if self.block_cache is None:
+            return None
+
+        return self.block_cache.stats()
+
     def filename_to_url(self, fname):
         """Convert local filename to url handled by this server.
         """
         if not self.running:
             raise ValueError('This function only works when server is running.')
 
+        if not self.path:
+            raise ValueError('Server has no path, use register() instead.')
+
         fname = os.path.realpath(fname)
 
         a, b = fname.split(self.path)
@@ -392,9 +2830,162 @@ class Server():
 
         return url
 
+    #--------------------------------------------
+    # Serve individual files and folders through opaque URL tokens
+    def register(self, path):
+        """Make local file or folder available from this server.  Returns token for use with
+        token_to_url() and unregister().
+
+        Video data held in memory may be registered as a MemoryFile, or as bytes or any other
+        object supporting the buffer protocol, which is then wrapped in one.  It is served without
+        copying and released when unregistered.  Live streams (mjpeg.FrameStream) are served as
+        multipart/x-mixed-replace and closed when unregistered.
+
+        Registering the same path again returns the same token.  Each call to register() should
+        be balanced by a call to unregister().
+        """
+        if not isinstance(path, (str, os.PathLike, MemoryFile, mjpeg.FrameStream)):
+            path = MemoryFile(path)
+
+        if isinstance(path, (MemoryFile, mjpeg.FrameStream)):
+            if path.closed:
+                raise ValueError('Source is closed: {!r}'.format(path))
+            token = path.token
+        else:
+            path = os.path.realpath(path)
+            if not os.path.exists(path):
+                raise ValueError('Path does not exist: {}'.format(path))
+            token = path_token(path)
+
+        with self._roots_lock:
+            self._roots[token] = path
+            self._root_references[token] += 1
+
+        return token
+
+    def unregister(self, token):
+        """Release file or folder registered under token.  It stops being served once every
+        register() call has been balanced.
+        """
+        with self._roots_lock:
+            if token not in self._roots:
+                return
+
+            self._root_references[token] -= 1
+            if self._root_references[token] <= 0:
+                root = self._roots.pop(token)
+                del self._root_references[token]
+
+                if isinstance(root, (MemoryFile, mjpeg.FrameStream)):
+                    root.close()
+
+    def token_to_url(self, token):
+        """Return URL for file or folder registered under token
+        """
+        if not self.running:
+            raise ValueError('This function only works when server is running.')
+
+        path = self._roots[token]
+        if isinstance(path, (MemoryFile, mjpeg.FrameStream)):
+            name = urllib.parse.quote(path.name)
+        elif os.path.isdir(path):
+            name = ''
+        else:
+            name = urllib.parse.quote(os.path.basename(path))
+
+        return normalize_url('{}/{}/{}'.format(self.url, token, name))
+
+    def playlist_url(self, token):
+        """Return URL of HLS playlist for fragmented MP4 file registered under token.  Raises
+        ValueError if HLS is disabled or the file is not a fragmented MP4 file.
+        """
+        if self.fragment_cache is None:
+            raise ValueError('HLS playlists are disabled for this server')
+
+        path = self._roots[token]
+        if isinstance(path, mjpeg.FrameStream) or (
+                not isinstance(path, MemoryFile) and not os.path.isfile(path)):
+            raise ValueError('Not a fragmented MP4 file: {}'.format(path))
+
+        fs, content_type = source_stat(path)
+        if self.fragment_cache.fragments(path, fs, content_type) is None:
+            raise ValueError('Not a fragmented MP4 file: {}'.format(path))
+
+        return self.token_to_url(token) + HLS_SUFFIX
+
+    @property
+    def registered(self):
+        """Dict of currently registered paths (and MemoryFiles) keyed by token
+        """
+        return dict(self._roots)
+
+#------------------------------------------------
+# Process-wide shared servers
+
+_shared_servers = {}
+_shared_servers_lock = threading.Lock()
+
+def shared_server(host='localhost', port=0, **kwargs):
+    """Return the process-wide server for host, port and settings, starting it on first use.
+
+    Files and folders are made available with Server.register().  Any number of Video widgets can
+    share one server, so switching files never restarts it and dozens of widgets don't cost
+    dozens of threads and sockets.  Keyword arguments are passed along to Server().  Widgets
+    asking for different settings get a server of their own on port 0 (any free port).  A fixed
+    port only has room for one server, asking for other settings than it was started with raises
+    ValueError.
+    """
+    options = server_options(**kwargs)
+    key = host, port, options
+    with _shared_servers_lock:
+        S = _shared_servers.get(key)
+        if S is None or not S.running:
+            if port:
+                for (other_host, other_port, other_options), other in _shared_servers.items():
+                    if (other_host, other_port) == (host, port) and other.running:
+                        raise ValueError('Server on {}:{} already running with other settings: '
+                                         '{}'.format(host, port, dict(other_options)))
+
+            S = Server(path=None, host=host, port=port, **kwargs)
+            S.start()
+            _shared_servers[key] = S
+
+    return S
+
+def server_options(**kwargs):
+    """Return hashable summary of Server() keyword arguments other than path, host and port,
+    defaults filled in
+    """
+    bound = inspect.signature(Server).bind(**kwargs)
+    bound.apply_defaults()
+
+    return tuple(sorted((name, value) for name, value in bound.arguments.items()
+                        if name not in ('path', 'host', 'port')))
+
+@atexit.register
+def _stop_shared_servers():
+    """Shut down shared servers while the interpreter is still in good shape
+    """
+    with _shared_servers_lock:
+        for S in _shared_servers.values():
+            try:
+                S.stop()
+            except Exception:
+                pass
+        _shared_servers.clear()
+
 #------------------------------------------------
 # Helper functions
 
+def path_token(path):
+    """Opaque URL token for local path.  Stable for the life of the process, unguessable from
+    outside it.
+    """
+    digest = hmac.new(_token_key, path.encode('utf-8', 'surrogateescape'), 'sha256')
+    return digest.hexdigest()[:20]
+
+_token_key = os.urandom(16)
+
 def is_subfolder(path, path_sub):
     """Return True if path_sub is a subfolder of path
     """
@@ -403,6 +2994,23 @@ def is_subfolder(path, path_sub):
 
     return path_sub.startswith(path)
 
+def can_sendfile(fp):
+    """Return True if supplied file object is backed by a regular file suitable for sendfile
+    """
+    if not hasattr(os, 'sendfile'):
+        return False
+
+    if isinstance(fp, FileHandle):
+        # Cached files are known to be regular files
+        return True
+
+    try:
+        fileno = fp.fileno()
+    except (AttributeError, io.UnsupportedOperation):
+        return False
+
+    return stat.S_ISREG(os.fstat(fileno).st_mode)
+
 def normalize_url(url):
     """Simpler helper function to ensure my URLs are well behaved.
     https://docs.python.org/3.0/library/urllib.parse.html#urllib.parse.ParseResult.geturl
@@ -0,0 +1,110 @@
+"""
+Scrub-preview thumbnails, see Video.make_previews() and ScrubBar.
+
+A sprite sheet is one JPEG image holding small frames of a video taken every interval seconds,
+laid out tile by tile in rows of columns.  The front end draws it from a hidden copy of the video
+and sends it back in one message.  Sheets are cached on disk (default ~/.cache/jpy_video/sprites)
+keyed by file identity and thumbnail settings, so a video is only ever captured once, and served
+to the browser by the internal http server.
+"""
+
+import hashlib
+import json
+import os
+
+from . import mp4
+
+__all__ = ['SpriteSheet', 'sprite_key', 'load_cached', 'save_cached']
+
+# Largest number of thumbnails in a sheet, longer videos get a longer interval
+MAX_TILES = 2500
+
+LAYOUT_FIELDS = ('interval', 'tile_width', 'tile_height', 'columns', 'count', 'duration')
+
+#------------------------------------------------
+
+class SpriteSheet():
+    """JPEG image of thumbnails and their layout.  Tile k shows the video at time k*interval and
+    sits in row k//columns, column k % columns.
+    """
+    def __init__(self, jpeg, interval, tile_width, tile_height, columns, count, duration):
+        self.jpeg = bytes(jpeg)
+        self.interval = float(interval)
+        self.tile_width = int(tile_width)
+        self.tile_height = int(tile_height)
+        self.columns = int(columns)
+        self.count = int(count)
+        self.duration = float(duration)
+
+    def __repr__(self):
+        return 'SpriteSheet(count={}, interval={:.3f}, tile={}x{}, {} bytes)'.format(
+            self.count, self.interval, self.tile_width, self.tile_height, len(self.jpeg))
+
+    @property
+    def layout(self):
+        """Dict of layout numbers, as sent to the front end
+        """
+        return {name: getattr(self, name) for name in LAYOUT_FIELDS}
+
+    def save(self, stem):
+        """Write image to stem + '.jpg' and layout to stem + '.json'.  Readers never see a
+        partial file.
+        """
+        os.makedirs(os.path.dirname(stem) or '.', exist_ok=True)
+
+        for fname, data in ((stem + '.jpg', self.jpeg),
+                            (stem + '.json', json.dumps(self.layout).encode('utf-8'))):
+            temp = '{}.{}.tmp'.format(fname, os.getpid())
+            with open(temp, 'wb') as fo:
+                fo.write(data)
+            os.replace(temp, fname)
+
+    @classmethod
+    def load(cls, stem):
+        """Read sheet written by save().  Raises ValueError if files are not valid.
+        """
+        try:
+            with open(stem + '.json', 'rb') as fi:
+                layout = json.loads(fi.read().decode('utf-8'))
+            with open(stem + '.jpg', 'rb') as fi:
+                jpeg = fi.read()
+
+            return cls(jpeg, **{name: layout[name] for name in LAYOUT_FIELDS})
+        except (KeyError, TypeError, UnicodeDecodeError, json.JSONDecodeError):
+            raise ValueError('Not a sprite sheet: {}'.format(stem))
+
+#------------------------------------------------
+
+def sprite_key(source, interval, width, quality):
+    """Return cache key of thumbnails of local file path or server.MemoryFile source, taken every
+    interval seconds at width pixels and JPEG quality 0...1
+    """
+    if isinstance(source, (str, os.PathLike)):
+        path = os.path.realpath(source)
+        digest = mp4.cache_digest(path, os.stat(path))
+    else:
+        # In-memory data has no identity beyond its content
+        digest = hashlib.sha1(source.view).hexdigest()
+
+    return '{}-{:g}-{}-{:g}'.format(digest, interval, width, quality)
+
+def load_cached(key, cache_folder=None):
+    """Return (sheet, path of its JPEG file) from the disk cache, or (None, None)
+    """
+    stem = os.path.join(cache_folder or mp4.default_cache_folder('sprites'), key)
+    try:
+        return SpriteSheet.load(stem), stem + '.jpg'
+    except (OSError, ValueError):
+        return None, None
+
+def save_cached(sheet, key, cache_folder=None):
+    """Store sheet in the disk cache.  Returns path of its JPEG file, or None if it could not be
+    written.
+    """
+    stem = os.path.join(cache_folder or mp4.default_cache_folder('sprites'), key)
+    try:
+        sheet.save(stem)
+    except OSError:
+        return None
+
+    return stem + '.jpg'
@@ -160,6 +160,192 @@ function throttle(fn, threshhold, scope) {
   };
 }
 
+// Frame times arrive from the kernel as binary buffers of little-endian float64 values.
+function float64_array(value) {
+    if (!value || !value.byteLength) {
+        return null;
+    }
+    // Copy, the view into the message buffer need not be 8-byte aligned
+    var buffer = value.buffer.slice(value.byteOffset, value.byteOffset + value.byteLength);
+    return new Float64Array(buffer);
+}
+
+// Index of first element of sorted array greater than value
+function bisect_right(array, value) {
+    var lo = 0, hi = array.length;
+    while (lo < hi) {
+        var mid = (lo + hi) >> 1;
+        if (value < array[mid]) {
+            hi = mid;
+        } else {
+            lo = mid + 1;
+        }
+    }
+    return lo;
+}
+
+// Allowance for rounding in currentTime reported by the video element
+var time_tolerance = 1e-6;
+
+// Index of frame on screen at time t
+function frame_at(times, t) {
+    return Math.max(bisect_right(times, t + time_tolerance) - 1, 0);
+}
+
+// HLS playlist URLs served by the kernel's http server end with '.m3u8'
+function is_hls_url(url) {
+    return url.split('?')[0].endsWith('.m3u8');
+}
+
+// The media file itself is served at the playlist URL minus '.m3u8'
+function hls_media_url(url) {
+    var parts = url.split('?');
+    parts[0] = parts[0].slice(0, -'.m3u8'.length);
+    return parts.join('?');
+}
+
+// hls.js is not part of this bundle.  A copy already on the page is used, otherwise the pinned
+// release is fetched from the CDN the first time an HLS source turns up.  The classic notebook
+// has RequireJS, where the UMD build registers as a module instead of setting window.Hls.
+var hls_script_url = 'https://cdn.jsdelivr.net/npm/hls.js@1.4.12/dist/hls.min.js';
+var hls_loading = null;
+
+function load_hls() {
+    if (!hls_loading) {
+        hls_loading = new Promise(function(resolve, reject) {
+            if (window.Hls) {
+                resolve(window.Hls);
+            } else if (typeof window.requirejs === 'function') {
+                window.requirejs([hls_script_url], resolve, reject);
+            } else {
+                var script = document.createElement('script');
+                script.src = hls_script_url;
+                script.onload = function() {
+                    if (window.Hls) {
+                        resolve(window.Hls);
+                    } else {
+                        reject(new Error('hls.js did not load'));
+                    }
+                };
+                script.onerror = function() {
+                    reject(new Error('Could not load ' + hls_script_url));
+                };
+                document.head.appendChild(script);
+            }
+        });
+
+        // Try again next time, e.g. once back online
+        hls_loading.catch(function() {
+            hls_loading = null;
+        });
+    }
+
+    return hls_loading;
+}
+
+// Live Motion JPEG streams served by the kernel's http server end with '.mjpg'.  Browsers only
+// play these in an <img/> element.
+function is_mjpeg_url(url) {
+    return url.split('?')[0].endsWith('.mjpg');
+}
+
+// Video element properties reported to the kernel with media events.  Only values that changed
+// since the previous event from any view of the same model are sent.
+var event_fields = ['clientHeight', 'clientWidth', 'controls', 'currentTime', 'currentSrc',
+                    'duration', 'ended', 'muted', 'paused', 'playbackRate',
+                    'readyState', 'seeking', 'videoHeight', 'videoWidth', 'volume'];
+
+// Seconds since the epoch with sub-millisecond resolution, when media events and time samples
+// happened
+function wall_time() {
+    return (performance.timeOrigin + performance.now())/1000;
+}
+
+// Frames captured for Video.capture_frames() go back to the kernel in messages of about this size
+var capture_message_bytes = 16*1024*1024;
+
+// Capture gives up with an error when a single seek takes longer than this (milliseconds)
+var capture_seek_timeout = 10000;
+
+// Resolve once video element fires one of the events, reject on error
+function video_event(video, names) {
+    return new Promise(function(resolve, reject) {
+        function done() {
+            cleanup();
+            resolve();
+        }
+        function failed() {
+            cleanup();
+            reject(new Error('Video failed to load'));
+        }
+        function cleanup() {
+            for (let name of names) {
+                video.removeEventListener(name, done);
+            }
+            video.removeEventListener('error', failed);
+        }
+
+        for (let name of names) {
+            video.addEventListener(name, done);
+        }
+        video.addEventListener('error', failed);
+    });
+}
+
+// Resolve once video has seeked to time t.  Given timeout in milliseconds, reject if that takes
+// longer, e.g. when the video element stopped decoding.
+function seek_video(video, t, timeout) {
+    var seeked = video_event(video, ['seeked']);
+    video.currentTime = t;
+    if (!timeout) {
+        return seeked;
+    }
+
+    return new Promise(function(resolve, reject) {
+        var timer = setTimeout(function() {
+            reject(new Error('Seek to ' + t + ' s timed out'));
+        }, timeout);
+        seeked.then(function() {
+            clearTimeout(timer);
+            resolve();
+        }, function(error) {
+            clearTimeout(timer);
+            reject(error);
+        });
+    });
+}
+
+// Size of captured frames: scaled, or fit to requested width and/or height keeping aspect
+function capture_size(video, options) {
+    var width = video.videoWidth;
+    var height = video.videoHeight;
+
+    if (options.width && options.height) {
+        width = options.width;
+        height = options.height;
+    } else if (options.width) {
+        height = height*options.width/width;
+        width = options.width;
+    } else if (options.height) {
+        width = width*options.height/height;
+        height = options.height;
+    } else if (options.scale) {
+        width *= options.scale;
+        height *= options.scale;
+    }
+
+    return [Math.max(Math.round(width), 1), Math.max(Math.round(height), 1)];
+}
+
+// Keep browser memory bounded for long recordings: buffer at most a minute ahead and drop
+// segments more than half a minute behind the playback position.
+var hls_config = {
+    maxBufferLength: 30,
+    maxMaxBufferLength: 60,
+    maxBufferSize: 60*1000*1000,
+    backBufferLength: 30,
+};
+
 function zero_pad_two_digits(number) {
     var size = 2;
     var pretty = "00" + number;
@@ -203,13 +389,421 @@ var VideoModel = widgets_base.DOMWidgetModel.extend({
 });
 
 
+var ScrubBarModel = widgets_base.DOMWidgetModel.extend({
+    defaults: _.extend(_.result(this, 'widgets.DOMWidgetModel.prototype.defaults'), {
+        _model_name:          'ScrubBarModel',
+        _model_module:         module_name,
+        _model_module_version: module_version,
+
+        _view_name:          'ScrubBarView',
+        _view_module:         module_name,
+        _view_module_version: module_version,
+
+        video: null,
+        value: 0,
+        max: 0,
+        step: 1/30,
+        seek_on_release: true,
+    })
+}, {
+    serializers: _.extend({
+        video: {deserialize: widgets_base.unpack_models},
+    }, widgets_base.DOMWidgetModel.serializers)
+});
+
+// Keeps video elements of several Video widgets playing in step with the first displayed view of
+// the master video.  Runs entirely in the front end on a timer: followers drifting a little are
+// sped up or slowed down through playbackRate, those too far off are seeked.  Drift statistics
+// go back to the kernel in the stats trait every report_interval seconds.
+var SyncGroupModel = widgets_base.WidgetModel.extend({
+    defaults: _.extend(_.result(this, 'widgets.WidgetModel.prototype.defaults'), {
+        _model_name:          'SyncGroupModel',
+        _model_module:         module_name,
+        _model_module_version: module_version,
+
+        videos: [],
+        master: 0,
+        offsets: [],
+        tolerance: 0.02,
+        seek_threshold: 0.5,
+        correction_time: 1.0,
+        max_rate_change: 0.1,
+        sync_interval: 0.1,
+        report_interval: 1.0,
+        stats: [],
+    }),
+
+    initialize: function() {
+        SyncGroupModel.__super__.initialize.apply(this, arguments);
+
+        this.sync_now = this.sync.bind(this);
+        this.master_element = null;
+        this.drift_stats = [];
+        this.last_report = performance.now();
+        this.timer = null;
+
+        this.on('change:sync_interval', this.start_timer, this);
+        this.on('change:videos change:master', this.reset_stats, this);
+        this.start_timer();
+    },
+
+    start_timer: function() {
+        clearInterval(this.timer);
+        var interval = Math.max(this.get('sync_interval'), 0.01);
+        this.timer = setInterval(this.sync_now, 1000*interval);
+    },
+
+    close: function() {
+        clearInterval(this.timer);
+        this.timer = null;
+        this.watch_master(null);
+        return SyncGroupModel.__super__.close.apply(this, arguments);
+    },
+
+    reset_stats: function() {
+        this.drift_stats = [];
+    },
+
+    stream_stats: function(index) {
+        if (!this.drift_stats[index]) {
+            this.drift_stats[index] = {drift: 0, samples: 0, drift_sum: 0, drift_max: 0,
+                                       seeks: 0, nudges: 0, rate: 1};
+        }
+        return this.drift_stats[index];
+    },
+
+    watch_master: function(element) {
+        // Follow play, pause, seeks and rate changes of the master straight away rather than at
+        // the next tick
+        if (element === this.master_element) {
+            return;
+        }
+        for (let name of ['play', 'pause', 'seeked', 'ratechange']) {
+            if (this.master_element) {
+                this.master_element.removeEventListener(name, this.sync_now);
+            }
+            if (element) {
+                element.addEventListener(name, this.sync_now);
+            }
+        }
+        this.master_element = element;
+    },
+
+    sync: function() {
+        var videos = this.get('videos') || [];
+        var master_index = this.get('master');
+        var offsets = this.get('offsets') || [];
+
+        var master_model = videos[master_index];
+        var master_views = video_views(master_model);
+        if (!master_views.length) {
+            this.watch_master(null);
+            return;
+        }
+
+        var master = master_views[0].video;
+        this.watch_master(master);
+
+        if (master.readyState >= 1 && !master.seeking) {
+            var clock = master.currentTime;
+            var master_offset = offsets[master_index] || 0;
+
+            videos.forEach(function(model, index) {
+                for (let view of video_views(model)) {
+                    if (view.video !== master && !view.capturing) {
+                        var target = clock + (offsets[index] || 0) - master_offset;
+                        this.follow(view.video, master, target, this.stream_stats(index));
+                    }
+                }
+            }, this);
+        }
+
+        if (performance.now() - this.last_report >= 1000*this.get('report_interval')) {
+            this.report();
+        }
+    },
+
+    follow: function(element, master, target, stats) {
+        // Bring one follower in line with the master clock
+        if (element.readyState < 1 || element.seeking) {
+            return;
+        }
+
+        var base_rate = master.playbackRate;
+        target = Math.min(Math.max(target, 0), element.duration || Infinity);
+        var drift = element.currentTime - target;
+
+        stats.drift = drift;
+        stats.samples += 1;
+        stats.drift_sum += Math.abs(drift);
+        stats.drift_max = Math.max(stats.drift_max, Math.abs(drift));
+
+        if (master.paused) {
+            if (!element.paused) {
+                element.pause();
+            }
+            element.playbackRate = base_rate;
+            if (Math.abs(drift) > this.get('tolerance')) {
+                element.currentTime = target;
+                stats.seeks += 1;
+            }
+        } else if (element.paused) {
+            if (element.ended) {
+                return;
+            }
+            element.playbackRate = base_rate;
+            element.currentTime = target;
+            stats.seeks += 1;
+            element.play().catch(function() {});
+        } else if (Math.abs(drift) > this.get('seek_threshold')) {
+            element.playbackRate = base_rate;
+            element.currentTime = target;
+            stats.seeks += 1;
+        } else if (Math.abs(drift) > this.get('tolerance')) {
+            // Take up the drift over correction_time seconds, within max_rate_change
+            var limit = this.get('max_rate_change');
+            var change = Math.min(Math.max(-drift/this.get('correction_time'), -limit), limit);
+            element.playbackRate = base_rate*(1 + change);
+            stats.nudges += 1;
+        } else if (element.playbackRate !== base_rate) {
+            element.playbackRate = base_rate;
+        }
+
+        stats.rate = element.playbackRate;
+    },
+
+    report: function() {
+        // Send drift statistics since the previous report to the kernel
+        this.last_report = performance.now();
+
+        var videos = this.get('videos') || [];
+        var stats = [];
+        for (let index = 0; index < videos.length; index++) {
+            var s = this.stream_stats(index);
+            stats.push({drift: s.drift,
+                        drift_mean: s.samples ? s.drift_sum/s.samples : 0,
+                        drift_max: s.drift_max,
+                        samples: s.samples,
+                        seeks: s.seeks,
+                        nudges: s.nudges,
+                        rate: s.rate});
+            s.samples = 0;
+            s.drift_sum = 0;
+            s.drift_max = 0;
+        }
+
+        this.set('stats', stats);
+        this.save_changes();
+    },
+}, {
+    serializers: _.extend({
+        videos: {deserialize: widgets_base.unpack_models},
+    }, widgets_base.WidgetModel.serializers)
+});
+
+// Time as m:ss or h:mm:ss
+function format_time(t) {
+    t = Math.floor(t);
+    var h = Math.floor(t/3600);
+    var m = Math.floor((t % 3600)/60);
+    var text = zero_pad_two_digits(t % 60);
+    if (h) {
+        return h + ':' + zero_pad_two_digits(m) + ':' + text;
+    }
+    return m + ':' + text;
+}
+
+function video_views(model) {
+    // Displayed views of a VideoModel, see VideoView.render()
+    if (!model || !model.video_views) {
+        return [];
+    }
+    return Array.from(model.video_views);
+}
+
 //-----------------------------------------------
 
 // Widget View renders the model to the DOM
+
+// Time slider of a Video showing scrub-preview thumbnails from the video's sprite sheet while
+// hovering and dragging.  The video is only seeked on release.
+var ScrubBarView = widgets_base.DOMWidgetView.extend({
+    render: function() {
+        this.el.style.position = 'relative';
+
+        this.slider = document.createElement('input');
+        this.slider.type = 'range';
+        this.slider.min = 0;
+        this.slider.value = 0;
+        this.slider.style.width = '100%';
+        this.el.appendChild(this.slider);
+
+        // Thumbnail floating above the slider, a window onto one tile of the sprite sheet
+        this.preview = document.createElement('div');
+        _.extend(this.preview.style, {
+            position: 'absolute', bottom: '100%', display: 'none', zIndex: 10,
+            pointerEvents: 'none', border: '1px solid grey', backgroundColor: 'black',
+            backgroundRepeat: 'no-repeat', minWidth: '40px', minHeight: '16px'});
+        this.label = document.createElement('div');
+        _.extend(this.label.style, {
+            position: 'absolute', bottom: 0, width: '100%', textAlign: 'center',
+            color: 'white', backgroundColor: 'rgba(0, 0, 0, 0.5)',
+            font: '10pt DejaVu Sans Mono, Consolas, Monospace'});
+        this.preview.appendChild(this.label);
+        this.el.appendChild(this.preview);
+
+        this.dragging = false;
+        this.sprites = null;
+        this.video_model = null;
+
+        this.slider.addEventListener('mousemove', this.hover.bind(this));
+        this.slider.addEventListener('mouseleave', this.leave.bind(this));
+        this.slider.addEventListener('input', this.scrub.bind(this));
+        this.slider.addEventListener('change', this.release.bind(this));
+
+        this.listenTo(this.model, 'change:max change:step', this.update_range);
+        this.listenTo(this.model, 'change:video', this.video_changed);
+        this.video_changed();
+
+        return this;
+    },
+
+    video_changed: function() {
+        if (this.video_model) {
+            this.stopListening(this.video_model);
+        }
+        this.video_model = this.model.get('video');
+        if (this.video_model) {
+            this.listenTo(this.video_model, 'change:current_time', this.follow);
+            this.listenTo(this.video_model, 'change:_sprites', this.sprites_changed);
+        }
+        this.sprites_changed();
+        this.follow();
+    },
+
+    sprites_changed: function() {
+        var sprites = this.video_model ? this.video_model.get('_sprites') : null;
+        this.sprites = sprites && sprites.url ? sprites : null;
+
+        if (this.sprites) {
+            this.preview.style.backgroundImage = 'url("' + this.sprites.url + '")';
+            this.preview.style.width = this.sprites.tile_width + 'px';
+            this.preview.style.height = this.sprites.tile_height + 'px';
+
+            // Fetch the sheet now so the first hover doesn't wait for it
+            this.sheet = new Image();
+            this.sheet.src = this.sprites.url;
+        } else {
+            this.preview.style.backgroundImage = 'none';
+            this.preview.style.width = '';
+            this.preview.style.height = '';
+        }
+        this.update_range();
+    },
+
+    duration: function() {
+        var duration = this.model.get('max');
+        if (!duration && this.sprites) {
+            duration = this.sprites.duration;
+        }
+        if (!duration) {
+            var views = video_views(this.video_model);
+            duration = views.length ? views[0].video.duration : 0;
+        }
+        return isFinite(duration) ? duration : 0;
+    },
+
+    update_range: function() {
+        this.slider.max = this.duration() || 1;
+        this.slider.step = this.model.get('step') || 'any';
+    },
+
+    follow: function() {
+        // Track playback, unless the user has hold of the slider
+        if (this.dragging || !this.video_model) {
+            return;
+        }
+        this.update_range();
+        this.slider.value = this.video_model.get('current_time');
+    },
+
+    hover: function(ev) {
+        if (this.dragging) {
+            return;
+        }
+        var rect = this.slider.getBoundingClientRect();
+        var fraction = Math.min(Math.max((ev.clientX - rect.left)/rect.width, 0), 1);
+        this.show_preview(fraction*this.duration());
+    },
+
+    leave: function() {
+        if (!this.dragging) {
+            this.preview.style.display = 'none';
+        }
+    },
+
+    scrub: function() {
+        this.dragging = true;
+        var t = Number(this.slider.value);
+        this.show_preview(t);
+        if (!this.model.get('seek_on_release')) {
+            this.seek(t);
+        }
+    },
+
+    release: function() {
+        this.dragging = false;
+        this.preview.style.display = 'none';
+        this.seek(Number(this.slider.value));
+    },
+
+    show_preview: function(t) {
+        var duration = this.duration();
+        var sprites = this.sprites;
+        if (sprites) {
+            var k = Math.min(Math.max(Math.floor(t/sprites.interval + time_tolerance), 0),
+                             sprites.count - 1);
+            this.preview.style.backgroundPosition =
+                (-(k % sprites.columns)*sprites.tile_width) + 'px ' +
+                (-Math.floor(k/sprites.columns)*sprites.tile_height) + 'px';
+        }
+        this.label.textContent = format_time(t);
+        this.preview.style.display = 'block';
+
+        // Centre over the pointer, kept inside the slider
+        var width = this.preview.offsetWidth;
+        var span = this.slider.offsetWidth;
+        var x = duration ? t/duration*span : 0;
+        this.preview.style.left = Math.min(Math.max(x - width/2, 0), Math.max(span - width, 0)) +
+                                  'px';
+    },
+
+    seek: function(t) {
+        this.model.set('value', t);
+        this.save_changes();
+
+        if (!this.video_model) {
+            return;
+        }
+        this.video_model.set('current_time', t);
+        this.video_model.save_changes();
+
+        // Playing views ignore current_time changes, see VideoView.handle_play()
+        for (let view of video_views(this.video_model)) {
+            if (!view.video.paused) {
+                view.current_time_changed();
+            }
+        }
+    },
+});
+
+
 var TimeCodeView = widgets_controls.HTMLView.extend({
     // https://codereview.stackexchange.com/questions/49524/updating-single-view-on-change-of-a-model-in-backbone
     render: function() {
         this.listenTo(this.model, 'change:timecode', this.timecode_changed);
+        this.listenTo(this.model, 'change:_frame_times', this.frame_times_changed);
+        this.frame_times = float64_array(this.model.get('_frame_times'));
 
         TimeCodeView.__super__.render.apply(this);
 
@@ -219,16 +813,31 @@ var TimeCodeView = widgets_controls.HTMLView.extend({
         return this;
     },
 
+    frame_times_changed: function() {
+        this.frame_times = float64_array(this.model.get('_frame_times'));
+        this.timecode_changed();
+    },
+
     timecode_changed: function() {
         var time_base = this.model.get('timebase');
 
         var t = this.model.get('timecode');  //  current video time in seconds
 
+        var f;
+        var times = this.frame_times;
+        if (times) {
+            // Frame counted from first frame starting within the current second
+            var index = frame_at(times, t);
+            t = times[index];
+            f = index - bisect_right(times, Math.floor(t) - time_tolerance);
+        } else {
+            f = Math.floor((t % 1)/time_base);
+            // var f = Math.round((t % 1)/time_base);
+        }
+
         var h = Math.floor((t/3600));
         var m = Math.floor((t % 3600)/60);
         var s = Math.floor((t % 60));
-        var f = Math.floor((t % 1)/time_base);
-        // var f = Math.round((t % 1)/time_base);
 
         // Pretty timecode string
         var time_string = zero_pad_two_digits(h) + ':' +
@@ -266,8 +875,28 @@ var VideoView = widgets_base.DOMWidgetView.extend({
         this.video.autoplay = false;
         this.video.controls = true;
 
+        // Stands in for the video element while showing a live stream
+        this.image = document.createElement('img');
+
+        // Media events and time samples waiting to go to the kernel, see queue_event().  The
+        // kernel folds every view's events into one set of properties per model, so what it
+        // was last told is kept on the model too.
+        if (!this.model.sent_state) {
+            this.model.sent_state = {};
+        }
+        this.pending_events = [];
+        this.time_samples = [];
+        this.sample_times = [];
+        this.flush_timer = null;
+
         this.src_changed();
 
+        // Views of this model, for SyncGroupModel to find the video elements
+        if (!this.model.video_views) {
+            this.model.video_views = new Set();
+        }
+        this.model.video_views.add(this);
+
         // .listenTo() is better than .on()
         // http://backbonejs.org/#Events-listenTo
         // https://coderwall.com/p/fpxt4w/using-backbone-s-new-listento
@@ -276,6 +905,10 @@ var VideoView = widgets_base.DOMWidgetView.extend({
         this.listenTo(this.model, 'change:_play_pause',  this.play_pause_changed);
         this.listenTo(this.model, 'change:src',          this.src_changed);
         this.listenTo(this.model, 'change:current_time', this.current_time_changed);
+        this.listenTo(this.model, 'change:_frame_times', this.frame_times_changed);
+        this.listenTo(this.model, 'change:_keyframe_times', this.frame_times_changed);
+        this.frame_times_changed();
+        this.listenTo(this.model, 'msg:custom', this.handle_message);
 
         //-------------------------------------------------
         // Video element event handlers
@@ -366,14 +999,335 @@ var VideoView = widgets_base.DOMWidgetView.extend({
 
     src_changed: function() {
         // backend --> frontend
-        var field = 'src';
-        this.video[field] = this.model.get(field);
+        var src = this.model.get('src');
+
+        if (this.hls) {
+            this.hls.destroy();
+            this.hls = null;
+        }
+        this.hls_src = null;
+
+        var live = is_mjpeg_url(src);
+        this.show_element(live ? this.image : this.video);
+
+        if (live) {
+            this.video.removeAttribute('src');
+            this.video.load();
+            this.image.src = src;
+            return;
+        } else {
+            // Hang up on any previous stream
+            this.image.removeAttribute('src');
+        }
+
+        // Safari plays HLS natively, elsewhere hls.js feeds the segments through Media Source
+        // Extensions.  Without hls.js the file itself is played.
+        if (is_hls_url(src) && !this.video.canPlayType('application/vnd.apple.mpegurl')) {
+            var view = this;
+            this.hls_src = src;
+            load_hls().then(function(Hls) {
+                if (!Hls.isSupported()) {
+                    throw new Error('Media Source Extensions not available');
+                }
+                return Hls;
+            }).then(function(Hls) {
+                // Source changed or view removed in the meantime
+                if (view.hls_src !== src) {
+                    return;
+                }
+                view.hls = new Hls(hls_config);
+                view.hls.loadSource(src);
+                view.hls.attachMedia(view.video);
+            }, function(error) {
+                if (view.hls_src !== src) {
+                    return;
+                }
+                console.warn('HLS playback unavailable, playing the file instead:', error);
+                view.video.src = hls_media_url(src);
+            });
+        } else {
+            this.video.src = src;
+        }
+    },
+
+    handle_message: function(content, buffers) {
+        // Custom messages from the kernel
+        if (content.method === 'capture_frames') {
+            this.capture_frames(content, buffers);
+        } else if (content.method === 'capture_sprites') {
+            this.capture_sprites(content);
+        }
+    },
+
+    capture_sprites: function(content) {
+        // Draw a thumbnail every content.interval seconds from a hidden copy of the video into
+        // one sprite sheet, tile by tile in rows, and send it back to the kernel as a JPEG.  See
+        // Video.make_previews().
+        var model = this.model;
+        var key = 'sprites-' + content.id;
+
+        // Only one view of the model answers
+        model.captures = model.captures || {};
+        if (model.captures[key]) {
+            return;
+        }
+        model.captures[key] = true;
+
+        var view = this;
+        var src = content.src || model.get('src');
+        var video = document.createElement('video');
+        video.crossOrigin = 'anonymous';
+        video.muted = true;
+        video.preload = 'auto';
+
+        var layout = {};
+        var ready;
+        if (!src || is_mjpeg_url(src) ||
+            (is_hls_url(src) && !video.canPlayType('application/vnd.apple.mpegurl'))) {
+            ready = Promise.reject(new Error('Previews need a plain video file'));
+        } else {
+            ready = video_event(video, ['loadeddata']);
+            video.src = src;
+        }
+
+        ready.then(function() {
+            var duration = video.duration;
+            if (!isFinite(duration) || duration <= 0) {
+                throw new Error('Video has no duration');
+            }
+
+            var interval = Math.max(content.interval, duration/content.max_tiles);
+            var count = Math.max(Math.ceil(duration/interval), 1);
+            var [width, height] = capture_size(video, {width: content.width});
+
+            // Roughly square sheet, browsers limit canvas width and height
+            var columns = Math.ceil(Math.sqrt(count*height/width));
+            var canvas = document.createElement('canvas');
+            canvas.width = columns*width;
+            canvas.height = Math.ceil(count/columns)*height;
+            var context = canvas.getContext('2d');
+
+            layout = {interval: interval, tile_width: width, tile_height: height,
+                      columns: columns, count: count, duration: duration};
+
+            function draw(k) {
+                if (k >= count) {
+                    return;
+                }
+                return seek_video(video, Math.min(k*interval, duration)).then(function() {
+                    context.drawImage(video, (k % columns)*width, Math.floor(k/columns)*height,
+                                      width, height);
+                    return draw(k + 1);
+                });
+            }
+
+            return draw(0).then(function() {
+                return new Promise(function(resolve, reject) {
+                    canvas.toBlob(function(blob) {
+                        if (blob) {
+                            resolve(blob.arrayBuffer());
+                        } else {
+                            reject(new Error('Sprite sheet too large to encode'));
+                        }
+                    }, 'image/jpeg', content.quality);
+                });
+            });
+        }).then(function(data) {
+            view.send(_.extend({event: 'sprites', id: content.id}, layout), [data]);
+        }, function(error) {
+            view.send({event: 'sprites', id: content.id, error: String(error)});
+        }).then(function() {
+            delete model.captures[key];
+            video.removeAttribute('src');
+            video.load();
+        });
+    },
+
+    capture_frames: function(content, buffers) {
+        // Seek to each requested time, draw frame to a canvas and send RGBA pixels back to the
+        // kernel in binary buffers, several frames per message.
+        var model = this.model;
+        var video = this.video;
+
+        // Only one view of the model answers
+        model.captures = model.captures || {};
+        if (model.captures[content.id]) {
+            return;
+        }
+        model.captures[content.id] = true;
+
+        var times = float64_array(buffers[0]) || new Float64Array(0);
+        var was_paused = video.paused;
+        var start_time = video.currentTime;
+        var view = this;
+
+        // Visit times in order, decoders are fastest going forwards
+        var order = Array.from(times.keys()).sort(function(a, b) {
+            return times[a] - times[b];
+        });
+
+        var context, width, height, frame_bytes, batch_size;
+        var batch = null;
+        var indices = [];
+
+        function send_batch() {
+            var data = batch.buffer;
+            if (indices.length < batch_size) {
+                data = data.slice(0, indices.length*frame_bytes);
+            }
+            view.send({event: 'capture_frames', id: content.id, indices: indices}, [data]);
+            batch = null;
+            indices = [];
+        }
+
+        function capture(k) {
+            if (k >= order.length) {
+                if (indices.length) {
+                    send_batch();
+                }
+                return;
+            }
+
+            return seek_video(video, times[order[k]], capture_seek_timeout).then(function() {
+                context.drawImage(video, 0, 0, width, height);
+                if (!batch) {
+                    batch = new Uint8Array(batch_size*frame_bytes);
+                }
+                batch.set(context.getImageData(0, 0, width, height).data,
+                          indices.length*frame_bytes);
+                indices.push(order[k]);
+
+                if (indices.length === batch_size) {
+                    send_batch();
+                }
+                return capture(k + 1);
+            });
+        }
+
+        this.capturing = true;
+        video.pause();
+
+        this.when_readable().then(function() {
+            [width, height] = capture_size(video, content);
+            frame_bytes = width*height*4;
+            batch_size = Math.max(1, Math.floor(capture_message_bytes/frame_bytes));
+
+            var canvas = document.createElement('canvas');
+            canvas.width = width;
+            canvas.height = height;
+            context = canvas.getContext('2d');
+
+            view.send({event: 'capture_start', id: content.id, width: width, height: height});
+            return capture(0);
+        }).then(function() {
+            return null;
+        }, function(error) {
+            return String(error);
+        }).then(function(error) {
+            view.send({event: 'capture_done', id: content.id, error: error});
+            delete model.captures[content.id];
+
+            // Put video back the way it was
+            return seek_video(video, start_time).catch(function() {});
+        }).then(function() {
+            view.capturing = false;
+            if (!was_paused) {
+                video.play();
+            }
+        });
+    },
+
+    when_readable: function() {
+        // Resolve once video has a frame whose pixels may be read back from a canvas.  Video
+        // from another origin taints the canvas, the kernel's server allows cross-origin access
+        // so reload the video in CORS mode when that happens.
+        var video = this.video;
+        if (this.el !== video) {
+            return Promise.reject(new Error('Live streams have no frames to capture'));
+        }
+
+        var ready = Promise.resolve();
+        if (video.readyState < video.HAVE_CURRENT_DATA) {
+            ready = video_event(video, ['loadeddata']);
+        }
+
+        function readable() {
+            var canvas = document.createElement('canvas');
+            canvas.width = canvas.height = 1;
+            var context = canvas.getContext('2d');
+            context.drawImage(video, 0, 0, 1, 1);
+            try {
+                context.getImageData(0, 0, 1, 1);
+                return true;
+            } catch (error) {
+                if (error.name !== 'SecurityError' || video.crossOrigin) {
+                    throw error;
+                }
+                return false;
+            }
+        }
+
+        return ready.then(function() {
+            if (readable()) {
+                return;
+            }
+
+            video.crossOrigin = 'anonymous';
+            var loaded = video_event(video, ['loadeddata']);
+            video.load();
+            return loaded.then(readable);
+        });
+    },
+
+    show_element: function(element) {
+        // Swap view's element between video and image, keeping its place and layout styles
+        if (element === this.el) {
+            return;
+        }
+
+        element.style.cssText = this.el.style.cssText;
+        element.className = this.el.className;
+        if (this.el.parentNode) {
+            this.el.parentNode.replaceChild(element, this.el);
+        }
+        this.setElement(element);
+    },
+
+    remove: function() {
+        if (this.model.video_views) {
+            this.model.video_views.delete(this);
+        }
+        this.flush_events();
+        this.image.removeAttribute('src');
+        this.hls_src = null;
+        if (this.hls) {
+            this.hls.destroy();
+            this.hls = null;
+        }
+        VideoView.__super__.remove.apply(this, arguments);
+    },
+
+    frame_times_changed: function() {
+        // Frame start times read from the video file by the kernel, if available
+        this.frame_times = float64_array(this.model.get('_frame_times'));
+        this.keyframe_times = float64_array(this.model.get('_keyframe_times'));
     },
 
     current_time_changed: function() {
         // HTML5 video element responds to backbone model changes.
-        this.video['currentTime'] = this.model.get('current_time');
-        // }
+        var t = this.model.get('current_time');
+
+        var keyframes = this.keyframe_times;
+        if (this.model.get('fast_seek') && keyframes) {
+            // Snap to nearest keyframe, decoding starts right there
+            var index = frame_at(keyframes, t);
+            if (index + 1 < keyframes.length && keyframes[index + 1] - t < t - keyframes[index]) {
+                index += 1;
+            }
+            t = keyframes[index];
+        }
+
+        this.video['currentTime'] = t;
     },
 
     play_pause_changed: function() {
@@ -398,6 +1352,17 @@ var VideoView = widgets_base.DOMWidgetView.extend({
 
     jump_frames: function(num_frames) {
         // Jump fractional number of frames, positive or negative
+        var times = this.frame_times;
+        if (times && Number.isInteger(num_frames)) {
+            // Land exactly on the start of the target frame, also for variable frame rate
+            if (!this.video.paused) {
+                this.video.pause();
+            }
+            var index = frame_at(times, this.video.currentTime) + num_frames;
+            this.video.currentTime = times[Math.min(Math.max(index, 0), times.length - 1)];
+            return;
+        }
+
         var dt_frame = this.model.get('timebase');
 
         this.jump_seconds(num_frames*dt_frame);
@@ -423,24 +1388,83 @@ var VideoView = widgets_base.DOMWidgetView.extend({
     handle_event: function(ev) {
         // General video-element event handler
         // https://developer.mozilla.org/en-US/docs/Web/API/HTMLMediaElement
-        var fields = ['clientHeight', 'clientWidth', 'controls', 'currentTime', 'currentSrc',
-                      'duration', 'ended', 'muted', 'paused', 'playbackRate',
-                      'readyState', 'seeking', 'videoHeight', 'videoWidth', 'volume'];
+        if (this.capturing) {
+            // Seeks made by capture_frames() are none of the kernel's business
+            return;
+        }
+
+        // Other views' events were compared against the shared state first, so they have to
+        // reach the kernel first
+        for (let view of video_views(this.model)) {
+            if (view !== this) {
+                view.flush_events();
+            }
+        }
 
-        var pev = {'type': ev.type};
-        for (let f of fields) {
-            pev[f] = ev.target[f];
+        var sent_state = this.model.sent_state;
+        var changes = {};
+        for (let f of event_fields) {
+            var value = ev.target[f];
+            if (!Object.is(value, sent_state[f])) {
+                changes[f] = value;
+                sent_state[f] = value;
+            }
         }
-        this.model.set('_event', pev);
+        this.queue_event({type: ev.type, changes: changes, sample: this.time_samples.length,
+                          time: wall_time()});
 
         // https://developer.mozilla.org/en-US/docs/Web/Events/timeupdate
+        // Widgets linked in the front end follow right away, the kernel hears about it with the
+        // event.
         this.model.set('current_time', ev.target['currentTime']);
-        this.touch();
+    },
+
+    queue_event: function(event) {
+        this.pending_events.push(event);
+        this.schedule_flush();
+    },
+
+    queue_time_sample: function(t) {
+        this.time_samples.push(t);
+        this.sample_times.push(wall_time());
+        this.schedule_flush();
+    },
+
+    schedule_flush: function() {
+        // Coalesce everything that happens within event_window seconds into one message
+        var window = this.model.get('event_window');
+        if (!(window > 0)) {
+            this.flush_events();
+        } else if (!this.flush_timer) {
+            this.flush_timer = setTimeout(this.flush_events.bind(this), 1000*window);
+        }
+    },
+
+    flush_events: function() {
+        // Send queued media events, and time samples packed as float64 in a binary buffer
+        // followed by a buffer of when they were taken.  Each event records how many samples
+        // came before it so the kernel can replay them in order.
+        clearTimeout(this.flush_timer);
+        this.flush_timer = null;
+
+        if (!this.pending_events.length && !this.time_samples.length) {
+            return;
+        }
+
+        var samples = new Float64Array(this.time_samples);
+        var times = new Float64Array(this.sample_times);
+        this.send({event: 'media_events', events: this.pending_events},
+                  [samples.buffer, times.buffer]);
+
+        this.pending_events = [];
+        this.time_samples = [];
+        this.sample_times = [];
     },
 
     fast_time_update: function() {
-        this.model.set('current_time', this.video['currentTime']);
-        this.touch();
+        var t = this.video['currentTime'];
+        this.model.set('current_time', t);
+        this.queue_time_sample(t);
 
         var delta_time_fast = 25;   // milliseconds.  100 ms is too slow, 25 ms seems nice...
         if (this.enable_fast_time_update) {
@@ -534,7 +1558,10 @@ module.exports = {
     TimeCodeModel: TimeCodeModel,
     TimeCodeView: TimeCodeView,
     VideoModel: VideoModel,
-    VideoView: VideoView
+    VideoView: VideoView,
+    ScrubBarModel: ScrubBarModel,
+    ScrubBarView: ScrubBarView,
+    SyncGroupModel: SyncGroupModel
 };
 
 
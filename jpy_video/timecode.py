@@ -0,0 +1,250 @@
+"""
+Bulk conversion between seconds, frame numbers and SMPTE timecodes 'HH:MM:SS;FF', on whole NumPy
+arrays at a time.  Needs NumPy.
+
+Frame numbers follow the widget's timebase (seconds per frame), or a video's actual frame times
+from Video.frame_index.  Timecodes count frames at the nominal integer rate, e.g. 24 for 23.976
+fps.  The NTSC rates 29.97 and 59.94 fps use drop-frame timecode by default: frame numbers 00 and
+01 (00-03 at 59.94) are skipped at the start of every minute except each tenth, which keeps
+timecode in step with the clock.
+
+Timecodes are formatted and parsed as fixed-width rows of character codes straight in the
+memory of NumPy str arrays, several million per second.
+
+    converter = TimecodeConverter(1001/30000)
+    converter.to_timecode([0, 60.06, 600])  # -> ['00:00:00;00', '00:01:00;02', '00:10:00;00']
+"""
+
+import numpy
+
+__all__ = ['TimecodeConverter', 'is_drop_frame_rate']
+
+# Same as mp4.TIME_TOLERANCE and the front end's time_tolerance, absorbs float rounding of
+# frame start times
+TIME_TOLERANCE = 1e-6
+
+SEPARATORS = b':;.,'
+
+#------------------------------------------------
+
+def is_drop_frame_rate(rate):
+    """Return True if frames per second is one of the NTSC rates 30000/1001 or 60000/1001 that
+    drop-frame timecode exists for
+    """
+    return any(abs(rate - nominal*1000/1001) < 1e-3 for nominal in (30, 60))
+
+def put_digits(rows, column, values, width):
+    """Write decimal digits of non-negative integers into columns of character code rows
+    """
+    for k in range(column + width - 1, column - 1, -1):
+        values, digit = numpy.divmod(values, 10)
+        rows[:, k] = digit
+        rows[:, k] += ord('0')
+
+def character_rows(codes):
+    """Return array shape (N, width) of the character codes of timecode strings, right-aligned
+    and padded with '0' on the left.  Str arrays are read as their UCS-4 code points in place,
+    without encoding.
+    """
+    codes = numpy.asarray(codes)
+    if codes.dtype.kind not in 'SU':
+        codes = codes.astype('U')
+
+    codes = numpy.ascontiguousarray(codes.ravel())
+    if not codes.size:
+        return numpy.zeros((0, 11), numpy.uint8)
+
+    if codes.dtype.kind == 'U':
+        rows = codes.view(numpy.uint32)
+    else:
+        rows = codes.view(numpy.uint8)
+    rows = rows.reshape(len(codes), -1)
+
+    # Strings shorter than the longest are padded with NULs on the right, e.g. when hours have
+    # more digits
+    width = rows.shape[1]
+    lengths = numpy.count_nonzero(rows, axis=1)
+    if (lengths != width).any():
+        columns = numpy.arange(width) - (width - lengths)[:, None]
+        shifted = numpy.take_along_axis(rows, numpy.maximum(columns, 0), axis=1)
+        rows = numpy.where(columns >= 0, shifted, ord('0')).astype(rows.dtype)
+
+    return rows
+
+#------------------------------------------------
+
+class TimecodeConverter():
+    """Converts arrays of times, frame numbers and timecodes for one video.
+
+        timebase = 1/30       # seconds per frame, e.g. Video.timebase
+        drop_frame = None     # drop-frame timecode, default is True for 29.97 and 59.94 fps
+        frame_times = None    # start time of each frame, e.g. Video.frame_index.times.  Used for
+                              # converting between seconds and frame numbers of variable frame
+                              # rate video.
+        separator = None      # character before the frames field, default ';' like the
+                              # TimeCode widget
+
+    Frame numbers are int64 arrays counted from zero.
+    """
+    def __init__(self, timebase=1/30, drop_frame=None, frame_times=None, separator=None):
+        if not timebase > 0:
+            raise ValueError('Timebase must be positive: {}'.format(timebase))
+
+        self.timebase = timebase
+        rate = 1/timebase
+        self.nominal_rate = max(int(round(rate)), 1)
+
+        if drop_frame is None:
+            drop_frame = is_drop_frame_rate(rate)
+        if drop_frame and self.nominal_rate % 30:
+            raise ValueError('Drop-frame timecode needs 29.97 or 59.94 fps: {:.3f}'.format(rate))
+        self.drop_frame = bool(drop_frame)
+
+        self.frame_times = None
+        if frame_times is not None and len(frame_times):
+            self.frame_times = numpy.asarray(frame_times, dtype=float)
+
+        if separator is None:
+            separator = ';'
+        if len(separator) != 1 or separator.encode('ascii') not in SEPARATORS:
+            raise ValueError('Separator must be one of {}: {!r}'.format(SEPARATORS, separator))
+        self.separator = separator
+
+        # Frame numbers skipped each minute, and frames in a minute / ten minutes of drop-frame
+        # timecode
+        self._dropped = 2*self.nominal_rate//30 if self.drop_frame else 0
+        self._minute = 60*self.nominal_rate - self._dropped
+        self._ten_minutes = 600*self.nominal_rate - 9*self._dropped
+
+    def __repr__(self):
+        return 'TimecodeConverter(timebase={}, drop_frame={})'.format(self.timebase,
+                                                                      self.drop_frame)
+
+    #--------------------------------------------
+    # Seconds <-> frame numbers
+    def frames(self, seconds):
+        """Return numbers of frames on screen at given times
+        """
+        seconds = numpy.asarray(seconds, dtype=float)
+
+        if self.frame_times is not None:
+            index = numpy.searchsorted(self.frame_times, seconds + TIME_TOLERANCE, side='right')
+            return numpy.maximum(index - 1, 0).astype(numpy.int64)
+
+        return numpy.floor(seconds/self.timebase + TIME_TOLERANCE).astype(numpy.int64)
+
+    def seconds(self, frames):
+        """Return start times of frame numbers
+        """
+        frames = numpy.asarray(frames, dtype=numpy.int64)
+
+        if self.frame_times is not None:
+            return self.frame_times[numpy.clip(frames, 0, len(self.frame_times) - 1)]
+
+        return frames*self.timebase
+
+    #--------------------------------------------
+    # Frame numbers <-> timecodes
+    def fields(self, frames):
+        """Return int64 arrays (hours, minutes, seconds, frames) of timecodes of frame numbers
+        """
+        frames = numpy.asarray(frames, dtype=numpy.int64)
+        if (frames < 0).any():
+            raise ValueError('Frame numbers must not be negative')
+
+        if self.drop_frame:
+            # Add back the frame numbers skipped so far
+            tens, remainder = numpy.divmod(frames, self._ten_minutes)
+            minutes = numpy.maximum(remainder - self._dropped, 0)//self._minute
+            frames = frames + self._dropped*(9*tens + minutes)
+
+        rate = self.nominal_rate
+        seconds, ff = numpy.divmod(frames, rate)
+        minutes, ss = numpy.divmod(seconds, 60)
+        hh, mm = numpy.divmod(minutes, 60)
+
+        return hh, mm, ss, ff
+
+    def format(self, frames):
+        """Return array of timecode strings of frame numbers, same shape as frames
+        """
+        frames = numpy.asarray(frames, dtype=numpy.int64)
+        shape = frames.shape
+        hh, mm, ss, ff = self.fields(frames.ravel())
+
+        hour_digits = max(len(str(int(hh.max()))) if hh.size else 0, 2)
+        frame_digits = max(len(str(self.nominal_rate - 1)), 2)
+        width = hour_digits + 7 + frame_digits
+
+        # UCS-4 code points of a str array
+        rows = numpy.empty((len(hh), width), numpy.uint32)
+        put_digits(rows, 0, hh, hour_digits)
+        rows[:, hour_digits] = ord(':')
+        put_digits(rows, hour_digits + 1, mm, 2)
+        rows[:, hour_digits + 3] = ord(':')
+        put_digits(rows, hour_digits + 4, ss, 2)
+        rows[:, hour_digits + 6] = ord(self.separator)
+        put_digits(rows, hour_digits + 7, ff, frame_digits)
+
+        return rows.view('U{}'.format(width)).reshape(shape)
+
+    def parse(self, codes):
+        """Return frame numbers of array of timecode strings 'HH:MM:SS;FF'.  Any of ':;.,' may
+        separate the fields.  Raises ValueError for malformed timecodes, and for frames dropped
+        in drop-frame timecode.
+        """
+        shape = numpy.shape(codes)
+        rows = character_rows(codes)
+
+        width = rows.shape[1]
+        frame_digits = max(len(str(self.nominal_rate - 1)), 2)
+        hour_digits = width - 7 - frame_digits
+        if hour_digits < 1:
+            raise ValueError('Timecodes too short for HH:MM:SS;FF')
+
+        separators = [hour_digits, hour_digits + 3, hour_digits + 6]
+        if not numpy.isin(rows[:, separators], numpy.frombuffer(SEPARATORS, numpy.uint8)).all():
+            raise ValueError('Timecodes must look like HH:MM:SS;FF')
+
+        # Character codes past '9' wrap around to large numbers, as do those before '0'
+        digits = rows - rows.dtype.type(ord('0'))
+        digits[:, separators] = 0
+        if (digits > 9).any():
+            raise ValueError('Timecodes must look like HH:MM:SS;FF')
+
+        def number(first, last):
+            value = digits[:, first].astype(numpy.int64)
+            for column in range(first + 1, last):
+                value *= 10
+                value += digits[:, column]
+            return value
+
+        hh = number(0, hour_digits)
+        mm = number(hour_digits + 1, hour_digits + 3)
+        ss = number(hour_digits + 4, hour_digits + 6)
+        ff = number(hour_digits + 7, width)
+
+        if (mm > 59).any() or (ss > 59).any() or (ff >= self.nominal_rate).any():
+            raise ValueError('Timecode field out of range')
+
+        minutes = 60*hh + mm
+        frames = (60*minutes + ss)*self.nominal_rate + ff
+
+        if self.drop_frame:
+            if ((ss == 0) & (ff < self._dropped) & (mm % 10 != 0)).any():
+                raise ValueError('Timecode names a frame dropped in drop-frame timecode')
+            frames -= self._dropped*(minutes - minutes//10)
+
+        return frames.reshape(shape)
+
+    #--------------------------------------------
+    # Seconds <-> timecodes
+    def to_timecode(self, seconds):
+        """Return array of timecodes of frames on screen at given times
+        """
+        return self.format(self.frames(seconds))
+
+    def from_timecode(self, codes):
+        """Return start times of frames named by array of timecodes
+        """
+        return self.seconds(self.parse(codes))
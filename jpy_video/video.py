@@ -1,18 +1,27 @@
 
+import array
+import functools
+import importlib.util
+import itertools
+import sys
 import time
 import os
 
 import IPython
 import ipywidgets
 import traitlets
-import shortuuid
 
 from ._version import __npm_module_version__, __npm_module_name__
 from ordered_namespace import Struct
+from . import events
 from . import server
+from . import mjpeg
+from . import mp4
+from . import recorder
+from . import sprites
 
 
-__all__ = ['Video', 'TimeCode']
+__all__ = ['Video', 'TimeCode', 'ScrubBar', 'SyncGroup', 'FrameCapture']
 
 
 @ipywidgets.register()
@@ -31,6 +40,9 @@ class TimeCode(ipywidgets.HTML):
     timecode = traitlets.Float().tag(sync=True)
     timebase = traitlets.Float().tag(sync=True)
 
+    # Frame start times as little-endian float64 values, see Video.frame_index
+    _frame_times = traitlets.Bytes(b'').tag(sync=True)
+
     def __init__(self, timebase=1/30):
         """Create new widget instance
         """
@@ -65,40 +77,106 @@ class Video(ipywidgets.DOMWidget):
     _event = traitlets.Dict().tag(sync=True)
     _enable_keyboard = traitlets.Bool(True).tag(sync=True)
 
+    # Frame and keyframe start times as little-endian float64 values, see frame_index
+    _frame_times = traitlets.Bytes(b'').tag(sync=True)
+    _keyframe_times = traitlets.Bytes(b'').tag(sync=True)
+
     # Public information
     src = traitlets.Unicode('').tag(sync=True)
     current_time = traitlets.Float().tag(sync=True)
     timebase = traitlets.Float().tag(sync=True)
 
+    # Front end batches media events and playback time samples, sending at most one message per
+    # event_window seconds.  Zero sends each event as it happens.
+    event_window = traitlets.Float(0.05).tag(sync=True)
+
+    # Snap current_time changes to the nearest keyframe, much faster seeking e.g. from a slider
+    fast_seek = traitlets.Bool(False).tag(sync=True)
+
+    # URL and layout of scrub-preview thumbnails, see make_previews()
+    _sprites = traitlets.Dict().tag(sync=True)
+    _sprite_ids = itertools.count(1)
+
     def __init__(self, source=None, timebase=1/30):
-        """Create new widget instance
+        """Create new widget instance.  Source may be a local video file, a URL, video data held
+        in memory (see set_data()), or a generator or queue of frames (see set_stream()).
         """
         super().__init__()
 
         self.timebase = timebase
         self.properties = Struct()
         self.server = None
+        self._token = None
+        self._memory = None
+        self._stream = None
+        self._segmented = False
+
+        # Scrub-preview thumbnails, see make_previews().  Set before filename, which releases
+        # them.
+        self._sprite_request = None
+        self._sprite_server = None
+        self._sprite_token = None
+
+        self.frame_index = None
         self.filename = None
 
         # Manage user-defined Python callback functions for frontend events
         self._event_dispatchers = {}  # ipywidgets.widget.CallbackDispatcher()
+        self._event_callbacks = {}    # events.EventCallback wrappers by (event type, callback)
+        self._event_executor = None   # events.EventExecutor, see set_callback_mode()
+
+        # Playback history, see record_events()
+        self.recorder = None
+        self._event_time = None       # when the event being handled happened, by browser clock
+
+        # Frame captures in progress keyed by id, see capture_frames()
+        self._captures = {}
+        self.on_msg(self._handle_message)
 
-        if source:
+        if isinstance(source, (str, os.PathLike)):
             if os.path.isfile(source):
                 # Setting filename starts an internal http server with support for byte-range requests
                 # This makes for smooth-as-butter seeking, fast-forward, etc.
                 self.filename = source
-            elif src:
+            elif source:
                 # set src traitlet directly
                 self.src = source
+        elif isinstance(source, mjpeg.FrameStream) or mjpeg.is_frame_source(source):
+            # Live frames
+            self.set_stream(source)
+        elif source is not None:
+            # bytes, memoryview, io.BytesIO, etc.
+            self.set_data(source)
 
         # Style
         self.layout.width = '100%'  # scale to fit inside parent element
         self.layout.align_self = 'center'
 
     def __del__(self):
-        if self.server:
-            self.server.stop()
+        self._release_file()
+
+    def close(self):
+        """Close widget and stop serving its local video file
+        """
+        self._release_file()
+        if self._event_executor is not None:
+            self._event_executor.close()
+            self._event_executor = None
+        for capture_id in list(self._captures):
+            capture = self._captures.pop(capture_id, None)
+            if capture is not None:
+                capture.finish('Widget closed')
+        super().close()
+
+    def _release_file(self):
+        """Unregister local video file, in-memory data or live stream from the shared http server
+        """
+        if self.server and self._token:
+            self.server.unregister(self._token)
+        self._token = None
+        self._memory = None
+        self._stream = None
+        self._release_sprites()
 
     def display(self):
         IPython.display.display(self)
@@ -113,41 +191,182 @@ class Video(ipywidgets.DOMWidget):
     def filename(self, fname):
         self.set_filename(fname)
 
-    def set_filename(self, fname, host=None, port=None):
+    @property
+    def memory_file(self):
+        """server.MemoryFile serving video data held in memory, None when playing a file or URL
+        """
+        return self._memory
+
+    @property
+    def stream(self):
+        """mjpeg.FrameStream of live frames, None when playing a file, data or URL.  Frames may
+        be handed over with stream.push(frame).
+        """
+        return self._stream
+
+    @property
+    def segmented(self):
+        """True when the local video file is played as an HLS stream of byte-range segments
+        instead of a single progressive download.  Only for fragmented MP4 files.
+        """
+        return self._segmented
+
+    @segmented.setter
+    def segmented(self, value):
+        previous = self._segmented
+        self._segmented = bool(value)
+        if self._token:
+            try:
+                self._update_src()
+            except ValueError:
+                self._segmented = previous
+                raise
+
+    def set_filename(self, fname, host=None, port=None, workers=8, client_connections=6,
+                     engine='thread', segmented=None):
         """Set filename for local video
+
+        The file is served by an internal http server shared by all Video widgets with the same
+        host, port and server settings.  Keywords workers and client_connections configure that
+        server's pool of worker threads and per-client connection limit.  Set workers=0 for a
+        single-threaded server.  Set engine='asyncio' to serve all connections from one asyncio
+        event loop instead.  Widgets asking for other settings get a server of their own, unless
+        a fixed port is already taken by a server with different settings, which raises
+        ValueError.
+
+        Set segmented=True to play a fragmented MP4 file as an HLS stream, see segmented.  For
+        multi-hour recordings this keeps browser memory use bounded and each seek only fetches
+        the segment it lands in.
         """
         if not fname:
             # Supplied filename is None, '', or similar.
-            # Set filename to None and shutdown server if running
+            # Set filename to None and stop serving previous file
             self._filename = ''
-            if self.server:
-                self.server.stop()
+            self._release_file()
+            self._load_frame_index()
             return
 
         elif not os.path.isfile(fname):
             raise IOError('File does not exist: {}'.format(fname))
 
         # Configure internal http server for local file
+        self._release_file()
         self._filename = os.path.realpath(fname)
 
+        self._serve(self._filename, host, port, workers, client_connections, engine, segmented)
+
+    def set_data(self, data, name='video.mp4', content_type=None, host=None, port=None,
+                 workers=8, client_connections=6, engine='thread', segmented=None):
+        """Play video data held in memory: bytes, bytearray, memoryview, io.BytesIO, or any
+        other object supporting the buffer protocol (e.g. NumPy array of encoded bytes).
+
+        Handy for video made in the kernel, no temporary file needed.  The data is served by the
+        internal http server straight from its buffer, with the same byte-range support as a
+        local file.  Don't modify it while it is being played.  It is released when the widget is
+        closed or given a new source.  Name is only used for the URL and to guess the MIME type.
+        Remaining keywords are the same as for set_filename().
+        """
+        self._release_file()
+        self._filename = ''
+        self._memory = server.MemoryFile(data, name, content_type)
+
+        self._serve(self._memory, host, port, workers, client_connections, engine, segmented)
+
+    def set_stream(self, source=None, fps=None, quality=80, host=None, port=None, workers=8,
+                   client_connections=6, engine='thread', **options):
+        """Show live Motion JPEG stream of frames generated in Python, e.g. camera feeds or
+        simulation renderers.
+
+        Source is a generator or iterator of uint8 arrays (height x width x 3 RGB), a queue they
+        are put into, or an mjpeg.FrameStream.  With source=None frames are handed over with
+        stream.push().  Frames are JPEG-encoded on worker threads (default encoder needs Pillow)
+        and the browser is always sent the newest one, a slow browser never holds up the
+        producer.  Set fps to limit the frame rate.  Other FrameStream keywords (max_queue_bytes,
+        encoder, ...) are passed along, remaining keywords are the same as for set_filename().
+
+        Streams end with their source and are closed when the widget is closed or given a new
+        source.  There is no seeking or frame index, playback controls don't apply.
+        """
+        if isinstance(source, mjpeg.FrameStream):
+            stream = source
+        else:
+            stream = mjpeg.FrameStream(source, fps=fps, quality=quality, **options)
+
+        self._release_file()
+        self._filename = ''
+        self._stream = stream
+
+        self._serve(self._stream, host, port, workers, client_connections, engine, False)
+
+    def _serve(self, source, host, port, workers, client_connections, engine, segmented):
+        """Register local file path, server.MemoryFile or mjpeg.FrameStream with the shared http
+        server and point src at it
+        """
         if not port:
             port = 0
         if not host:
             host = 'localhost'
 
-        # Start server if not already running, update path
-        path_served = os.path.dirname(self._filename)
-        if not self.server:
-            self.server = server.Server(path=path_served, host=host, port=port)
-            self.server.start()
+        # Shared server is started on first use, then the file is registered with it.  Switching
+        # files never restarts the server.
+        self.server = server.shared_server(host=host, port=port, workers=workers,
+                                           client_connections=client_connections, engine=engine)
+        self._token = self.server.register(source)
+
+        if segmented is not None:
+            self._segmented = bool(segmented)
+
+        try:
+            self._update_src()
+        except ValueError:
+            self._release_file()
+            raise
+
+        self._load_frame_index()
+
+    def _update_src(self):
+        """Point src at the local file's URL on the internal http server, or at its HLS playlist
+        in segmented mode
+        """
+        if self._segmented:
+            url = self.server.playlist_url(self._token)
         else:
-            self.server.path = path_served
+            url = self.server.token_to_url(self._token)
+
+        # Version string derived from file identity (inode, size, mtime).  Re-displaying the same
+        # file reuses the browser's cached bytes, a modified file gets a fresh URL.  In-memory
+        # data gets a new token each time, no version needed.
+        if self._filename:
+            url += '?v={}'.format(server.file_version(os.stat(self._filename)))
+
+        self.src = url
+
+    def _load_frame_index(self):
+        """Read frame timing of local or in-memory MP4 file, if there is one.  Sets timebase to
+        the average frame duration and sends frame times to the front end for frame-accurate
+        stepping.
+        """
+        self.frame_index = None
+        try:
+            if self._memory is not None:
+                if self._memory.content_type in mp4.MP4_TYPES:
+                    with self._memory.open() as fp:
+                        self.frame_index = mp4.read_frame_index(fp, self._memory.size)
+            elif self._filename and server.guess_mime_type(self._filename) in mp4.MP4_TYPES:
+                self.frame_index = mp4.frame_index(self._filename)
+        except OSError:
+            pass
+
+        if self.frame_index is None:
+            self._frame_times = b''
+            self._keyframe_times = b''
+            return
 
-        # Random version string to avoid browser caching issues
-        version = '?v={}'.format(shortuuid.uuid())
+        self._frame_times = float64_bytes(self.frame_index.times)
+        self._keyframe_times = float64_bytes(self.frame_index.keyframes)
 
-        # Set local file URL for use by internal http server
-        self.src = self.server.filename_to_url(self._filename+version)
+        if self.frame_index.frame_rate:
+            self.timebase = 1/self.frame_index.frame_rate
 
     def invoke_method(self, name, *args):
         """Invoke method on front-end HTML5 video element
@@ -186,22 +405,213 @@ class Video(ipywidgets.DOMWidget):
         self.pause()
         self.current_time = 0
 
-    def seek(self, time):
-        """Seek to a specific time
+    def seek(self, time, keyframe=False):
+        """Seek to a specific time.  For local MP4 files the time is snapped to the start of the
+        frame on screen at that time.  Set keyframe=True to go to the nearest keyframe instead,
+        which the browser can display without decoding any preceding frames.
         """
         self.pause()
+
+        if self.frame_index is not None:
+            if keyframe:
+                time = self.frame_index.nearest_keyframe(time)
+            else:
+                time = self.frame_index.snap(time)
+
         self.current_time = time
 
+    def step(self, frames=1):
+        """Pause video, then step forwards or backwards given number of frames
+        """
+        self.pause()
+
+        if self.frame_index is not None:
+            self.current_time = self.frame_index.step(self.current_time, frames)
+        else:
+            self.current_time = max(self.current_time + frames*self.timebase, 0)
+
+    @property
+    def frame(self):
+        """Number of frame currently on screen, counting from zero
+        """
+        if self.frame_index is not None:
+            return self.frame_index.frame_at(self.current_time)
+        else:
+            return int(self.current_time/self.timebase + mp4.TIME_TOLERANCE)
+
     #--------------------------------------------
     # Register Python event handlers
     # _known_event_types = []
-    def on_event(self, callback, event_type='', remove=False):
+    def capture_frames(self, times, scale=1, width=None, height=None, callback=None, timeout=30):
+        """Grab decoded frames at the given times (seconds) from the video shown in the browser.
+        Returns FrameCapture whose frames attribute, a uint8 array of shape (N, height, width, 4)
+        with RGBA pixels, is filled in as the frames arrive.  Needs NumPy.
+
+        The front end seeks to each time, draws the frame to an offscreen canvas and sends the
+        pixels back in binary widget messages.  Frames are downscaled by factor scale, or to
+        width and/or height in pixels (aspect ratio kept if only one is given).
+
+        The widget must be on display.  Frames only arrive while the kernel is idle, i.e. after
+        the calling cell finishes.  Use callback(capture), called once all frames are in, or look
+        at capture.done in a later cell.  If the front end goes quiet for timeout seconds (widget
+        not displayed, browser tab closed) the capture finishes with capture.error set instead of
+        waiting forever.  timeout=None waits forever.
+        """
+        # FrameCapture imports NumPy, fail here before any messages go out
+        if importlib.util.find_spec('numpy') is None:
+            raise ImportError('capture_frames() needs NumPy: pip install numpy')
+
+        capture = FrameCapture(times, callback, timeout)
+        if not len(capture.times):
+            capture.finish()
+            return capture
+
+        self._captures[capture.id] = capture
+        capture.watch(functools.partial(self._expire_capture, capture.id))
+
+        content = {'method': 'capture_frames',
+                   'id': capture.id,
+                   'scale': scale,
+                   'width': width,
+                   'height': height}
+        self.send(content, buffers=[capture.times.astype('<f8').tobytes()])
+
+        return capture
+
+    def make_previews(self, interval=2, width=160, quality=0.7, cache_folder=None):
+        """Prepare scrub-preview thumbnails for ScrubBar: one every interval seconds, width
+        pixels wide, JPEG quality 0...1.
+
+        Thumbnails of a local or in-memory video are loaded from the disk cache (default
+        ~/.cache/jpy_video/sprites) if the same video was done before.  Otherwise the front end
+        draws them from a hidden copy of the video, so playback isn't disturbed, which needs the
+        widget to be displayed.  Set cache_folder=False to skip the disk cache.
+        """
+        if self._stream is not None:
+            raise ValueError('Live streams have no previews')
+
+        self._release_sprites()
+
+        source = self._filename or self._memory
+        key = None
+        if source and cache_folder is not False:
+            key = sprites.sprite_key(source, interval, width, quality)
+            sheet, fname = sprites.load_cached(key, cache_folder)
+            if sheet is not None:
+                self._show_sprites(sheet, fname)
+                return
+
+        request_id = next(self._sprite_ids)
+        self._sprite_request = {'id': request_id, 'key': key, 'cache_folder': cache_folder}
+
+        content = {'method': 'capture_sprites',
+                   'id': request_id,
+                   'interval': interval,
+                   'width': width,
+                   'quality': quality,
+                   'max_tiles': sprites.MAX_TILES}
+
+        # Plain file even when playing segmented
+        if self.server and self._token:
+            content['src'] = self.server.token_to_url(self._token)
+
+        self.send(content)
+
+    def _handle_sprites(self, content, buffers):
+        """Sprite sheet from the front end, see make_previews()
+        """
+        request = self._sprite_request
+        if request is None or request['id'] != content.get('id'):
+            # Source changed since
+            return
+        self._sprite_request = None
+
+        if content.get('error') or not buffers:
+            return
+
+        layout = {name: content[name] for name in sprites.LAYOUT_FIELDS}
+        sheet = sprites.SpriteSheet(buffers[0], **layout)
+
+        fname = None
+        if request['key'] and request['cache_folder'] is not False:
+            fname = sprites.save_cached(sheet, request['key'], request['cache_folder'])
+
+        self._show_sprites(sheet, fname)
+
+    def _show_sprites(self, sheet, fname=None):
+        """Serve sprite sheet from its cache file, or from memory, and tell the front end
+        """
+        if self._sprite_server is None:
+            self._sprite_server = self.server or server.shared_server()
+
+        if fname:
+            source = fname
+        else:
+            source = server.MemoryFile(sheet.jpeg, name='previews.jpg', content_type='image/jpeg')
+
+        self._sprite_token = self._sprite_server.register(source)
+        url = self._sprite_server.token_to_url(self._sprite_token)
+        self._sprites = dict(sheet.layout, url=url)
+
+    def _release_sprites(self):
+        """Stop serving scrub-preview thumbnails and drop any capture in progress
+        """
+        if self._sprite_server and self._sprite_token:
+            self._sprite_server.unregister(self._sprite_token)
+        self._sprite_token = None
+        self._sprite_request = None
+        self._sprites = {}
+
+    def _handle_message(self, widget, content, buffers):
+        """Respond to custom messages from front end: batches of media events, and frames for
+        capture_frames()
+        """
+        event = content.get('event')
+        if event == 'media_events':
+            self._handle_media_events(content['events'], buffers)
+            return
+
+        if event == 'sprites':
+            self._handle_sprites(content, buffers)
+            return
+
+        capture = self._captures.get(content.get('id'))
+        if capture is None:
+            return
+
+        # Front end still at it
+        capture.watch(functools.partial(self._expire_capture, capture.id))
+
+        if event == 'capture_start':
+            capture.start(content['width'], content['height'])
+        elif event == 'capture_frames':
+            capture.add(content['indices'], buffers[0])
+        elif event == 'capture_done':
+            del self._captures[capture.id]
+            capture.finish(content.get('error'))
+
+    def _expire_capture(self, capture_id):
+        """Give up on frame capture the front end has stopped answering, see capture_frames()
+        """
+        capture = self._captures.pop(capture_id, None)
+        if capture is not None:
+            capture.finish('No answer from the front end for {:g} seconds'.format(capture.timeout))
+
+    def on_event(self, callback, event_type='', remove=False, throttle=None, debounce=None,
+                 latest_only=False):
         """(un)Register a Python event=-handler functions.
         Default is to register for all event types.  May be called repeatedly to set multiple
         callback functions. Supplied callback function(s) must accept two arguments: widget
         instance and event dict.  Note that no checking is done to verify that supplied event type
         is valid.
 
+        During playback 'timeupdate' fires up to 40 times per second.  Slow callbacks can be rate
+        limited so they keep up with the video instead of working through stale updates.  The
+        event dict is the widget's live properties, so a delayed call sees the newest state.
+            throttle = T        # at most one call per T seconds, the last event is never lost
+            debounce = T        # one call once events have stopped for T seconds
+            latest_only = True  # one call per batch of events from the front end
+
         Non-exhaustive list of event types:
             - durationchange
             - ended
@@ -223,8 +633,24 @@ class Video(ipywidgets.DOMWidget):
         if event_type not in self._event_dispatchers:
             self._event_dispatchers[event_type] = ipywidgets.widget.CallbackDispatcher()
 
+        # Rate-limited callbacks are registered through a wrapper
+        key = event_type, callback
+        handler = self._event_callbacks.pop(key, None)
+        if handler is not None:
+            handler.cancel()
+            self._event_dispatchers[event_type].register_callback(handler, remove=True)
+
+        if remove:
+            handler = callback
+        elif throttle or debounce or latest_only:
+            handler = events.EventCallback(callback, throttle=throttle, debounce=debounce,
+                                           latest_only=latest_only)
+            self._event_callbacks[key] = handler
+        else:
+            handler = callback
+
         # Register with specified dispatcher
-        self._event_dispatchers[event_type].register_callback(callback, remove=remove)
+        self._event_dispatchers[event_type].register_callback(handler, remove=remove)
 
         # else:
         #     # Register with all known dispatchers
@@ -235,20 +661,78 @@ class Video(ipywidgets.DOMWidget):
         """Register Python event handler for 'pause' event.
         Convenience wrapper around on_event().
         """
-        self.on_event('pause', callback)
+        self.on_event(callback, 'pause')
 
     def on_play(self, callback):
         """Register Python event handler for 'play' event.
         Convenience wrapper around on_event().
         """
-        self.on_event('play', callback)
+        self.on_event(callback, 'play')
 
     def on_ready(self, callback):
         """Register Python event handler for 'ready' event.
         Convenience wrapper around on_event().
         """
         # https://developer.mozilla.org/en-US/docs/Web/API/HTMLMediaElement/readyState
-        self.on_event('loadedmetadata', callback)
+        self.on_event(callback, 'loadedmetadata')
+
+    def set_callback_mode(self, mode='inline', workers=4):
+        """Choose where event handler functions run:
+            'inline'   # in the kernel's widget message handler, default.  A slow handler holds
+                       # up all further messages from the front end.
+            'thread'   # on a pool of worker threads, at most workers handlers at a time
+            'asyncio'  # as tasks on the kernel's asyncio event loop, handlers may be coroutine
+                       # functions
+
+        The 'thread' and 'asyncio' modes keep the order of events within each event type and hand
+        each handler a snapshot of the properties as they were when its event arrived.  See
+        callback_stats().
+        """
+        if self._event_executor is not None:
+            self._event_executor.close()
+            self._event_executor = None
+
+        if mode != 'inline':
+            self._event_executor = events.EventExecutor(mode, workers=workers)
+
+    def callback_stats(self):
+        """Return dict by event type of handler call counts, queue depth and latency, see
+        events.EventExecutor.stats().  Empty for the default 'inline' callback mode.
+        """
+        if self._event_executor is None:
+            return {}
+
+        return self._event_executor.stats()
+
+    def timecodes(self, drop_frame=None):
+        """Return timecode.TimecodeConverter for bulk conversion between times, frame numbers and
+        timecodes of this video.  Uses the frame index when there is one, timebase otherwise.
+        Needs NumPy.
+        """
+        try:
+            from . import timecode
+        except ImportError:
+            raise ImportError('timecodes() needs NumPy: pip install numpy')
+
+        frame_times = self.frame_index.times if self.frame_index is not None else None
+        return timecode.TimecodeConverter(self.timebase, drop_frame=drop_frame,
+                                          frame_times=frame_times)
+
+    def record_events(self, capacity=65536):
+        """Start recording media events and playback time updates into a fixed-size ring buffer
+        of the most recent capacity events.  Returns the recorder.EventRecorder, also available as
+        the recorder attribute, for querying e.g. which parts of the video were watched and how
+        long each frame was on screen.
+        """
+        self.recorder = recorder.EventRecorder(capacity)
+        return self.recorder
+
+    def stop_recording(self):
+        """Stop recording events.  Returns the recorder with the history so far.
+        """
+        history = self.recorder
+        self.recorder = None
+        return history
 
     # def on_display(self, callback):
     #     this method is already builtin to parent DOM Widget class
@@ -257,15 +741,48 @@ class Video(ipywidgets.DOMWidget):
     def unregister(self):
         """Unregister all event handler functions.
         """
-        callbacks = []
-        for dispatcher in self.event_dispatchers.values():
-            callbacks += dispatcher.callbacks
+        for handler in self._event_callbacks.values():
+            handler.cancel()
 
-        for cb in callbacks:
-            self.on_event(cb, remove=True)
+        self._event_callbacks.clear()
+        self._event_dispatchers.clear()
 
     #--------------------------------------------
     # Respond to front-end events by calling user's registered handler functions
+    def _handle_media_events(self, events, buffers):
+        """Replay batch of media events from the front end.  Events only carry the properties
+        that changed since the previous one, properties accumulates the full state.  Time samples
+        from playback arrive packed in a binary buffer, each becomes a change of current_time.
+        """
+        samples = float64_values(buffers[0]) if buffers else []
+        times = float64_values(buffers[1]) if len(buffers) > 1 else [None]*len(samples)
+
+        try:
+            position = 0
+            for event in events:
+                for t, self._event_time in zip(samples[position:event['sample']],
+                                               times[position:event['sample']]):
+                    self._set_current_time(t)
+                position = max(position, event['sample'])
+
+                self._event_time = event.get('time')
+                changes = event['changes']
+                self._dispatch_event(dict(changes, type=event['type']))
+
+                if 'currentTime' in changes:
+                    self._set_current_time(changes['currentTime'])
+
+            for t, self._event_time in zip(samples[position:], times[position:]):
+                self._set_current_time(t)
+        finally:
+            self._event_time = None
+
+    def _set_current_time(self, t):
+        """Update current_time from front end without echoing it back
+        """
+        with self._lock_property(current_time=t):
+            self.current_time = t
+
     @traitlets.observe('current_time', '_event')
     def _handle_event(self, change):
         """Respond to front-end backbone events
@@ -276,16 +793,39 @@ class Video(ipywidgets.DOMWidget):
         if change['name'] == '_event':
             # new stuff is a dict of information from front end
             event = change['new']
-            self.properties.update(event)
         elif change['name'] == 'current_time':
             # new stuff is a single number for current_time
             event = {'type': 'timeupdate',
                      'currentTime': change['new']}
-            self.properties.update(event)
         else:
             # raise error or not?
             return
 
+        self._dispatch_event(event)
+
+    def _dispatch_event(self, event):
+        """Fold event into properties and call handler functions registered for its type
+        """
+        self.properties.update(event)
+
+        if self.recorder is not None:
+            # Struct has no get()
+            try:
+                current_time = self.properties.currentTime
+            except KeyError:
+                current_time = None
+            self.recorder.record(event['type'], current_time, self._event_time)
+
+        if self._event_executor is not None:
+            # Queue handlers for worker threads or asyncio tasks, see set_callback_mode()
+            properties = Struct(self.properties.items())
+            for event_type in (event['type'], ''):
+                if event_type in self._event_dispatchers:
+                    self._event_executor.submit(event_type,
+                                                self._event_dispatchers[event_type].callbacks,
+                                                (self, properties))
+            return
+
         # Call any registered event-specific handler functions
         if event['type'] in self._event_dispatchers:
             self._event_dispatchers[event['type']](self, self.properties)
@@ -295,6 +835,192 @@ class Video(ipywidgets.DOMWidget):
             self._event_dispatchers[''](self, self.properties)
 
 
+@ipywidgets.register()
+class ScrubBar(ipywidgets.DOMWidget):
+    """Time slider for a Video widget showing scrub-preview thumbnails, see
+    Video.make_previews().
+
+    Hovering or dragging shows the thumbnail of the time under the pointer straight from the
+    sprite sheet, without touching the video.  The video is only seeked when the handle is
+    released, unless seek_on_release is False.  The slider follows playback in the front end.
+    """
+    _view_name =   traitlets.Unicode('ScrubBarView').tag(sync=True)
+    _view_module = traitlets.Unicode(__npm_module_name__).tag(sync=True)
+    _view_module_version = traitlets.Unicode('^' + __npm_module_version__).tag(sync=True)
+
+    _model_name =   traitlets.Unicode('ScrubBarModel').tag(sync=True)
+    _model_module = traitlets.Unicode(__npm_module_name__).tag(sync=True)
+    _model_module_version = traitlets.Unicode('^' + __npm_module_version__).tag(sync=True)
+
+    video = traitlets.Instance(Video).tag(sync=True, **ipywidgets.widget_serialization)
+
+    # Last time seeked to from the slider
+    value = traitlets.Float(0).tag(sync=True)
+    max = traitlets.Float(0).tag(sync=True)
+    step = traitlets.Float(1/30).tag(sync=True)
+    seek_on_release = traitlets.Bool(True).tag(sync=True)
+
+    def __init__(self, video, **kwargs):
+        """Create new scrub bar for Video widget
+        """
+        super().__init__(video=video, **kwargs)
+
+
+
+@ipywidgets.register()
+class SyncGroup(ipywidgets.Widget):
+    """Keeps several Video widgets playing in step, e.g. camera angles of the same scene.
+
+    The master video's element is the clock.  Every sync_interval seconds the front end
+    compares each other video with it, without any round trip through the kernel.  Drift beyond
+    tolerance is taken up over correction_time seconds by changing playbackRate, by at most
+    max_rate_change (a fraction).  Drift beyond seek_threshold seconds, e.g. after a stall, is
+    fixed with a seek.  Play, pause, seeks and rate changes of the master carry over to the
+    others.  Offsets shift videos relative to each other, in seconds.
+
+    Every report_interval seconds the front end updates stats, one dict per video with the
+    latest, mean and max absolute drift since the previous report, and counts of seeks and rate
+    nudges.
+    """
+    _model_name =   traitlets.Unicode('SyncGroupModel').tag(sync=True)
+    _model_module = traitlets.Unicode(__npm_module_name__).tag(sync=True)
+    _model_module_version = traitlets.Unicode('^' + __npm_module_version__).tag(sync=True)
+
+    videos = traitlets.List(traitlets.Instance(Video)).tag(sync=True,
+                                                          **ipywidgets.widget_serialization)
+    master = traitlets.Int(0).tag(sync=True)
+    offsets = traitlets.List(traitlets.Float()).tag(sync=True)
+
+    tolerance = traitlets.Float(0.02).tag(sync=True)
+    seek_threshold = traitlets.Float(0.5).tag(sync=True)
+    correction_time = traitlets.Float(1.0).tag(sync=True)
+    max_rate_change = traitlets.Float(0.1).tag(sync=True)
+    sync_interval = traitlets.Float(0.1).tag(sync=True)
+    report_interval = traitlets.Float(1.0).tag(sync=True)
+
+    # Drift statistics from the front end
+    stats = traitlets.List().tag(sync=True)
+
+    def __init__(self, videos=(), master=0, **kwargs):
+        """Create new sync group for sequence of Video widgets.  Keyword arguments set the
+        tuning traits.
+        """
+        super().__init__(videos=list(videos), master=master, **kwargs)
+
+    def add(self, video, offset=0):
+        """Add video to the group, optionally offset by given seconds
+        """
+        offsets = self._padded_offsets()
+        self.videos = self.videos + [video]
+        self.offsets = offsets + [float(offset)]
+
+    def remove(self, video):
+        """Stop syncing video
+        """
+        index = self.videos.index(video)
+        offsets = self._padded_offsets()
+
+        self.videos = self.videos[:index] + self.videos[index + 1:]
+        self.offsets = offsets[:index] + offsets[index + 1:]
+        if self.master >= len(self.videos):
+            self.master = 0
+
+    def _padded_offsets(self):
+        return list(self.offsets[:len(self.videos)]) + [0.]*(len(self.videos) - len(self.offsets))
+
+    @traitlets.validate('master')
+    def _validate_master(self, proposal):
+        if self.videos and not 0 <= proposal['value'] < len(self.videos):
+            raise traitlets.TraitError('Master index out of range: {}'.format(proposal['value']))
+        return proposal['value']
+
+
+
+#------------------------------------------------
+
+class FrameCapture():
+    """Frames requested with Video.capture_frames(), filled in as they arrive from the browser.
+
+    frames is a uint8 array of shape (N, height, width, 4) with RGBA pixels, allocated in one go
+    once the front end reports the frame size.  Frames still missing are all zeros.
+    """
+    _ids = itertools.count(1)
+
+    def __init__(self, times, callback=None, timeout=None):
+        import numpy
+
+        self.id = next(self._ids)
+        self.times = numpy.asarray(times, dtype=float).ravel()
+        self.frames = None
+        self.received = 0
+        self.done = False
+        self.error = None
+        self.timeout = timeout
+        self._callback = callback
+        self._timer = None
+
+    def __repr__(self):
+        return '<FrameCapture {}/{} frames{}>'.format(self.received, len(self.times),
+                                                      ', done' if self.done else '')
+
+    def start(self, width, height):
+        """Allocate frames array
+        """
+        import numpy
+        self.frames = numpy.zeros((len(self.times), height, width, 4), numpy.uint8)
+
+    def add(self, indices, buffer):
+        """Copy batch of frames received as one binary buffer into place
+        """
+        import numpy
+        count = len(indices)
+        height, width, depth = self.frames.shape[1:]
+        batch = numpy.frombuffer(buffer, numpy.uint8, count*height*width*depth)
+        self.frames[indices] = batch.reshape(count, height, width, depth)
+        self.received += count
+
+    def watch(self, expire):
+        """Call expire() unless finish() or another watch() comes within timeout seconds
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        if self.timeout is not None and not self.done:
+            self._timer = events.call_later(self.timeout, expire)
+
+    def finish(self, error=None):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        self.done = True
+        self.error = error
+        if self._callback:
+            self._callback(self)
+
+#------------------------------------------------
+
+def float64_bytes(values):
+    """Pack sequence of numbers as little-endian float64 values for a binary widget trait
+    """
+    values = array.array('d', values)
+    if sys.byteorder == 'big':
+        values.byteswap()
+
+    return values.tobytes()
+
+def float64_values(data):
+    """Unpack little-endian float64 values from binary widget buffer, inverse of float64_bytes()
+    """
+    values = array.array('d')
+    values.frombytes(data)
+    if sys.byteorder == 'big':
+        values.byteswap()
+
+    return values
+
+
 #------------------------------------------------
 if __name__ == '__main__':
     pass
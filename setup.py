@@ -130,7 +130,6 @@ setup_args = {
     ],
     'install_requires': [
         'ipywidgets>=7.0.0',
-        'shortuuid',
         'ordered-namespace',
     ],
     'packages': find_packages(),
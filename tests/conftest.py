@@ -0,0 +1,90 @@
+"""
+Shared helpers for the test suite: synthetic MP4 files small enough to build on the fly.
+"""
+
+import struct
+
+import pytest
+
+
+def box(kind, payload):
+    """Return bytes of MP4 box of given type holding payload
+    """
+    return struct.pack('>I4s', 8 + len(payload), kind) + payload
+
+
+def make_mp4(chunks, moov_first=False, moov_extra=b'', stbl_extra=b''):
+    """Return bytes of a minimal MP4 file with one track whose chunks hold given byte strings,
+    with the 'moov' box after 'mdat' as cameras write it, or before with moov_first=True.
+    Extra boxes may be appended to 'moov' and the track's 'stbl'.
+    """
+    ftyp = box(b'ftyp', b'isom\0\0\0\0isomiso2mp41')
+    payload = b''.join(chunks)
+    mdat = box(b'mdat', payload)
+
+    def moov(base):
+        offsets, position = [], base
+        for chunk in chunks:
+            offsets.append(position)
+            position += len(chunk)
+
+        stco = box(b'stco', b'\0\0\0\0' + struct.pack('>I', len(offsets)) +
+                   struct.pack('>{}I'.format(len(offsets)), *offsets))
+        stbl = box(b'stbl', box(b'stsd', b'\0'*16) + stco + stbl_extra)
+        minf = box(b'minf', box(b'vmhd', b'\0'*12) + stbl)
+        mdia = box(b'mdia', box(b'mdhd', b'\0'*24) + minf)
+        trak = box(b'trak', box(b'tkhd', b'\0'*84) + mdia)
+        return box(b'moov', box(b'mvhd', b'\0'*100) + trak + box(b'udta', b'hello') +
+                   moov_extra)
+
+    if moov_first:
+        header = moov(0)
+        return ftyp + moov(len(ftyp) + len(header) + 8) + mdat
+
+    return ftyp + mdat + moov(len(ftyp) + 8) + box(b'free', b'trailer')
+
+
+def full_box(kind, payload, version=0, flags=0):
+    """Return bytes of MP4 full box, with version and flags fields ahead of payload
+    """
+    return box(kind, bytes([version]) + flags.to_bytes(3, 'big') + payload)
+
+
+def make_fragmented_mp4(fragments, frames=30, timescale=90000, frame_duration=3000):
+    """Return (bytes, size of 'ftyp' + 'moov', offsets of fragments) of a fragmented MP4 file
+    with one video track.  Each fragment holds frames samples of the track's default duration.
+    """
+    ftyp = box(b'ftyp', b'iso6\0\0\0\0iso6mp41')
+
+    tkhd = full_box(b'tkhd', struct.pack('>III', 0, 0, 1) + b'\0'*68)
+    mdhd = full_box(b'mdhd', struct.pack('>IIII', 0, 0, timescale, 0) + b'\0'*4)
+    hdlr = full_box(b'hdlr', b'\0'*4 + b'vide' + b'\0'*12)
+    trak = box(b'trak', tkhd + box(b'mdia', mdhd + hdlr + box(b'minf', box(b'stbl', b''))))
+    mvex = box(b'mvex', full_box(b'trex', struct.pack('>IIIII', 1, 1, frame_duration, 0, 0)))
+    moov = box(b'moov', full_box(b'mvhd', b'\0'*96) + trak + mvex)
+
+    data = ftyp + moov
+    offsets = []
+    for k in range(fragments):
+        offsets.append(len(data))
+        traf = box(b'traf', full_box(b'tfhd', struct.pack('>I', 1)) +
+                   full_box(b'tfdt', struct.pack('>I', k*frames*frame_duration)) +
+                   full_box(b'trun', struct.pack('>I', frames)))
+        moof = box(b'moof', full_box(b'mfhd', struct.pack('>I', k + 1)) + traf)
+        data += moof + box(b'mdat', bytes([k])*5000)
+
+    return data, len(ftyp + moov), offsets
+
+
+@pytest.fixture
+def chunks():
+    return [bytes([65 + k])*1000 for k in range(5)]
+
+
+@pytest.fixture
+def mp4_file(tmp_path, chunks):
+    """Path of a small MP4 file with 'moov' at the end
+    """
+    path = tmp_path / 'clip.mp4'
+    path.write_bytes(make_mp4(chunks))
+    return str(path)
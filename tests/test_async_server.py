@@ -0,0 +1,81 @@
+import socket
+import threading
+import time
+
+import pytest
+
+from jpy_video import mjpeg, server
+
+from test_server import fetch
+
+
+@pytest.fixture
+def app(tmp_path):
+    (tmp_path / 'slow.bin').write_bytes(b'slow')
+    (tmp_path / 'fast.bin').write_bytes(b'fast')
+    app = server.Server(path=str(tmp_path), engine='asyncio')
+    app.start()
+    yield app
+    app.stop()
+
+
+def test_head_error_has_no_body(app):
+    with socket.create_connection((app.host, app.port), timeout=5) as sock:
+        sock.sendall(b'HEAD /missing.bin HTTP/1.1\r\nHost: x\r\nConnection: close\r\n\r\n')
+        response = b''
+        while True:
+            data = sock.recv(4096)
+            if not data:
+                break
+            response += data
+
+    head, _, body = response.partition(b'\r\n\r\n')
+    assert head.startswith(b'HTTP/1.1 404')
+    assert b'Content-Length: 0' not in head
+    assert body == b''
+
+
+def test_slow_open_does_not_block_event_loop(app, monkeypatch):
+    release = threading.Event()
+    open_source = server.open_source
+
+    def slow_open_source(source, *args, **kwargs):
+        if source.endswith('slow.bin'):
+            release.wait(5)
+        return open_source(source, *args, **kwargs)
+
+    monkeypatch.setattr(server, 'open_source', slow_open_source)
+
+    results = {}
+    thread = threading.Thread(target=lambda: results.update(slow=fetch(app, 'slow.bin')))
+    thread.start()
+    try:
+        time.sleep(0.1)
+        start = time.monotonic()
+        assert fetch(app, 'fast.bin')[2] == b'fast'
+        assert time.monotonic() - start < 2
+        assert 'slow' not in results
+    finally:
+        release.set()
+        thread.join()
+
+    assert results['slow'][2] == b'slow'
+
+
+def test_stalled_stream_notices_hangup(app):
+    stream = mjpeg.FrameStream()
+    token = app.register(stream)
+    try:
+        path = app.token_to_url(token).split(str(app.port), 1)[1]
+        with socket.create_connection((app.host, app.port), timeout=5) as sock:
+            sock.sendall('GET {} HTTP/1.1\r\nHost: x\r\n\r\n'.format(path).encode('ascii'))
+            assert sock.recv(4096).startswith(b'HTTP/1.1 200')
+            assert len(app._httpd._connections) == 1
+
+        # No frame ever arrives, the connection still goes away with the client
+        deadline = time.monotonic() + 5
+        while app._httpd._connections and time.monotonic() < deadline:
+            time.sleep(0.02)
+        assert not app._httpd._connections
+    finally:
+        app.unregister(token)
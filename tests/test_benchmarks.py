@@ -0,0 +1,89 @@
+import copy
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+here = os.path.dirname(os.path.abspath(__file__))
+script = os.path.join(os.path.dirname(here), 'benchmarks', 'bench_server.py')
+
+spec = importlib.util.spec_from_file_location('bench_server', script)
+bench = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(bench)
+
+
+def result(**changes):
+    values = {'engine': 'thread', 'file_size': bench.MiB, 'pattern': 'scrub', 'errors': 0,
+              'throughput_mib_s': 100.0,
+              'ttfb_ms': {'p50': 1.0, 'p90': 1.5, 'p99': 2.0, 'max': 3.0}}
+    values.update(changes)
+    return values
+
+
+def test_percentiles():
+    values = [k/1000 for k in range(1, 101)]
+    assert bench.percentiles(values) == pytest.approx({'p50': 51, 'p90': 91, 'p99': 100,
+                                                       'max': 100})
+    assert bench.percentiles([]) == {'p50': None, 'p90': None, 'p99': None, 'max': None}
+
+
+def test_make_files(tmp_path):
+    names = bench.make_files(str(tmp_path), [0.5, 1.25])
+    sizes = [os.path.getsize(str(tmp_path / name)) for name in names]
+    assert sizes == [bench.MiB//2, bench.MiB*5//4]
+
+
+@pytest.mark.parametrize('new, expected', [
+    (result(), []),
+    (result(throughput_mib_s=85.0), []),
+    (result(throughput_mib_s=70.0), ['thread 1 MiB scrub: throughput 100.0 -> 70.0 MiB/s']),
+    (result(ttfb_ms={'p99': 3.0}), ['thread 1 MiB scrub: ttfb p99 2.00 -> 3.00 ms']),
+    (result(errors=2), ['thread 1 MiB scrub: errors 0 -> 2']),
+    (result(pattern='probe', throughput_mib_s=1.0), []),
+])
+def test_compare(new, expected):
+    assert bench.compare([new], {'results': [result()]}, tolerance=0.2) == expected
+
+
+def test_run_all_patterns(tmp_path, capsys):
+    names = bench.make_files(str(tmp_path), [0.25])
+    results = bench.run(str(tmp_path), names, ['thread', 'asyncio'], bench.PATTERNS, repeat=1,
+                        clients=3, server_options={'workers': 2})
+    assert len(results) == 2*len(bench.PATTERNS)
+    assert len(capsys.readouterr().out.splitlines()) == len(results)
+
+    size = bench.MiB//4
+    for item in results:
+        assert item['errors'] == 0
+        assert item['requests'] > 0
+        if item['pattern'] == 'sequential':
+            assert item['bytes'] == size
+        elif item['pattern'] == 'concurrent':
+            # More clients than the thread engine has workers, they queue instead of failing
+            assert item['bytes'] == 3*size
+
+
+def test_command_line_reports_regression(tmp_path):
+    output = str(tmp_path / 'run.json')
+    command = [sys.executable, script, '--sizes', '0.25', '--repeat', '1',
+               '--patterns', 'probe', 'scrub', '--engines', 'asyncio', '--output', output]
+    subprocess.run(command, check=True, stdout=subprocess.DEVNULL, timeout=120)
+
+    with open(output) as fi:
+        report = json.load(fi)
+    assert [item['pattern'] for item in report['results']] == ['probe', 'scrub']
+
+    # Baseline that was impossibly fast
+    baseline = copy.deepcopy(report)
+    for item in baseline['results']:
+        item['throughput_mib_s'] *= 1000
+    with open(str(tmp_path / 'baseline.json'), 'w') as fo:
+        json.dump(baseline, fo)
+
+    process = subprocess.run(command + ['--compare', str(tmp_path / 'baseline.json')],
+                             stdout=subprocess.PIPE, universal_newlines=True, timeout=120)
+    assert process.returncode == 1
+    assert 'REGRESSION asyncio 0 MiB probe: throughput' in process.stdout
@@ -0,0 +1,32 @@
+import io
+import types
+
+import pytest
+
+from jpy_video.compound import VideoPlayer
+
+
+def test_player_info_for_file(mp4_file):
+    player = VideoPlayer(mp4_file, previews=False)
+    player._handle_rate_change(player.wid_video, player.properties)
+    assert 'Source: clip.mp4 |' in player.wid_info.text
+    player.wid_video.close()
+
+
+def test_player_info_for_data_in_memory(mp4_file):
+    with open(mp4_file, 'rb') as fp:
+        player = VideoPlayer(io.BytesIO(fp.read()), previews=False)
+    player._handle_rate_change(player.wid_video, player.properties)
+    assert 'Source: video.mp4 |' in player.wid_info.text
+    player.wid_video.close()
+
+
+@pytest.mark.parametrize('options, calls', [({}, 0), ({'previews': True}, 1)])
+def test_previews_are_opt_in(mp4_file, options, calls):
+    player = VideoPlayer(mp4_file, **options)
+    made = []
+    player.wid_video.make_previews = lambda: made.append(True)
+
+    player._handle_loaded_metadata(player.wid_video, types.SimpleNamespace(videoWidth=320))
+    assert len(made) == calls
+    player.wid_video.close()
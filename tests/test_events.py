@@ -0,0 +1,148 @@
+import asyncio
+import threading
+import time
+
+from jpy_video.events import EventCallback, EventExecutor
+
+
+class Calls():
+    """Callback function noting its arguments
+    """
+    def __init__(self):
+        self.args = []
+
+    def __call__(self, widget, properties):
+        self.args.append(properties)
+
+    def wait(self, count, timeout=2):
+        deadline = time.monotonic() + timeout
+        while len(self.args) < count and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return self.args
+
+
+def test_no_limit_calls_at_once():
+    calls = Calls()
+    callback = EventCallback(calls)
+    for k in range(3):
+        callback('widget', k)
+    assert calls.args == [0, 1, 2]
+
+
+def test_throttle_delivers_first_and_newest():
+    calls = Calls()
+    callback = EventCallback(calls, throttle=0.2)
+    for k in range(10):
+        callback('widget', k)
+
+    # First event at once, the rest coalesced into one call at the end of the window
+    assert calls.args == [0]
+    assert calls.wait(2) == [0, 9]
+    time.sleep(0.3)
+    assert calls.args == [0, 9]
+
+
+def test_debounce_waits_for_quiet():
+    calls = Calls()
+    callback = EventCallback(calls, debounce=0.15)
+    for k in range(5):
+        callback('widget', k)
+        time.sleep(0.05)
+
+    # Events kept coming within the debounce time, nothing delivered yet
+    assert calls.args == []
+    assert calls.wait(1) == [4]
+    time.sleep(0.3)
+    assert calls.args == [4]
+
+
+def test_latest_only_coalesces_batch():
+    calls = Calls()
+    callback = EventCallback(calls, latest_only=True)
+    for k in range(5):
+        callback('widget', k)
+
+    assert calls.args == []
+    assert calls.wait(1) == [4]
+
+
+def test_cancel_drops_pending_call():
+    calls = Calls()
+    callback = EventCallback(calls, debounce=0.05)
+    callback('widget', 1)
+    callback.cancel()
+    time.sleep(0.2)
+    assert calls.args == []
+
+
+def test_errors_are_reported(capsys):
+    def broken(widget, properties):
+        raise RuntimeError('boom')
+
+    EventCallback(broken)('widget', 1)
+    assert 'RuntimeError: boom' in capsys.readouterr().err
+
+
+def test_executor_keeps_order_per_key():
+    executor = EventExecutor('thread', workers=4)
+    seen = {'a': [], 'b': []}
+
+    def handler(key, value):
+        time.sleep(0.001*(value % 3))
+        seen[key].append(value)
+
+    for k in range(50):
+        for key in seen:
+            assert executor.submit(key, [handler], (key, k))
+
+    deadline = time.monotonic() + 5
+    while executor.queued or sum(map(len, seen.values())) < 100:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+    assert seen == {'a': list(range(50)), 'b': list(range(50))}
+    assert executor.stats()['a']['calls'] == 50
+
+    executor.close()
+    assert not executor.submit('a', [handler], ('a', 50))
+
+
+def test_executor_slow_key_does_not_block_others():
+    executor = EventExecutor('thread', workers=2)
+    release = threading.Event()
+    done = []
+
+    executor.submit('slow', [lambda: release.wait(5)], ())
+    for k in range(5):
+        executor.submit('fast', [lambda k=k: done.append(k)], ())
+
+    deadline = time.monotonic() + 2
+    while len(done) < 5 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert done == list(range(5))
+
+    release.set()
+    executor.close()
+
+
+def test_executor_asyncio_awaits_coroutines():
+    seen = []
+
+    async def handler(value):
+        await asyncio.sleep(0.001*(value % 3))
+        seen.append(value)
+
+    async def main():
+        executor = EventExecutor('asyncio', loop=asyncio.get_running_loop())
+        for k in range(20):
+            executor.submit('timeupdate', [handler, lambda value: seen.append(-value)], (k,))
+        while len(seen) < 40:
+            await asyncio.sleep(0.01)
+        executor.close()
+
+    asyncio.run(asyncio.wait_for(main(), 5))
+
+    expected = []
+    for k in range(20):
+        expected += [k, -k]
+    assert seen == expected
@@ -0,0 +1,145 @@
+import os
+
+import pytest
+
+from jpy_video import server
+
+
+def read(handle, offset, count):
+    buffer = bytearray(count)
+    handle.seek(offset)
+    num_read = handle.readinto(buffer)
+    return bytes(buffer[:num_read])
+
+
+@pytest.fixture
+def video(tmp_path):
+    path = tmp_path / 'clip.bin'
+    path.write_bytes(b'0123456789')
+    return str(path)
+
+
+def test_translate_path_follows_retargeted_symlink(tmp_path):
+    (tmp_path / 'a').mkdir()
+    (tmp_path / 'b').mkdir()
+    link = tmp_path / 'link'
+    link.symlink_to(tmp_path / 'a')
+
+    # URL paths go through realpath() before being joined onto the base folder
+    url = os.path.realpath(str(tmp_path)) + '/link'
+    assert server.translate_path('/base', url).endswith(os.path.join(str(tmp_path), 'a'))
+
+    link.unlink()
+    link.symlink_to(tmp_path / 'b')
+    assert server.translate_path('/base', url).endswith(os.path.join(str(tmp_path), 'b'))
+
+
+@pytest.mark.parametrize('use_mmap', [False, True])
+def test_reads(video, use_mmap):
+    cache = server.FileCache(use_mmap=use_mmap)
+    with cache.open(video) as handle:
+        assert (handle._entry.mmap is not None) == use_mmap
+        assert read(handle, 0, 4) == b'0123'
+        assert read(handle, 8, 4) == b'89'
+        assert read(handle, 20, 4) == b''
+        assert handle.tell() == 20
+        assert handle.fs.st_size == 10
+
+
+def test_empty_file_is_not_mapped(tmp_path):
+    path = tmp_path / 'empty.bin'
+    path.write_bytes(b'')
+    cache = server.FileCache(use_mmap=True)
+    with cache.open(str(path)) as handle:
+        assert handle._entry.mmap is None
+        assert read(handle, 0, 4) == b''
+
+
+def test_reuses_open_file(video):
+    cache = server.FileCache()
+    with cache.open(video) as first:
+        entry = first._entry
+    with cache.open(video) as second:
+        assert second._entry is entry
+    assert video in cache
+    assert len(cache) == 1
+
+
+@pytest.mark.parametrize('use_mmap', [False, True])
+def test_size_change_invalidates(video, use_mmap):
+    cache = server.FileCache(validate_interval=0, use_mmap=use_mmap)
+    with cache.open(video) as handle:
+        entry = handle._entry
+
+    with open(video, 'ab') as fp:
+        fp.write(b'abc')
+
+    with cache.open(video) as handle:
+        assert handle._entry is not entry
+        assert handle.fs.st_size == 13
+        assert read(handle, 8, 5) == b'89abc'
+    assert entry.fp.closed
+
+
+def test_mtime_change_invalidates(video):
+    cache = server.FileCache(validate_interval=0)
+    with cache.open(video) as handle:
+        entry = handle._entry
+
+    # Same size, new contents and mtime
+    with open(video, 'r+b') as fp:
+        fp.write(b'abcd')
+    fs = os.stat(video)
+    os.utime(video, ns=(fs.st_atime_ns, entry.fs.st_mtime_ns + 10**9))
+
+    with cache.open(video) as handle:
+        assert handle._entry is not entry
+        assert read(handle, 0, 4) == b'abcd'
+
+
+def test_validation_is_rate_limited(video):
+    cache = server.FileCache(validate_interval=60)
+    with cache.open(video) as handle:
+        entry = handle._entry
+
+    with open(video, 'ab') as fp:
+        fp.write(b'abc')
+
+    # Not checked against the disk again yet
+    with cache.open(video) as handle:
+        assert handle._entry is entry
+
+
+def test_file_in_use_survives_invalidation(video):
+    cache = server.FileCache(validate_interval=0, use_mmap=True)
+    handle = cache.open(video)
+    os.remove(video)
+    with open(video, 'wb') as fp:
+        fp.write(b'new contents')
+
+    with cache.open(video) as current:
+        assert read(current, 0, 3) == b'new'
+
+    # Old request still reads the old file until it lets go
+    assert read(handle, 0, 4) == b'0123'
+    entry = handle._entry
+    handle.close()
+    assert entry.fp.closed and entry.mmap is None
+
+
+def test_max_files(tmp_path):
+    cache = server.FileCache(max_files=2)
+    paths = []
+    for index in range(3):
+        path = tmp_path / '{}.bin'.format(index)
+        path.write_bytes(b'x')
+        paths.append(str(path))
+
+    busy = cache.open(paths[0])
+    for path in paths[1:]:
+        cache.open(path).close()
+
+    # Least recently used file that is not in use goes first
+    assert len(cache) == 2
+    assert paths[0] in cache._entries and paths[1] not in cache._entries
+    busy.close()
@@ -0,0 +1,71 @@
+import io
+import re
+import urllib.error
+import urllib.request
+
+import pytest
+
+from jpy_video import mp4, server
+
+from conftest import make_fragmented_mp4, make_mp4
+
+
+def test_read_fragments():
+    data, init_size, offsets = make_fragmented_mp4(5)
+    fragments = mp4.read_fragments(io.BytesIO(data), len(data))
+
+    assert fragments.init_size == init_size
+    assert list(fragments.offsets) == offsets
+    assert list(fragments.durations) == [1.0]*5
+    assert fragments.segments(2) == [(offsets[0], offsets[2] - offsets[0], 2.0),
+                                     (offsets[2], offsets[4] - offsets[2], 2.0),
+                                     (offsets[4], len(data) - offsets[4], 1.0)]
+
+
+def test_plain_mp4_is_not_fragmented(chunks):
+    data = make_mp4(chunks, moov_first=True)
+    assert mp4.read_fragments(io.BytesIO(data), len(data)) is None
+
+
+def test_hls_playlist():
+    data, init_size, offsets = make_fragmented_mp4(3)
+    fragments = mp4.read_fragments(io.BytesIO(data), len(data))
+    lines = mp4.hls_playlist(fragments, 'clip.mp4', 6).splitlines()
+
+    assert lines[0] == '#EXTM3U'
+    assert '#EXT-X-MAP:URI="clip.mp4",BYTERANGE="{}@0"'.format(init_size) in lines
+    assert '#EXT-X-BYTERANGE:{}@{}'.format(len(data) - offsets[0], offsets[0]) in lines
+    assert lines[-1] == '#EXT-X-ENDLIST'
+
+
+@pytest.mark.parametrize('engine', ['thread', 'asyncio'])
+def test_playlist_segments_are_file_ranges(engine, tmp_path, mp4_file):
+    data, _, _ = make_fragmented_mp4(8)
+    path = tmp_path / 'frag.mp4'
+    path.write_bytes(data)
+
+    app = server.Server(path=str(tmp_path), engine=engine, hls_segment_duration=2)
+    app.start()
+    try:
+        response = urllib.request.urlopen(app.url + '/frag.mp4.m3u8?v=1', timeout=5)
+        assert response.headers['Content-Type'] == 'application/vnd.apple.mpegurl'
+        text = response.read().decode('utf-8')
+        assert text.count('#EXTINF:2.000000,') == 4
+
+        for size, offset in re.findall(r'(\d+)@(\d+)', text):
+            first, last = int(offset), int(offset) + int(size) - 1
+            request = urllib.request.Request(app.url + '/frag.mp4?v=1',
+                                             headers={'Range': 'bytes={}-{}'.format(first, last)})
+            assert urllib.request.urlopen(request, timeout=5).read() == data[first:last + 1]
+
+        token = app.register(str(path))
+        assert urllib.request.urlopen(app.playlist_url(token), timeout=5).status == 200
+
+        # Not fragmented
+        with pytest.raises(urllib.error.HTTPError) as info:
+            urllib.request.urlopen(app.url + '/clip.mp4.m3u8', timeout=5)
+        assert info.value.code == 404
+        with pytest.raises(ValueError):
+            app.playlist_url(app.register(mp4_file))
+    finally:
+        app.stop()
@@ -0,0 +1,19 @@
+import io
+import queue
+
+from jpy_video import mjpeg
+
+
+def test_is_frame_source():
+    assert mjpeg.is_frame_source(iter([]))
+    assert mjpeg.is_frame_source(frame for frame in [])
+    assert mjpeg.is_frame_source(queue.Queue())
+
+
+def test_encoded_video_is_not_frame_source():
+    # File objects are iterators of lines, but hold encoded video
+    assert not mjpeg.is_frame_source(io.BytesIO(b'data'))
+    assert not mjpeg.is_frame_source(io.BufferedReader(io.BytesIO(b'data')))
+    assert not mjpeg.is_frame_source(b'data')
+    assert not mjpeg.is_frame_source(bytearray(b'data'))
+    assert not mjpeg.is_frame_source(memoryview(b'data'))
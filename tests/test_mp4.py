@@ -0,0 +1,160 @@
+import os
+import struct
+
+import pytest
+
+from jpy_video import mp4
+
+from conftest import box, full_box, make_mp4
+
+
+def read_virtual(layout, path, first, last):
+    """Return inclusive byte range of the file as served through layout
+    """
+    result = b''
+    with open(path, 'rb') as fp:
+        for data, file_first, file_last in layout.pieces(first, last):
+            if data is not None:
+                result += bytes(data)
+            else:
+                fp.seek(file_first)
+                result += fp.read(file_last - file_first + 1)
+
+    return result
+
+
+def top_level_boxes(data):
+    boxes = {}
+    for kind, offset, size, header_size in mp4.iter_boxes(data, 0, len(data)):
+        boxes[kind] = data[offset:offset + size]
+
+    return list(boxes), boxes
+
+
+def find_chunk_offsets(data, start, end):
+    for kind, offset, size, header_size in mp4.iter_boxes(data, start, end):
+        if kind in mp4.CONTAINER_BOXES:
+            offsets = find_chunk_offsets(data, offset + header_size, offset + size)
+            if offsets is not None:
+                return offsets
+        if kind in (b'stco', b'co64'):
+            return mp4.chunk_offsets(data, offset, size, header_size)
+
+
+def test_faststart_layout_moves_moov_ahead(mp4_file, chunks):
+    size = os.path.getsize(mp4_file)
+    with open(mp4_file, 'rb') as fp:
+        layout = mp4.faststart_layout(fp, size)
+    assert layout.size == size
+
+    served = read_virtual(layout, mp4_file, 0, layout.size - 1)
+    kinds, boxes = top_level_boxes(served)
+    assert kinds == [b'ftyp', b'moov', b'mdat', b'free']
+
+    # Every box other than 'moov' is unchanged, and the chunk offsets point at the same media
+    with open(mp4_file, 'rb') as fp:
+        original = fp.read()
+    _, original_boxes = top_level_boxes(original)
+    for kind in (b'ftyp', b'mdat', b'free'):
+        assert boxes[kind] == original_boxes[kind]
+
+    offsets = find_chunk_offsets(served, 0, len(served))
+    assert [served[offset:offset + len(chunk)] for offset, chunk in zip(offsets, chunks)] == chunks
+
+    # Ranges spanning the seams between segments read the same as the whole
+    for first, last in [(0, 99), (20, layout.size - 1), (size - 20, size - 1), (100, 3000)]:
+        assert read_virtual(layout, mp4_file, first, last) == served[first:last + 1]
+
+
+def test_faststart_layout_leaves_faststart_files_alone(tmp_path, chunks):
+    path = tmp_path / 'faststart.mp4'
+    path.write_bytes(make_mp4(chunks, moov_first=True))
+    with open(str(path), 'rb') as fp:
+        assert mp4.faststart_layout(fp, path.stat().st_size) is None
+
+
+def test_faststart_layout_ignores_truncated_files(tmp_path, chunks):
+    path = tmp_path / 'truncated.mp4'
+    path.write_bytes(make_mp4(chunks)[:-50])
+    with open(str(path), 'rb') as fp:
+        assert mp4.faststart_layout(fp, path.stat().st_size) is None
+
+
+HDLR = full_box(b'hdlr', b'\0'*4 + b'pict' + b'\0'*13)
+ILOC = full_box(b'iloc', b'\x44\0' + struct.pack('>H', 1) + b'\0'*14, version=1)
+SAIO = full_box(b'saio', struct.pack('>II', 1, 1000))
+
+
+@pytest.mark.parametrize('extras, moved', [
+    ({'moov_extra': full_box(b'meta', HDLR)}, True),
+    ({'moov_extra': full_box(b'meta', HDLR + ILOC)}, False),
+    ({'moov_extra': box(b'udta', box(b'meta', HDLR + ILOC))}, False),
+    ({'stbl_extra': SAIO}, False),
+])
+def test_faststart_layout_keeps_files_with_other_offsets(tmp_path, chunks, extras, moved):
+    path = tmp_path / 'meta.mp4'
+    path.write_bytes(make_mp4(chunks, **extras))
+    with open(str(path), 'rb') as fp:
+        layout = mp4.faststart_layout(fp, path.stat().st_size)
+    assert (layout is not None) == moved
+
+
+def sample_table(**tables):
+    """Return (data, child boxes) of an 'stbl' box holding given full boxes, each a list of
+    entries packed with the matching struct format
+    """
+    formats = {'stts': '>II', 'ctts': '>Ii', 'stss': '>I'}
+    payload = b''
+    for kind, entries in tables.items():
+        packed = b''.join(struct.pack(formats[kind], *entry) for entry in entries)
+        payload += box(kind.encode('ascii'), b'\0'*4 + struct.pack('>I', len(entries)) + packed)
+
+    data = box(b'stbl', payload)
+    return data, mp4.child_boxes(data, 0, len(data), 8)
+
+
+def test_frame_index_from_tables():
+    # Six frames decoded 1001/30000 s apart and reordered by composition offsets as with
+    # B-frames, keyframes at samples 1 and 5, and an edit list skipping the first frame's
+    # composition delay
+    data, stbl = sample_table(stts=[(6, 1001)],
+                              ctts=[(1, 1001), (1, 3003), (2, 0), (1, 2002), (1, 0)],
+                              stss=[(1,), (5,)])
+    index = mp4.frame_index_from_tables(data, stbl, 30000, media_time=1001)
+
+    assert len(index) == 6
+    assert [round(t*30000) for t in index.times] == [0, 1001, 2002, 3003, 4004, 5005]
+    assert [round(t*30000) for t in index.keyframes] == [0, 5005]
+    assert index.duration == pytest.approx(6006/30000)
+    assert index.frame_rate == pytest.approx(30000/1001)
+
+
+def test_frame_index_negative_composition_offsets():
+    # Version 0 'ctts' with negative offsets instead of an edit list, as some muxers write it
+    data, stbl = sample_table(stts=[(4, 1000)], ctts=[(1, 0), (1, 2000), (2, -1000)])
+    index = mp4.frame_index_from_tables(data, stbl, 1000)
+
+    assert [round(t*1000) for t in index.times] == [0, 1000, 2000, 3000]
+
+
+def test_frame_index_lookups(tmp_path):
+    index = mp4.FrameIndex([0., 0.04, 0.08, 0.12, 0.16], [0., 0.12], 0.2)
+    assert index.frame_at(0.079999999) == 2
+    assert index.frame_at(0.1) == 2
+    assert index.snap(0.15) == 0.12
+    assert index.step(0.05, 2) == 0.12
+    assert index.step(0.05, -5) == 0.
+    assert index.keyframe_before(0.1) == 0.
+    assert index.nearest_keyframe(0.07) == 0.12
+
+    fname = str(tmp_path / 'clip.idx')
+    index.save(fname)
+    loaded = mp4.FrameIndex.load(fname)
+    assert list(loaded.times) == list(index.times)
+    assert list(loaded.keyframes) == list(index.keyframes)
+    assert loaded.duration == index.duration
+
+    with open(fname, 'r+b') as fo:
+        fo.truncate(30)
+    with pytest.raises(ValueError):
+        mp4.FrameIndex.load(fname)
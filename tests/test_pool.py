@@ -0,0 +1,121 @@
+import socket
+import time
+
+import pytest
+
+from jpy_video import server
+
+
+@pytest.fixture
+def start(tmp_path, monkeypatch):
+    """Start threaded server on a folder holding data.bin, with given settings
+    """
+    (tmp_path / 'data.bin').write_bytes(b'x'*1000)
+    apps = []
+
+    def start(remote=False, **kwargs):
+        if remote:
+            # Count every connection as coming from the same remote client
+            monkeypatch.setattr(server.PoolingPathHTTPServer, 'client_key',
+                                lambda self, client_address: 'remote')
+        app = server.Server(path=str(tmp_path), **kwargs)
+        app.start()
+        apps.append(app)
+        return app
+
+    yield start
+
+    for app in apps:
+        app.stop()
+
+
+def connect(app):
+    sock = socket.create_connection((app.host, app.port), timeout=5)
+    sock.settimeout(5)
+    return sock
+
+
+def request(sock):
+    """Send GET request on open connection, return status code of the response
+    """
+    sock.sendall(b'GET /data.bin HTTP/1.1\r\nHost: localhost\r\n\r\n')
+    response = b''
+    while b'\r\n\r\n' not in response or not response.endswith(b'x'*1000):
+        data = sock.recv(65536)
+        if not data:
+            break
+        response += data
+    return int(response.split()[1]) if response else None
+
+
+def test_local_clients_are_not_limited(start):
+    app = start(workers=8, client_connections=2)
+    socks = [connect(app) for k in range(6)]
+    try:
+        assert [request(sock) for sock in socks] == [200]*6
+        assert app.stats()['refused_connections'] == 0
+    finally:
+        for sock in socks:
+            sock.close()
+
+
+def test_remote_client_over_limit_waits(start):
+    app = start(remote=True, workers=8, client_connections=2)
+    first, second, third = connect(app), connect(app), connect(app)
+    try:
+        assert request(first) == 200
+        assert request(second) == 200
+
+        # Third connection is queued, not refused, until the client closes another
+        third.sendall(b'GET /data.bin HTTP/1.1\r\nHost: localhost\r\n\r\n')
+        third.settimeout(0.5)
+        with pytest.raises(socket.timeout):
+            third.recv(1)
+
+        first.close()
+        third.settimeout(5)
+        data = third.recv(12)
+        assert data.startswith(b'HTTP/1.1 200')
+        assert app.stats()['refused_connections'] == 0
+    finally:
+        for sock in (first, second, third):
+            sock.close()
+
+
+def test_full_queue_refuses(start, monkeypatch):
+    monkeypatch.setattr(server.PoolingMixIn, 'max_queued_connections', 1)
+    app = start(workers=1)
+
+    busy = connect(app)
+    assert request(busy) == 200
+    waiting = connect(app)
+    time.sleep(0.2)
+    refused = connect(app)
+    try:
+        assert refused.recv(1024).startswith(b'HTTP/1.1 503')
+        assert app.stats()['refused_connections'] == 1
+
+        # Once the busy connection closes the waiting one is served
+        busy.close()
+        assert request(waiting) == 200
+    finally:
+        for sock in (busy, waiting, refused):
+            sock.close()
+
+
+def test_idle_connection_frees_worker(start, monkeypatch):
+    monkeypatch.setattr(server.RangeRequestHandler, 'idle_timeout', 0.3)
+    app = start(workers=1)
+
+    idle = connect(app)
+    assert request(idle) == 200
+    other = connect(app)
+    try:
+        # The only worker is held by the idle keep-alive connection until it times out
+        started = time.monotonic()
+        assert request(other) == 200
+        assert 0.2 < time.monotonic() - started < 3
+        assert idle.recv(1) == b''
+    finally:
+        idle.close()
+        other.close()
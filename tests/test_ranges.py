@@ -0,0 +1,96 @@
+import pytest
+
+from jpy_video import server
+
+
+@pytest.mark.parametrize('header, expected', [
+    ('', []),
+    ('bytes=0-99', [(0, 99)]),
+    ('bytes=100-', [(100, None)]),
+    ('bytes=-500', [(None, 500)]),
+    ('bytes=0-0,200-299, -10', [(0, 0), (200, 299), (None, 10)]),
+    ('bytes=0-1,,5-6', [(0, 1), (5, 6)]),
+])
+def test_parse_byte_ranges(header, expected):
+    assert server.parse_byte_ranges(header) == expected
+
+
+@pytest.mark.parametrize('header', [
+    'bytes=', 'bytes=-', 'bytes=5-2', 'bytes=a-b', 'items=0-9', 'bytes=0-9;x', ',',
+    'bytes=' + ','.join(['0-1']*(server.MAX_BYTE_RANGES + 1)),
+])
+def test_parse_byte_ranges_rejects(header):
+    with pytest.raises(ValueError):
+        server.parse_byte_ranges(header)
+
+
+@pytest.mark.parametrize('header, expected', [
+    ('', (None, None)),
+    ('bytes=123-456', (123, 456)),
+    ('bytes=123-', (123, None)),
+])
+def test_parse_byte_range(header, expected):
+    assert server.parse_byte_range(header) == expected
+
+
+@pytest.mark.parametrize('header', ['bytes=-500', 'bytes=0-1,5-6', 'bytes=x-'])
+def test_parse_byte_range_rejects(header):
+    with pytest.raises(ValueError):
+        server.parse_byte_range(header)
+
+
+@pytest.mark.parametrize('ranges, expected', [
+    ([(0, 99)], [(0, 99)]),
+    ([(900, None)], [(900, 999)]),
+    ([(0, 5000)], [(0, 999)]),
+    ([(None, 100)], [(900, 999)]),
+    ([(None, 5000)], [(0, 999)]),
+    ([(None, 0)], []),
+    ([(1000, None), (2000, 2100)], []),
+    ([(500, 599), (0, 99), (50, 149), (150, 199)], [(0, 199), (500, 599)]),
+    ([(0, 9), (None, 995)], [(0, 999)]),
+])
+def test_resolve_byte_ranges(ranges, expected):
+    assert server.resolve_byte_ranges(ranges, 1000) == expected
+
+
+def test_multipart_byteranges_length():
+    parts, tail, length = server.multipart_byteranges([(0, 9), (20, 29)], 'video/mp4', 100, 'xyz')
+    body = b''.join(head + b'x'*(last - first + 1) for head, first, last in parts) + tail
+    assert len(body) == length
+    assert b'Content-Range: bytes 20-29/100' in parts[1][0]
+    assert tail == b'\r\n--xyz--\r\n'
+
+
+def test_range_cap_grows_with_sequential_reads():
+    cap = server.RangeCap(100, 1000)
+    assert server.cap_open_range([(0, None)], cap) == [(0, 99)]
+    cap.served(0, 99)
+
+    # Picking up where the last response ended doubles the limit, up to maximum
+    sizes = []
+    first = 100
+    for k in range(6):
+        (first, last), = server.cap_open_range([(first, None)], cap)
+        cap.served(first, last)
+        sizes.append(last - first + 1)
+        first = last + 1
+    assert sizes == [200, 400, 800, 1000, 1000, 1000]
+
+
+def test_range_cap_shrinks_on_seeks():
+    cap = server.RangeCap(100, 1000)
+    cap.size = 800
+    cap.served(0, 99)
+
+    assert cap.limit(5000) == 400
+    assert cap.limit(9000) == 200
+    assert cap.limit(0) == 100
+    assert cap.limit(7) == 100
+
+
+def test_cap_open_range_leaves_other_ranges_alone():
+    cap = server.RangeCap(100, 1000)
+    for ranges in ([(0, 5000)], [(None, 5000)], [(0, None), (10, None)]):
+        assert server.cap_open_range(ranges, cap) == ranges
+    assert server.cap_open_range([(0, None)], None) == [(0, None)]
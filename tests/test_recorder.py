@@ -0,0 +1,97 @@
+import numpy
+import pytest
+
+from jpy_video.recorder import EventRecorder
+
+
+def test_arrays_oldest_first_after_wrapping():
+    recorder = EventRecorder(capacity=4)
+    for k in range(10):
+        recorder.record('timeupdate', float(k), timestamp=100. + k)
+
+    assert len(recorder) == 4
+    assert recorder.count == 10
+
+    timestamps, codes, current_times = recorder.arrays()
+    assert timestamps.tolist() == [106., 107., 108., 109.]
+    assert current_times.tolist() == [6., 7., 8., 9.]
+    assert (codes == recorder.type_code('timeupdate')).all()
+
+    # Views of the ring buffers, not copies
+    assert not timestamps.flags.owndata
+    with pytest.raises(ValueError):
+        timestamps[0] = 0.
+
+
+def test_views_follow_ring_but_copies_keep_snapshot():
+    recorder = EventRecorder(capacity=3)
+    for k in range(3):
+        recorder.record('timeupdate', float(k), timestamp=k)
+
+    views = recorder.arrays()
+    copies = recorder.arrays(copy=True)
+    assert copies[0].flags.owndata and copies[0].flags.writeable
+
+    recorder.record('pause', 3., timestamp=3)
+    assert views[2].tolist() != [0., 1., 2.]
+    assert copies[2].tolist() == [0., 1., 2.]
+    assert recorder.arrays()[2].tolist() == [1., 2., 3.]
+
+
+def test_every_ring_position():
+    for count in range(12):
+        recorder = EventRecorder(capacity=5)
+        for k in range(count):
+            recorder.record('play', k, timestamp=k)
+        assert recorder.arrays()[2].tolist() == list(range(max(count - 5, 0), count))
+
+
+def test_event_type_codes():
+    recorder = EventRecorder(capacity=2)
+    assert recorder.type_code('seeking') == recorder.event_types.index('seeking')
+
+    code = recorder.type_code('custom')
+    assert recorder.event_types[code] == 'custom'
+    assert recorder.type_code('custom') == code
+
+    for k in range(300):
+        recorder.type_code('custom{}'.format(k))
+    assert len(recorder.event_types) == 256
+    assert recorder.type_code('one too many') == 0
+
+
+def test_clear_and_missing_current_time():
+    recorder = EventRecorder(capacity=3)
+    recorder.record('emptied', None)
+    assert numpy.isnan(recorder.arrays()[2][0])
+
+    recorder.clear()
+    assert len(recorder) == 0
+    assert all(len(values) == 0 for values in recorder.arrays())
+
+
+def test_queries():
+    recorder = EventRecorder()
+    # Play 0-4 s, seek to 10 s, play to 12 s
+    for k in range(5):
+        recorder.record('timeupdate', float(k), timestamp=float(k))
+    recorder.record('seeking', 10., timestamp=5.)
+    for k in range(3):
+        recorder.record('timeupdate', 10. + k, timestamp=6. + k)
+
+    assert recorder.seek_count() == 1
+
+    seconds, edges = recorder.coverage(bins=12, duration=12.)
+    assert seconds.sum() == pytest.approx(6.)
+    assert seconds[:4].tolist() == [1., 1., 1., 1.]
+    assert seconds[4:10].sum() == 0
+
+    dwell = recorder.dwell(timebase=1.)
+    assert dwell.sum() == pytest.approx(8.)
+    assert dwell[4] == pytest.approx(1.)
+    assert dwell[10] == pytest.approx(2.)
+
+
+def test_invalid_capacity():
+    with pytest.raises(ValueError):
+        EventRecorder(capacity=0)
@@ -0,0 +1,92 @@
+import http.client
+import io
+import os
+
+import pytest
+
+from jpy_video import server
+
+
+DATA = os.urandom(300*1024 + 17)
+
+
+@pytest.fixture
+def start(tmp_path):
+    (tmp_path / 'data.bin').write_bytes(DATA)
+    apps = []
+
+    def start(**kwargs):
+        app = server.Server(path=str(tmp_path), **kwargs)
+        app.start()
+        apps.append(app)
+        return app
+
+    yield start
+
+    for app in apps:
+        app.stop()
+
+
+def get_range(app, first, last):
+    connection = http.client.HTTPConnection(app.host, app.port, timeout=5)
+    try:
+        connection.request('GET', '/data.bin', headers={'Range': 'bytes={}-{}'.format(first,
+                                                                                       last)})
+        response = connection.getresponse()
+        return response.status, response.read()
+    finally:
+        connection.close()
+
+
+RANGES = [(0, 0), (1, 4096), (100000, 299999), (len(DATA) - 5, len(DATA) - 1),
+          (0, len(DATA) - 1)]
+
+
+def test_can_sendfile(tmp_path):
+    path = tmp_path / 'data.bin'
+    path.write_bytes(b'abc')
+    with open(str(path), 'rb') as fp:
+        assert server.can_sendfile(fp) == hasattr(os, 'sendfile')
+
+    assert not server.can_sendfile(io.BytesIO(b'abc'))
+
+    read_end, write_end = os.pipe()
+    with os.fdopen(read_end, 'rb') as fp, os.fdopen(write_end, 'wb'):
+        assert not server.can_sendfile(fp)
+
+
+@pytest.mark.skipif(not hasattr(os, 'sendfile'), reason='no os.sendfile')
+@pytest.mark.parametrize('open_files', [0, 32])
+def test_ranges_go_through_sendfile(start, monkeypatch, open_files):
+    calls = []
+    sendfile = server.RangeRequestHandler.copy_chunks_sendfile
+
+    def spy(self, src, offset, count):
+        calls.append((offset, count))
+        return sendfile(self, src, offset, count)
+
+    monkeypatch.setattr(server.RangeRequestHandler, 'copy_chunks_sendfile', spy)
+    app = start(open_files=open_files, faststart=False)
+
+    for first, last in RANGES:
+        assert get_range(app, first, last) == (206, DATA[first:last + 1])
+    assert calls == [(first, last - first + 1) for first, last in RANGES]
+
+
+def test_buffered_fallback(start, monkeypatch):
+    monkeypatch.setattr(server, 'can_sendfile', lambda fp: False)
+    monkeypatch.setattr(server.RangeRequestHandler, 'chunk_size', 1000)
+    app = start(faststart=False)
+
+    for first, last in RANGES:
+        assert get_range(app, first, last) == (206, DATA[first:last + 1])
+
+
+def test_buffered_copy_stops_at_end_of_file(tmp_path):
+    handler = server.RangeRequestHandler.__new__(server.RangeRequestHandler)
+    handler.chunk_size = 7
+    dst = io.BytesIO()
+
+    # Asked for more than is left, e.g. file got shorter since it was opened
+    assert handler.copy_chunks_buffered(io.BytesIO(DATA[:100]), dst, 90, 50) == 10
+    assert dst.getvalue() == DATA[90:100]
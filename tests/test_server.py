@@ -0,0 +1,201 @@
+import http.client
+import json
+import os
+import shutil
+import urllib.parse
+
+import pytest
+
+from jpy_video import server
+
+
+@pytest.fixture(params=['thread', 'asyncio'])
+def app(request, tmp_path, mp4_file):
+    shutil.copy(mp4_file, str(tmp_path / 'plain.bin'))
+    app = server.Server(path=str(tmp_path), port=0, engine=request.param)
+    app.start()
+    yield app
+    app.stop()
+
+
+def fetch(app, name, headers=None, method='GET'):
+    """Return (status, headers, body) of response to request for file name
+    """
+    address = urllib.parse.urlsplit(app.url)
+    connection = http.client.HTTPConnection(address.hostname, address.port, timeout=5)
+    try:
+        connection.request(method, '/' + name, headers=headers or {})
+        response = connection.getresponse()
+        return response.status, response.headers, response.read()
+    finally:
+        connection.close()
+
+
+def test_faststart_response_has_own_validators(app, mp4_file):
+    status, headers, body = fetch(app, 'clip.mp4')
+    assert status == 200
+    assert body != open(mp4_file, 'rb').read()
+    assert headers['ETag'].endswith('-faststart"')
+    assert 'Last-Modified' not in headers
+
+    # Validators of the bytes as stored on disk don't match the remapped layout
+    fs = os.stat(mp4_file)
+    assert headers['ETag'] != server.file_etag(fs)
+    status, _, _ = fetch(app, 'clip.mp4', {'If-None-Match': server.file_etag(fs)})
+    assert status == 200
+
+    stale = {'Range': 'bytes=0-99', 'If-Range': server.file_etag(fs)}
+    status, _, body = fetch(app, 'clip.mp4', stale)
+    assert status == 200
+
+    date = {'Range': 'bytes=0-99', 'If-Range': 'Thu, 01 Jan 2037 00:00:00 GMT'}
+    status, _, body = fetch(app, 'clip.mp4', date)
+    assert status == 200
+
+    # Its own tag does
+    status, _, _ = fetch(app, 'clip.mp4', {'If-None-Match': headers['ETag']})
+    assert status == 304
+
+    current = {'Range': 'bytes=0-99', 'If-Range': headers['ETag']}
+    status, _, body = fetch(app, 'clip.mp4', current)
+    assert status == 206
+    assert len(body) == 100
+
+
+def test_plain_response_keeps_file_validators(app, tmp_path):
+    status, headers, _ = fetch(app, 'plain.bin')
+    assert status == 200
+    assert headers['ETag'] == server.file_etag(os.stat(str(tmp_path / 'plain.bin')))
+    assert 'Last-Modified' in headers
+
+
+def test_single_range(app, tmp_path):
+    data = (tmp_path / 'plain.bin').read_bytes()
+    status, headers, body = fetch(app, 'plain.bin', {'Range': 'bytes=100-199'})
+    assert status == 206
+    assert headers['Content-Range'] == 'bytes 100-199/{}'.format(len(data))
+    assert body == data[100:200]
+
+    status, headers, body = fetch(app, 'plain.bin', {'Range': 'bytes=-10'})
+    assert status == 206
+    assert body == data[-10:]
+
+
+def test_multiple_ranges(app, tmp_path):
+    data = (tmp_path / 'plain.bin').read_bytes()
+    status, headers, body = fetch(app, 'plain.bin', {'Range': 'bytes=0-9,100-109'})
+    assert status == 206
+    assert headers['Content-Type'].startswith('multipart/byteranges; boundary=')
+    assert int(headers['Content-Length']) == len(body)
+    assert body.count(b'Content-Range: bytes ') == 2
+    assert data[0:10] in body and data[100:110] in body
+
+
+def test_unsatisfiable_range(app, tmp_path):
+    size = (tmp_path / 'plain.bin').stat().st_size
+    status, headers, body = fetch(app, 'plain.bin', {'Range': 'bytes={}-'.format(size)})
+    assert status == 416
+    assert headers['Content-Range'] == 'bytes */{}'.format(size)
+    assert body == b''
+
+
+def test_invalid_range(app):
+    status, _, _ = fetch(app, 'plain.bin', {'Range': 'bytes=9-1'})
+    assert status == 400
+
+
+def test_conditional_requests(app, tmp_path):
+    fs = os.stat(str(tmp_path / 'plain.bin'))
+    status, headers, _ = fetch(app, 'plain.bin')
+    etag = headers['ETag']
+    assert etag == server.file_etag(fs)
+
+    status, headers, body = fetch(app, 'plain.bin', {'If-None-Match': etag})
+    assert status == 304
+    assert headers['ETag'] == etag
+    assert body == b''
+
+    status, _, _ = fetch(app, 'plain.bin', {'If-None-Match': '"other", W/' + etag})
+    assert status == 304
+
+    status, _, _ = fetch(app, 'plain.bin', {'If-None-Match': '"other"'})
+    assert status == 200
+
+    status, _, _ = fetch(app, 'plain.bin', {'If-Modified-Since': headers['Last-Modified']})
+    assert status == 304
+
+    status, _, _ = fetch(app, 'plain.bin', {'If-Modified-Since': 'Thu, 01 Jan 1970 00:00:00 GMT'})
+    assert status == 200
+
+
+def test_if_range(app):
+    _, headers, _ = fetch(app, 'plain.bin')
+
+    status, _, body = fetch(app, 'plain.bin', {'Range': 'bytes=0-9', 'If-Range': headers['ETag']})
+    assert status == 206
+    assert len(body) == 10
+
+    status, _, body = fetch(app, 'plain.bin', {'Range': 'bytes=0-9',
+                                               'If-Range': headers['Last-Modified']})
+    assert status == 206
+
+    status, _, body = fetch(app, 'plain.bin', {'Range': 'bytes=0-9', 'If-Range': '"stale"'})
+    assert status == 200
+    assert len(body) == int(headers['Content-Length'])
+
+
+def test_head(app):
+    _, get_headers, _ = fetch(app, 'plain.bin')
+    status, headers, body = fetch(app, 'plain.bin', method='HEAD')
+    assert status == 200
+    assert body == b''
+    assert headers['Content-Length'] == get_headers['Content-Length']
+    assert headers['ETag'] == get_headers['ETag']
+
+
+
+@pytest.mark.parametrize('engine', ['thread', 'asyncio'])
+def test_block_cache(engine, tmp_path):
+    data = bytes(range(256))*40
+    (tmp_path / 'data.bin').write_bytes(data)
+
+    app = server.Server(path=str(tmp_path), engine=engine, block_cache=4096, block_size=1024)
+    app.start()
+    try:
+        for first, last in [(0, 99), (1000, 3000), (0, 99), (5000, 9999), (1000, 3000)]:
+            status, _, body = fetch(app, 'data.bin', {'Range': 'bytes={}-{}'.format(first, last)})
+            assert status == 206
+            assert body == data[first:last + 1]
+
+        cache = app.cache_stats()
+        assert cache['hits'] > 0 and cache['misses'] > 0
+        assert cache['bytes'] <= 4096
+        assert cache['evictions'] > 0
+    finally:
+        app.stop()
+
+
+def test_folder_listing(app, tmp_path):
+    folder = tmp_path / 'folder'
+    folder.mkdir()
+    (folder / 'sub').mkdir()
+    for name in ('b.mp4', 'A.txt', 'c.bin'):
+        (folder / name).write_bytes(b'x'*10)
+
+    status, headers, body = fetch(app, 'folder/?format=json&per_page=2&page=2')
+    assert status == 200
+    assert headers['Content-Type'] == 'application/json'
+    doc = json.loads(body.decode('utf-8'))
+    assert (doc['page'], doc['pages'], doc['total']) == (2, 2, 4)
+    assert [entry['name'] for entry in doc['entries']] == ['c.bin', 'sub']
+    assert doc['entries'][1]['type'] == 'directory'
+
+    status, _, body = fetch(app, 'folder/?per_page=2')
+    assert status == 200
+    assert b'A.txt' in body and b'Page 1 of 2' in body
+
+    # A changed folder is scanned again
+    (folder / 'd.mp4').write_bytes(b'')
+    os.utime(str(folder), ns=(0, os.stat(str(folder)).st_mtime_ns + 10**9))
+    _, _, body = fetch(app, 'folder/?format=json')
+    assert json.loads(body.decode('utf-8'))['total'] == 5
@@ -0,0 +1,26 @@
+import urllib.error
+import urllib.request
+
+import pytest
+
+from jpy_video import server
+
+
+@pytest.fixture(params=['thread', 'asyncio'])
+def app(request, tmp_path):
+    app = server.Server(path=str(tmp_path), port=0, engine=request.param)
+    app.start()
+    yield app
+    app.stop()
+
+
+def test_stats_count_response_just_received(app):
+    for k in range(20):
+        with pytest.raises(urllib.error.HTTPError) as info:
+            urllib.request.urlopen(app.url + '/missing.mp4', timeout=5)
+        assert info.value.code == 404
+
+        stats = app.stats(files=False, wait=5)
+        assert stats['requests'] == k + 1
+        assert stats['status'] == {404: k + 1}
+        assert stats['active_requests'] == 0
@@ -0,0 +1,117 @@
+import socket
+import urllib.error
+import urllib.request
+
+import pytest
+
+from jpy_video import Video, server
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('localhost', 0))
+        return sock.getsockname()[1]
+
+
+def test_same_settings_share_server():
+    first = server.shared_server(workers=3)
+    second = server.shared_server(workers=3)
+    assert first is second
+
+
+def test_other_settings_get_own_server():
+    first = server.shared_server(workers=3)
+    second = server.shared_server(workers=5)
+    assert first is not second
+    assert first.port != second.port
+
+    # Defaults spelled out are the same settings
+    assert server.shared_server() is server.shared_server(workers=8, engine='thread')
+
+
+def test_fixed_port_with_other_settings():
+    port = free_port()
+    first = server.shared_server(port=port, workers=3)
+    assert server.shared_server(port=port, workers=3) is first
+
+    with pytest.raises(ValueError):
+        server.shared_server(port=port, workers=5)
+
+
+def test_started_on_first_use_and_restarted_after_stop():
+    key = 'localhost', 0, server.server_options(workers=7)
+    assert key not in server._shared_servers
+
+    first = server.shared_server(workers=7)
+    assert server._shared_servers[key] is first
+    assert first.running
+
+    first.stop()
+    second = server.shared_server(workers=7)
+    assert second is not first
+    assert second.running
+
+
+def get(url):
+    try:
+        with urllib.request.urlopen(url, timeout=5) as response:
+            return response.status, response.read()
+    except urllib.error.HTTPError as error:
+        return error.code, b''
+
+
+def test_registered_files_only(tmp_path):
+    (tmp_path / 'clip.mp4').write_bytes(b'video')
+    (tmp_path / 'secret.txt').write_bytes(b'secret')
+    S = server.shared_server(workers=3)
+
+    token = S.register(str(tmp_path / 'clip.mp4'))
+    try:
+        assert str(tmp_path) not in token
+        assert get(S.token_to_url(token)) == (200, b'video')
+
+        # Plain paths and unknown tokens don't reach the file system
+        assert get(S.url + '/' + str(tmp_path / 'secret.txt'))[0] == 404
+        assert get(S.url + '/0123456789abcdef/secret.txt')[0] == 404
+    finally:
+        S.unregister(token)
+
+
+def test_unregister_after_last_reference(tmp_path):
+    path = tmp_path / 'clip.mp4'
+    path.write_bytes(b'video')
+    S = server.shared_server(workers=3)
+
+    token = S.register(str(path))
+    assert S.register(str(path)) == token
+    url = S.token_to_url(token)
+
+    S.unregister(token)
+    assert get(url) == (200, b'video')
+
+    S.unregister(token)
+    assert token not in S.registered
+    assert get(url)[0] == 404
+
+
+def test_widgets_share_server(mp4_file, tmp_path):
+    other = tmp_path / 'other.mp4'
+    other.write_bytes(b'video')
+
+    first, second = Video(mp4_file), Video(str(other))
+    try:
+        assert first.server is second.server
+        assert len(first.server.registered) >= 2
+
+        # Switching files keeps the server and releases the old file
+        port = first.server.port
+        token = first._token
+        first.filename = str(other)
+        assert first.server.port == port
+        assert first._token == second._token
+        assert token not in first.server.registered
+    finally:
+        first.close()
+        second.close()
+
+    assert second._token is None
@@ -0,0 +1,93 @@
+import os
+import urllib.request
+
+import pytest
+
+from jpy_video import server, sprites
+
+
+def make_sheet():
+    return sprites.SpriteSheet(b'\xff\xd8jpeg\xff\xd9', interval=2, tile_width=160,
+                               tile_height=90, columns=10, count=25, duration=49.5)
+
+
+def test_save_and_load(tmp_path):
+    sheet = make_sheet()
+    stem = str(tmp_path / 'sheets' / 'key')
+    sheet.save(stem)
+
+    loaded = sprites.SpriteSheet.load(stem)
+    assert loaded.jpeg == sheet.jpeg
+    assert loaded.layout == sheet.layout
+    assert sorted(os.listdir(str(tmp_path / 'sheets'))) == ['key.jpg', 'key.json']
+
+
+def test_load_rejects_damaged_layout(tmp_path):
+    stem = str(tmp_path / 'key')
+    make_sheet().save(stem)
+    with open(stem + '.json', 'w') as fo:
+        fo.write('{"interval": 2}')
+
+    with pytest.raises(ValueError):
+        sprites.SpriteSheet.load(stem)
+
+
+def test_cache(tmp_path):
+    folder = str(tmp_path)
+    assert sprites.load_cached('key', folder) == (None, None)
+
+    path = sprites.save_cached(make_sheet(), 'key', folder)
+    sheet, jpeg_path = sprites.load_cached('key', folder)
+    assert jpeg_path == path == os.path.join(folder, 'key.jpg')
+    assert sheet.count == 25
+
+
+def test_sprite_key(mp4_file):
+    key = sprites.sprite_key(mp4_file, 2, 160, 0.7)
+    assert key == sprites.sprite_key(mp4_file, 2.0, 160, 0.7)
+    assert key != sprites.sprite_key(mp4_file, 1, 160, 0.7)
+    assert key != sprites.sprite_key(mp4_file, 2, 320, 0.7)
+    assert key != sprites.sprite_key(mp4_file, 2, 160, 0.9)
+
+    # Modified file gets a new key
+    stat = os.stat(mp4_file)
+    os.utime(mp4_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert key != sprites.sprite_key(mp4_file, 2, 160, 0.7)
+
+    # Data in memory is keyed by content
+    with open(mp4_file, 'rb') as fi:
+        data = fi.read()
+    assert (sprites.sprite_key(server.MemoryFile(data), 2, 160, 0.7) ==
+            sprites.sprite_key(server.MemoryFile(bytearray(data), 'other.mp4'), 2, 160, 0.7))
+
+
+def test_video_previews_from_front_end_then_cache(mp4_file, tmp_path):
+    from jpy_video import Video
+
+    folder = str(tmp_path / 'sprites')
+    sheet = make_sheet()
+
+    first = Video(mp4_file)
+    sent = []
+    first.send = sent.append
+    try:
+        first.make_previews(interval=2, width=160, cache_folder=folder)
+        assert [content['method'] for content in sent] == ['capture_sprites']
+
+        # Front end replies with the sheet
+        reply = dict(sheet.layout, event='sprites', id=sent[0]['id'])
+        first._handle_message(first, reply, [sheet.jpeg])
+        assert first._sprites['count'] == 25
+        assert urllib.request.urlopen(first._sprites['url'], timeout=5).read() == sheet.jpeg
+    finally:
+        first.close()
+
+    second = Video(mp4_file)
+    sent = []
+    second.send = sent.append
+    try:
+        second.make_previews(interval=2, width=160, cache_folder=folder)
+        assert sent == []
+        assert second._sprites['count'] == 25
+    finally:
+        second.close()
@@ -0,0 +1,95 @@
+import numpy
+import pytest
+
+from jpy_video.timecode import TimecodeConverter, is_drop_frame_rate
+
+
+def test_drop_frame_rates():
+    assert is_drop_frame_rate(30000/1001)
+    assert is_drop_frame_rate(60000/1001)
+    assert not is_drop_frame_rate(30)
+    assert not is_drop_frame_rate(24000/1001)
+
+
+@pytest.mark.parametrize('frame, code', [
+    (0, '00:00:00;00'),
+    (1799, '00:00:59;29'),
+    (1800, '00:01:00;02'),
+    (3597, '00:01:59;29'),
+    (3598, '00:02:00;02'),
+    (17981, '00:09:59;29'),
+    (17982, '00:10:00;00'),
+    (17983, '00:10:00;01'),
+    (107892, '01:00:00;00'),
+])
+def test_drop_frame_timecodes(frame, code):
+    converter = TimecodeConverter(1001/30000)
+    assert converter.format([frame])[0] == code
+    assert converter.parse([code])[0] == frame
+
+
+@pytest.mark.parametrize('timebase, drop_frame', [
+    (1001/30000, True),
+    (1001/60000, True),
+    (1001/30000, False),
+    (1/25, False),
+    (1001/24000, False),
+])
+def test_round_trip(timebase, drop_frame):
+    converter = TimecodeConverter(timebase, drop_frame=drop_frame)
+    # Every frame of the first twenty minutes, then a sample of a whole day
+    frames = numpy.concatenate([numpy.arange(0, 20*60*60, dtype=numpy.int64),
+                                numpy.arange(20*60*60, 25*3600*60, 97, dtype=numpy.int64)])
+
+    codes = converter.format(frames)
+    assert (converter.parse(codes) == frames).all()
+
+    # Timecodes count up without repeats, dropped numbers are simply skipped
+    assert len(numpy.unique(codes)) == len(codes)
+
+
+def test_drop_frame_stays_with_clock():
+    converter = TimecodeConverter(1001/30000)
+    seconds = numpy.array([0, 60.06, 600, 3600])
+    codes = converter.to_timecode(seconds)
+    assert codes.tolist() == ['00:00:00;00', '00:01:00;02', '00:10:00;00', '01:00:00;00']
+
+    # Back to the start of the frame on screen at each time
+    starts = converter.from_timecode(codes)
+    assert ((starts <= seconds + 1e-9) & (seconds - starts < converter.timebase)).all()
+
+
+def test_parse_rejects_dropped_frames():
+    converter = TimecodeConverter(1001/30000)
+    for code in ('00:01:00;00', '00:01:00;01', '00:59:00;01'):
+        with pytest.raises(ValueError):
+            converter.parse([code])
+
+    assert converter.parse(['00:10:00;00', '00:01:00;02']).tolist() == [17982, 1800]
+
+
+def test_parse_formats():
+    converter = TimecodeConverter(1/25)
+    assert converter.parse(['00:00:01:00', '00:00:01.05', '100:00:00;00']).tolist() == \
+        [25, 30, 100*3600*25]
+    assert converter.parse(numpy.array([b'00:00:02,00'])).tolist() == [50]
+
+    for bad in (['00:00:0x;00'], ['00:60:00;00'], ['00:00:00;25'], ['0:00;00'], ['00/00/00/00']):
+        with pytest.raises(ValueError):
+            converter.parse(bad)
+
+
+def test_variable_frame_rate():
+    times = [0, 0.04, 0.1, 0.5, 0.52]
+    converter = TimecodeConverter(1/25, frame_times=times)
+    assert converter.frames([0, 0.05, 0.1, 0.49, 10]).tolist() == [0, 1, 2, 2, 4]
+    assert converter.seconds([3, 9]).tolist() == [0.5, 0.52]
+
+
+def test_invalid_settings():
+    with pytest.raises(ValueError):
+        TimecodeConverter(0)
+    with pytest.raises(ValueError):
+        TimecodeConverter(1/25, drop_frame=True)
+    with pytest.raises(ValueError):
+        TimecodeConverter(1/30, separator='/')
@@ -0,0 +1,182 @@
+import array
+import importlib.util
+import io
+import os
+import time
+
+import numpy
+import pytest
+
+from jpy_video import Video, server
+
+
+def test_video_without_source():
+    video = Video()
+    try:
+        assert video.src == ''
+        assert video.filename == ''
+    finally:
+        video.close()
+
+
+def test_video_from_file(mp4_file):
+    video = Video(mp4_file)
+    try:
+        assert video.filename == os.path.realpath(mp4_file)
+        assert video.src.startswith('http://')
+        assert video.src.split('?')[0].endswith('/clip.mp4')
+    finally:
+        video.close()
+
+    assert video._token is None
+
+
+def test_video_url_is_stable(mp4_file):
+    first, second = Video(mp4_file), Video(mp4_file)
+    try:
+        assert first.src == second.src
+        assert first.src.endswith('?v=' + server.file_version(os.stat(mp4_file)))
+    finally:
+        first.close()
+        second.close()
+
+
+def test_video_from_bytesio(mp4_file):
+    with open(mp4_file, 'rb') as fi:
+        data = io.BytesIO(fi.read())
+
+    video = Video(data)
+    try:
+        assert video.stream is None
+        assert video.memory_file is not None
+        assert video.memory_file.size == len(data.getvalue())
+        assert video.src.endswith('/video.mp4')
+    finally:
+        video.close()
+
+
+def test_capture_frames_needs_numpy(monkeypatch):
+    monkeypatch.setattr(importlib.util, 'find_spec', lambda name: None)
+
+    video = Video()
+    try:
+        with pytest.raises(ImportError):
+            video.capture_frames([0.0])
+        assert not video._captures
+    finally:
+        video.close()
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_capture_frames_times_out():
+    video = Video()
+    finished = []
+    try:
+        capture = video.capture_frames([0.0, 0.5], callback=finished.append, timeout=0.2)
+        assert not capture.done
+
+        # Each message from the front end restarts the countdown
+        time.sleep(0.1)
+        video._handle_message(video, {'event': 'capture_start', 'id': capture.id,
+                                      'width': 2, 'height': 2}, [])
+        time.sleep(0.15)
+        assert not capture.done
+
+        assert wait_for(lambda: capture.done)
+        assert 'No answer' in capture.error
+        assert finished == [capture]
+        assert capture.id not in video._captures
+
+        # Late frames are ignored
+        video._handle_message(video, {'event': 'capture_frames', 'id': capture.id,
+                                      'indices': [0]}, [bytes(16)])
+        assert capture.received == 0
+    finally:
+        video.close()
+
+
+def test_close_finishes_captures():
+    video = Video()
+    capture = video.capture_frames([0.0], timeout=None)
+    video.close()
+    assert capture.done
+    assert capture.error == 'Widget closed'
+
+
+def test_on_play_and_on_pause():
+    video = Video()
+    seen = []
+    try:
+        video.on_play(lambda widget, properties: seen.append(('play', properties.currentTime)))
+        video.on_pause(lambda widget, properties: seen.append(('pause', properties.currentTime)))
+
+        video._event = {'type': 'play', 'currentTime': 1.5}
+        video._event = {'type': 'pause', 'currentTime': 2.5}
+        assert seen == [('play', 1.5), ('pause', 2.5)]
+    finally:
+        video.close()
+
+
+def test_thread_callback_mode_keeps_order_and_snapshots():
+    video = Video()
+    seen = []
+    try:
+        video.set_callback_mode('thread')
+        video.on_event(lambda widget, properties: seen.append(properties.currentTime),
+                       'timeupdate')
+        for k in range(20):
+            video._dispatch_event({'type': 'timeupdate', 'currentTime': float(k)})
+
+        deadline = time.monotonic() + 5
+        while len(seen) < 20 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert seen == [float(k) for k in range(20)]
+        assert video.callback_stats()['timeupdate']['calls'] == 20
+    finally:
+        video.close()
+
+
+
+def test_record_events():
+    video = Video()
+    try:
+        recorder = video.record_events(capacity=16)
+        video._event = {'type': 'loadstart'}
+        video._event = {'type': 'play', 'currentTime': 1.5}
+
+        timestamps, codes, current_times = recorder.arrays()
+        assert [recorder.event_types[code] for code in codes] == ['loadstart', 'play']
+        assert numpy.isnan(current_times[0]) and current_times[1] == 1.5
+    finally:
+        video.close()
+
+
+def test_media_event_batch():
+    video = Video()
+    seen = []
+    try:
+        video.on_event(lambda widget, properties: seen.append(
+            (properties.type, properties.currentTime, dict(properties.items()).get('paused'))))
+        video.record_events()
+
+        # Two time samples, then a pause carrying only what changed, then one more sample
+        events = [{'type': 'pause', 'sample': 2, 'time': 1000.5,
+                   'changes': {'paused': True, 'currentTime': 0.5}}]
+        samples = array.array('d', [0.25, 0.4, 0.75])
+        times = array.array('d', [1000.25, 1000.4, 1000.75])
+        video._handle_message(video, {'event': 'media_events', 'events': events},
+                              [memoryview(samples).cast('B'), memoryview(times).cast('B')])
+
+        assert seen == [('timeupdate', 0.25, None), ('timeupdate', 0.4, None),
+                        ('pause', 0.5, True), ('timeupdate', 0.5, True),
+                        ('timeupdate', 0.75, True)]
+        assert video.current_time == 0.75
+        assert list(video.recorder.arrays()[0]) == [1000.25, 1000.4, 1000.5, 1000.5, 1000.75]
+    finally:
+        video.close()